@@ -1,21 +1,98 @@
 from argparse import RawTextHelpFormatter
 import argparse
+import atexit
+import base64
+import bisect
+import collections
+import fcntl
+import fnmatch
+import gzip
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import itertools
 import json
 import os
+import queue
+import re
+import resource
+import select
+import shlex
+import shutil
 import signal
+import socket
 import subprocess
+import sys
 import threading
 import time
+import types
 import xml.etree.ElementTree as ET
 
 
-"""Load JSON content of module configuration file.
+"""Compiled syntax string of a module.
+The syntax is split once into literal strings and <variables>,
+so that a command can be created by a single join.
+segments contains the literal strings at even
+and the names of the variables at odd positions.
 
-pathToModuleConfig = The path to the configuration file.
+syntax = The syntax of the command of the given module.
 """
-def loadModules(pathToModuleConfig):
-    with open(pathToModuleConfig, "r", encoding="utf-8") as file:
-        return json.load(file)
+class commandTemplate:
+    def __init__(self, syntax):
+        self.segments = []
+        self.variables = []
+        splittedSyntax = syntax.split("<")
+        literal = splittedSyntax[0]
+
+        for currSpl in splittedSyntax[1:]:
+            if (">" in currSpl):
+                variable, rest = currSpl.split(">", 1)
+                self.segments.append(literal)
+                self.segments.append(variable)
+                literal = rest
+
+                if (not variable in self.variables):
+                    self.variables.append(variable)
+            else:
+                literal = literal + "<" + currSpl
+
+        self.segments.append(literal)
+
+    """Return a new template in which the given variables are replaced.
+    Used to insert the arguments given by the user once per module.
+
+    values = A dictionary that maps names of variables to their values.
+    """
+    def bind(self, values):
+        boundTemplate = commandTemplate("")
+        boundTemplate.segments = [self.segments[0]]
+
+        for index in range(1, len(self.segments), 2):
+            variable = self.segments[index]
+
+            if (variable in values):
+                boundTemplate.segments[-1] += (values[variable]
+                                               + self.segments[index + 1])
+            else:
+                boundTemplate.segments.append(variable)
+                boundTemplate.segments.append(self.segments[index + 1])
+
+        boundTemplate.variables = self.variables
+        return boundTemplate
+
+    """Return the final command.
+    Variables without value stay unchanged.
+
+    values = A dictionary that maps names of variables to their values.
+    """
+    def expand(self, values):
+        parts = self.segments.copy()
+
+        for index in range(1, len(parts), 2):
+            parts[index] = values.get(parts[index], "<" + parts[index] + ">")
+
+        return "".join(parts)
 
 
 """Return a list of strings.
@@ -30,415 +107,5098 @@ removeExpArgs = If this value is set to 1, it will be checked
 whether string belongs to the exceptional strings.
 """
 def getVariablesFromString(syntax, removeExpArgs):
-    possRequiredVars = []
-    splittedSyntax = syntax.split("<")
-    
-    for currSpl in splittedSyntax:
-        if (">" in currSpl):
-            variableOfTempl = currSpl.split(">")
-            possRequiredVars.append(variableOfTempl[0])
-    
-    # get all undefined variables inside json config of modules
-    requiredVars = []
-    
-    # add if json key for module does not exist
-    for var in possRequiredVars:
+    requiredVars = commandTemplate(syntax).variables
+
+    if (removeExpArgs == 1):
+        # define exceptional arguments 
+        exceptionalArguments = ["outputFile", "port", "targetFile",
+                                "targetIp", "xmlFile"]
+        
+        # remove exceptional variables from json arguments
+        requiredVars = [var for var in requiredVars
+                        if not var in exceptionalArguments]
+
+    return requiredVars
+
+
+"""Return the abbreviation of an argument given by the json config.
+Camelcase notation sets the abbreviation: userPassFile = upf
+
+jsonArg = The name of the argument.
+"""
+def getShortOption(jsonArg):
+    capitalLetters = jsonArg[0]
+
+    for char in jsonArg:
+        if (char.isupper()):
+            capitalLetters = capitalLetters + char
+
+    return capitalLetters.lower()
+
+
+"""Return a list of error messages for the given modules.
+Checks the uniqueness of names, the risk level, the ports,
+the optional keys and the placeholders of the syntax.
+
+allModules = A list of [module, pathToModuleConfig] lists.
+"""
+def validateModules(allModules):
+    allErrors = []
+    allNames = {}
+    allShortOptions = {}
+
+    for module, pathToModuleConfig in allModules:
+        name = module.get("name", "")
+        errorPrefix = "Error in " + pathToModuleConfig + " - " + name + ": "
+
+        # the name is used as directory and file name
+        if (not re.fullmatch(r"[\w.-]+", name)):
+            allErrors.append(errorPrefix + "invalid module name")
+
+        elif (name in allNames):
+            allErrors.append(errorPrefix + "duplicated module name"
+                             + " (also defined in " + allNames[name] + ")")
+
+        allNames[name] = pathToModuleConfig
+
+        if (not str(module.get("riskLevel", "")) in ["1", "2", "3", "4"]):
+            allErrors.append(errorPrefix + "riskLevel must be between 1 and 4")
+
+        port = str(module.get("port", ""))
+
+        if (port != "*"):
+            for currPort in port.split(","):
+                currPort = currPort.strip()
+
+                if (not currPort.isdigit() or not 0 < int(currPort) < 65536):
+                    allErrors.append(errorPrefix + "invalid port " + currPort)
+
+        for optionalKey in (["slotWeight", "maxPerHost", "timeout", "priority"]
+                            + [key for key, option, factor in resourceLimits]):
+            if (optionalKey in module
+                and not str(module[optionalKey]).isdigit()):
+                allErrors.append(errorPrefix + optionalKey
+                                 + " must be a positive number")
+
+        if ("batchSyntax" in module):
+            allErrors.extend(errorPrefix + currError
+                             for currError in validateBatchKeys(module))
+
+        # different arguments must not share the same abbreviation
+        for currArg in getVariablesFromString(module["syntax"], 1):
+            shortOption = getShortOption(currArg)
+
+            if (allShortOptions.setdefault(shortOption, currArg) != currArg):
+                allErrors.append(errorPrefix + "collision for config argument"
+                                 + " name (args): " + currArg + " and "
+                                 + allShortOptions[shortOption] + " (-"
+                                 + shortOption + ")")
+
+    return allErrors
+
+
+"""Return a list of error messages for the optional batch keys of a module.
+
+module = The module that contains the key batchSyntax.
+"""
+def validateBatchKeys(module):
+    allErrors = []
+
+    if (not "<targetFile>" in module["batchSyntax"]):
+        allErrors.append("batchSyntax requires <targetFile>")
+
+    # the batch command is only used instead of the command of the syntax
+    # and must not require additional arguments
+    for currArg in getVariablesFromString(module["batchSyntax"], 1):
+        if (not currArg in getVariablesFromString(module["syntax"], 1)):
+            allErrors.append("argument " + currArg + " of batchSyntax"
+                             + " is not part of syntax")
+
+    if (not str(module.get("batchSize", "1")).isdigit()
+        or int(module.get("batchSize", "1")) < 1):
+        allErrors.append("batchSize must be a positive number")
+
+    if (not module.get("batchSplit", "lines") in batchSplitModes):
+        allErrors.append("batchSplit must be one of "
+                         + ", ".join(batchSplitModes))
+
+    if (not "<targetIp>" in module.get("batchTarget", "<targetIp>")):
+        allErrors.append("batchTarget requires <targetIp>")
+
+    if (not str(module.get("batchTimeout", "0")).isdigit()):
+        allErrors.append("batchTimeout must be a positive number")
+
+    return allErrors
+
+
+"""Return the path to the directory used for cached data of autopen."""
+def getCacheDir():
+    return os.environ.get("XDG_CACHE_HOME",
+                          os.path.expanduser("~/.cache")) + "/autopen"
+
+
+# increased whenever the cached registry contains new keys
+registryFormat = 4
+
+# keys of a module that contain a compiled commandTemplate
+templateKeys = ["template", "batchTemplate"]
+
+
+"""Return the syntax without the final '> <outputFile> 2>&1'
+if the output of the whole command is redirected to the output file,
+otherwise None.
+
+syntax = The syntax of the command of the given module.
+"""
+def getStreamedSyntax(syntax):
+    match = re.fullmatch(r"(.*?)\s*>\s*<outputFile>\s+2>&1\s*", syntax,
+                         re.DOTALL)
+
+    if (not match):
+        return None
+
+    # only a single command, otherwise the redirect
+    # does not apply to the output of all commands
+    # quoted strings and variables are ignored
+    command = re.sub(r"'[^']*'|\"(?:\\.|[^\"\\])*\"|<\w+>", "",
+                     match.group(1))
+
+    if (re.search(r"[;&|<>\n]", command)):
+        return None
+
+    return match.group(1)
+
+
+"""Return the path to the cache file of the module registry.
+The name of the file depends on the given configuration files.
+
+allConfigFiles = The paths to all configuration files.
+"""
+def getRegistryCachePath(allConfigFiles):
+    cacheName = hashlib.sha256("\n".join(allConfigFiles).encode()).hexdigest()
+    return getCacheDir() + "/modules-" + cacheName[:16] + ".json"
+
+
+"""Return the given registry as plain JSON data:
+the compiled templates of the modules are replaced by their segments.
+The cache is JSON, since loading it must never execute code
+(the cache directory may be writable by others than the configuration).
+
+registry = The module registry.
+"""
+def getRegistryData(registry):
+    registryData = dict(registry)
+    registryData["modules"] = []
+
+    for module in registry["modules"]:
+        moduleData = dict(module)
+
+        for key in templateKeys:
+            if (key in module):
+                moduleData[key] = module[key].segments
+
+        registryData["modules"].append(moduleData)
+
+    return registryData
+
+
+"""Return the module registry of the given JSON data (see getRegistryData).
+The templates are created from their segments without parsing the syntax.
+
+registryData = The data read from the cache.
+"""
+def getRegistryFromData(registryData):
+    for module in registryData["modules"]:
+        for key in templateKeys:
+            if (key in module):
+                template = commandTemplate("")
+                template.segments = module[key]
+                template.variables = list(dict.fromkeys(module[key][1::2]))
+                module[key] = template
+
+    return registryData
+
+
+"""Return the module registry, a dictionary with the keys:
+modules = All validated modules, the key template contains the compiled syntax.
+jsonArgs = The arguments that will be added to argumentParser.
+The registry is read from modules.json and all json files of the
+drop-in directories. The result is cached and only created again
+if the modification time and the content of a configuration file changed.
+
+pathToModuleConfig = The path to the modules.json file.
+moduleDirs = Directories that contain additional json module files.
+"""
+def loadModuleRegistry(pathToModuleConfig, moduleDirs):
+    allConfigFiles = [os.path.realpath(pathToModuleConfig)]
+
+    for moduleDir in moduleDirs:
+        if (os.path.isdir(moduleDir)):
+            for fileName in sorted(os.listdir(moduleDir)):
+                if (fileName.endswith(".json")):
+                    allConfigFiles.append(
+                        os.path.realpath(os.path.join(moduleDir, fileName)))
+
+    # compare modification time and size of the configuration files
+    fileStates = []
+
+    for configFile in allConfigFiles:
+        if (not os.path.isfile(configFile)):
+            print("Error - module configuration not found: " + configFile)
+            exit(1)
+
+        fileStat = os.stat(configFile)
+        fileStates.append([configFile, fileStat.st_mtime_ns, fileStat.st_size])
+
+    pathToCache = getRegistryCachePath(allConfigFiles)
+    cachedRegistry = None
+
+    try:
+        with open(pathToCache, "r", encoding="utf-8") as cacheFile:
+            cachedRegistry = json.load(cacheFile)
+
+        if (cachedRegistry.get("format") != registryFormat):
+            cachedRegistry = None
+
+        elif (cachedRegistry["fileStates"] == fileStates):
+            return getRegistryFromData(cachedRegistry)
+    except Exception:
+        cachedRegistry = None
+
+    # compare the content if only the modification time changed
+    allContents = []
+
+    for configFile in allConfigFiles:
+        with open(configFile, "rb") as file:
+            allContents.append(file.read())
+
+    contentHash = hashlib.sha256(b"\0".join(allContents)).hexdigest()
+
+    if (cachedRegistry and cachedRegistry["contentHash"] == contentHash):
+        registry = getRegistryFromData(cachedRegistry)
+
+    else:
+        allModules = []
+
+        for configFile, content in zip(allConfigFiles, allContents):
+            try:
+                modulesOfFile = json.loads(content)
+            except ValueError as exc:
+                print("Error in " + configFile + " - " + str(exc))
+                exit(1)
+
+            for module in modulesOfFile:
+                allModules.append([module, configFile])
+
+        allErrors = validateModules(allModules)
+
+        if (allErrors):
+            for currError in allErrors:
+                print(currError)
+            exit(1)
+
+        allJsonArgs = []
+
+        for module, configFile in allModules:
+            syntax = module["syntax"]
+            streamedSyntax = getStreamedSyntax(syntax)
+
+            # the output is written by autopen (see outputWriter)
+            if (streamedSyntax):
+                module["streamOutput"] = True
+                syntax = streamedSyntax
+
+            module["template"] = commandTemplate(syntax)
+            allJsonArgs.extend(getVariablesFromString(module["syntax"], 1))
+
+            if ("batchSyntax" in module):
+                batchSyntax = module["batchSyntax"]
+                streamedSyntax = getStreamedSyntax(batchSyntax)
+
+                if (streamedSyntax):
+                    module["batchStreamOutput"] = True
+                    batchSyntax = streamedSyntax
+
+                module["batchTemplate"] = commandTemplate(batchSyntax)
+
+        registry = {"modules": [module for module, configFile in allModules],
+                    # remove duplicated undefined variables
+                    "jsonArgs": sorted(set(allJsonArgs)),
+                    "contentHash": contentHash,
+                    "format": registryFormat}
+
+    registry["fileStates"] = fileStates
+
+    try:
+        os.makedirs(os.path.dirname(pathToCache), exist_ok=True)
+
+        with open(pathToCache + ".tmp", "w", encoding="utf-8") as cacheFile:
+            json.dump(getRegistryData(registry), cacheFile)
+
+        os.replace(pathToCache + ".tmp", pathToCache)
+    except OSError:
+        # the registry can be used without cache
+        pass
+
+    return registry
+
+
+"""Return a list of strings that will be added to argumentParser.
+These strings are defined in the modules.json file within the syntax key.
+For each module, the values set in <variable> are defined as arguments.
+Exceptional arguments like:
+'outputFile', 'port', 'targetIp', 'xmlFile'
+will not be added to the argumentParser.
+"""
+def getArgsOfJson():
+    return moduleRegistry["jsonArgs"]
+
+
+"""Print all modules of the registry and exit (--listModules)."""
+class listModulesAction(argparse.Action):
+    def __init__(self, option_strings, dest, **kwargs):
+        super().__init__(option_strings, dest, nargs=0, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        # exit quietly if the list is piped into e.g. head
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+        for module in moduleRegistry["modules"]:
+            print(module["name"] + "\t" + "riskLevel "
+                  + str(module["riskLevel"]) + "\t" + "port "
+                  + str(module["port"]))
+
+        parser.exit()
+
+
+"""Catch user interrupt (ctrl + c).
+
+sig = The type of signal, that should be catched.
+frame = The function that should be executed.
+"""
+def signal_handler(sig, frame):
+    print ("\nCatched keyboard interrupt, exit programm!")
+
+    try:
+        # the jobs run inside their own sessions and do not get the interrupt
+        if (runningProcessGroups):
+            print ("Stop running modules...")
+            stopRunningJobs()
+
+        if (args.execute):
+            # running jobs have to be executed again on --resume
+            scheduler.markInterrupted()
+
+        print ("Remove empty directories before leaving...")
+        if (args.execute):
+            # remove empty directories
+            for directory in os.scandir(args.output):
+                if os.path.isdir(directory) and not os.listdir(directory):
+                    os.rmdir(directory)
+
+        print("Done")
+        exit(0)
+
+    except:
+        exit(0)
+
+
+"""Return the service fingerprint of a port detected by nmap:
+tunnel, service name, product, version and extra info
+(e.g. 'ssl http nginx 1.18.0').
+Without -sV nmap only reports the service name of the port number.
+
+portElement = The <port> element of an nmap xml result.
+"""
+def getServiceFingerprint(portElement):
+    serviceElement = portElement.find("service")
+
+    if (serviceElement is None):
+        return ""
+
+    return " ".join(serviceElement.get(attribute)
+                    for attribute in ["tunnel", "name", "product", "version",
+                                      "extrainfo"]
+                    if serviceElement.get(attribute))
+
+
+"""Return a list with the ipv4 address and the open ports of a host:
+["ip1", {22: "ssh OpenSSH 8.9p1", 80: "http"}]
+The open ports are stored as a dictionary that maps the port number (int)
+to the service fingerprint of the port (see getServiceFingerprint).
+
+hostElement = The <host> element of an nmap xml result.
+"""
+def convertHostElement(hostElement):
+    currentIpv4 = ""
+    allOpenPortsOfCurrentIp = {}
+
+    for currentAddress in hostElement.findall("address"):
+        # ipv4 needs to stay highest node
+        currentIpv4 = currentAddress.get("addr")
+        break
+
+    for currentPort in hostElement.findall("ports/port"):
+        for state in currentPort.findall("state"):
+            # check if current port is open
+            if (state.get("state") == "open"):
+                allOpenPortsOfCurrentIp[int(currentPort.get("portid"))] = \
+                    getServiceFingerprint(currentPort)
+
+    return [currentIpv4, allOpenPortsOfCurrentIp]
+
+
+"""Yield one host list (see convertHostElement) per <host> element.
+The xml file is read incrementally
+and every host element is cleared after it has been converted,
+so that large scan results do not have to fit into memory.
+
+pathToNmapXml = The full path to the current nmap xml result file.
+"""
+def iterNmapHosts(pathToNmapXml):
+    xmlRoot = None
+
+    for event, element in ET.iterparse(pathToNmapXml, events=("start", "end")):
+        # the first element is the <nmaprun> root node
+        if (xmlRoot is None):
+            xmlRoot = element
+            continue
+
+        if (event == "end" and element.tag == "host"):
+            yield convertHostElement(element)
+
+            # drop the converted host from the tree
+            element.clear()
+            xmlRoot.clear()
+
+
+"""Return a list of integers for one octet of the nmap ip address notation.
+Possible notations are: 1 / 1-20 / 1,3,5-7 / - / *
+
+octet = The octet of the ip address notation.
+"""
+def expandOctet(octet):
+    octetValues = []
+
+    if (octet == "*"):
+        octet = "0-255"
+
+    for part in octet.split(","):
+        if ("-" in part):
+            firstValue, lastValue = part.split("-", 1)
+            octetValues.extend(range(int(firstValue or 0),
+                                     int(lastValue or 255) + 1))
+        else:
+            octetValues.append(int(part))
+
+    return octetValues
+
+
+# maximal amount of addresses a target is expanded into for the nmap shards,
+# larger networks are split into subnets of this size
+maxSplitAddresses = 65536
+
+# maximal amount of subnets a network is split into,
+# ipv6 networks are preferably split into /64 subnets
+maxSplitSubnets = 65536
+ipv6SplitPrefix = 64
+
+
+"""Return the subnets a network with more than maxAddresses addresses
+is split into. Subnets have maxAddresses addresses (ipv6: /64 if possible),
+unless this would create more than maxSplitSubnets subnets.
+
+network = The ipaddress network.
+maxAddresses = The maximal amount of addresses of an expanded network.
+"""
+def getSplitSubnets(network, maxAddresses):
+    newPrefix = network.max_prefixlen - (maxAddresses.bit_length() - 1)
+
+    if (network.version == 6 and network.prefixlen < ipv6SplitPrefix):
+        newPrefix = ipv6SplitPrefix
+
+    newPrefix = min(newPrefix,
+                    network.prefixlen + maxSplitSubnets.bit_length() - 1)
+
+    return network.subnets(new_prefix=newPrefix)
+
+
+"""Yield every target of the nmap target specification.
+CIDR notations and octet ranges of ipv4 addresses are expanded
+to single ip addresses, other targets (hostnames) are yielded unchanged.
+With maxAddresses, larger networks are split into subnets
+(see getSplitSubnets) and larger octet ranges into ranges whose
+leading octets are single values, nmap expands them itself.
+Without maxAddresses, ipv6 networks are yielded unchanged.
+
+targetSpec = The targets given by the user (-ti).
+maxAddresses = The maximal amount of addresses of an expanded target
+(None = no limit).
+"""
+def iterTargetAddresses(targetSpec, maxAddresses=None):
+    for target in targetSpec.split():
+        if ("/" in target):
+            try:
+                network = ipaddress.ip_network(target, strict=False)
+            except ValueError:
+                network = None
+
+            if (network is not None):
+                if (maxAddresses is None and network.version == 6):
+                    # an ipv6 network can contain 2^64 and more addresses
+                    yield target
+
+                elif (maxAddresses is not None
+                      and network.num_addresses > maxAddresses):
+                    for subnet in getSplitSubnets(network, maxAddresses):
+                        yield str(subnet)
+
+                else:
+                    for address in network:
+                        yield str(address)
+
+                continue
+
+        octets = target.split(".")
+
+        try:
+            allOctetValues = [expandOctet(octet) for octet in octets]
+        except ValueError:
+            # hostname
+            yield target
+            continue
+
+        if (len(octets) != 4):
+            yield target
+            continue
+
+        # the leading octets are expanded until the remaining octets
+        # contain at most maxAddresses addresses
+        expandedOctets = 4
+        amountOfAddresses = 1
+
+        for octetIndex in range(3, -1, -1):
+            amountOfAddresses *= len(allOctetValues[octetIndex])
+
+            if (maxAddresses is not None and amountOfAddresses > maxAddresses):
+                break
+
+            expandedOctets = octetIndex
+
+        if (expandedOctets > 0 and expandedOctets < 4):
+            for leadingOctets in itertools.product(
+                    *allOctetValues[:expandedOctets]):
+                yield ".".join([str(octetValue) for octetValue
+                                in leadingOctets] + octets[expandedOctets:])
+            continue
+
+        if (expandedOctets == 4):
+            # a single octet contains more than maxAddresses values
+            yield target
+            continue
+
+        for address in itertools.product(*allOctetValues):
+            yield ".".join(str(octetValue) for octetValue in address)
+
+
+"""Return a list with the paths of the target files of all shards.
+The targets are distributed round robin,
+so that every shard gets a similar part of dense and sparse networks.
+The file of the n-th shard is named <pathToNmap>-shard<n>.txt.
+
+targetSpec = The targets given by the user (-ti).
+amountOfShards = The amount of shards.
+pathToNmap = The path prefix of the target files.
+"""
+def writeNmapShards(targetSpec, amountOfShards, pathToNmap):
+    allShardFiles = []
+
+    for shardNumber in range(1, amountOfShards + 1):
+        allShardFiles.append(pathToNmap + "-shard" + str(shardNumber) + ".txt")
+
+    filePointers = [open(shardFile, "w") for shardFile in allShardFiles]
+    amountOfTargets = 0
+
+    for address in iterTargetAddresses(targetSpec, maxSplitAddresses):
+        filePointers[amountOfTargets % amountOfShards].write(address + "\n")
+        amountOfTargets += 1
+
+    for filePointer in filePointers:
+        filePointer.close()
+
+    # remove shards without targets
+    for shardFile in allShardFiles[amountOfTargets:]:
+        os.remove(shardFile)
+
+    return allShardFiles[:amountOfTargets]
+
+
+"""Run the given nmap scan and yield one host list (see convertHostElement)
+as soon as nmap has finished the <host> element.
+The scan has to write its xml output to stdout (-oX -),
+the xml output is copied to the given file.
+
+nmapScan = The nmap command that will be executed inside a shell.
+pathToNmapXml = The path to the file the xml output is written to.
+"""
+def iterNmapScanHosts(nmapScan, pathToNmapXml):
+    xmlParser = ET.XMLPullParser(events=("start", "end"))
+    xmlRoot = None
+
+    nmapProcess = subprocess.Popen(nmapScan, shell=True,
+                                   stdout=subprocess.PIPE)
+
+    with open(pathToNmapXml, "wb") as xmlFile:
+        while 1:
+            # return as soon as some output is available
+            chunk = nmapProcess.stdout.read1(65536)
+
+            if (not chunk):
+                break
+
+            xmlFile.write(chunk)
+            xmlParser.feed(chunk)
+
+            for event, element in xmlParser.read_events():
+                # the first element is the <nmaprun> root node
+                if (xmlRoot is None):
+                    xmlRoot = element
+                    continue
+
+                if (event == "end" and element.tag == "host"):
+                    xmlFile.flush()
+                    yield convertHostElement(element)
+
+                    # drop the converted host from the tree
+                    element.clear()
+                    xmlRoot.clear()
+
+    nmapProcess.wait()
+
+
+"""Yield the host lists of several nmap scans that are running in parallel
+in the order the hosts have been finished.
+Every scan is read by its own thread (see iterNmapScanHosts).
+
+nmapScans = A list of [nmapScan, pathToNmapXml] lists.
+"""
+def iterParallelNmapScanHosts(nmapScans):
+    hostQueue = queue.Queue()
+
+    def readNmapScan(nmapScan, pathToNmapXml):
+        try:
+            for hostOfScan in iterNmapScanHosts(nmapScan, pathToNmapXml):
+                hostQueue.put(hostOfScan)
+        finally:
+            # signal that this scan has been finished
+            hostQueue.put(None)
+
+    for nmapScan, pathToNmapXml in nmapScans:
+        threading.Thread(target=readNmapScan, args=(nmapScan, pathToNmapXml),
+                         daemon=True).start()
+
+    runningScans = len(nmapScans)
+
+    while (runningScans):
+        hostOfScan = hostQueue.get()
+
+        if (hostOfScan is None):
+            runningScans -= 1
+        else:
+            yield hostOfScan
+
+
+"""Return a list of all nmap xml files.
+Directories are replaced by the xml files they contain.
+
+pathsToNmapXml = A list of paths to xml files or directories.
+"""
+def getNmapXmlFiles(pathsToNmapXml):
+    allXmlFiles = []
+
+    for currPath in pathsToNmapXml:
+        if (os.path.isdir(currPath)):
+            for fileName in sorted(os.listdir(currPath)):
+                if (fileName.endswith(".xml")):
+                    allXmlFiles.append(os.path.join(currPath, fileName))
+        else:
+            allXmlFiles.append(currPath)
+
+    return allXmlFiles
+
+
+"""Return a list with following structure:
+[["ip1",{80:"http",443:"https"}],["ip2",{22:"ssh",80:"http"}]]
+This list is created from one or more XML nmap scan results.
+Open ports of hosts that occur in several files are merged.
+
+pathsToNmapXml = A list of paths to nmap xml result files or directories.
+"""
+def convertXmlToList(pathsToNmapXml):
+    startTime = time.perf_counter()
+
+    # map every ip address to its open ports (keeps order of appearance)
+    nmapAsDict = {}
+
+    for currXmlFile in getNmapXmlFiles(pathsToNmapXml):
+        for currentIpv4, openPorts in iterNmapHosts(currXmlFile):
+            if (currentIpv4 in nmapAsDict):
+                nmapAsDict[currentIpv4].update(openPorts)
+            else:
+                nmapAsDict[currentIpv4] = openPorts
+
+    profile.add("convertXmlToList", time.perf_counter() - startTime)
+    return [[ip, openPorts] for ip, openPorts in nmapAsDict.items()]
+
+
+"""Difference between the current nmap scan and a previous scan (--baseline).
+Only ports that are new or whose service fingerprint has changed
+(see getServiceFingerprint) are kept, so that modules are only planned
+for these ports. Every difference is recorded for the report.
+
+pathsToBaseline = A list of paths to the nmap xml files of the previous scan.
+"""
+class baselineDiff:
+    def __init__(self, pathsToBaseline):
+        self.baseline = dict(convertXmlToList(pathsToBaseline))
+        self.currentPorts = {}
+        # [change, ip, port, previous fingerprint, current fingerprint]
+        self.changes = []
+
+    """Return the host list (see convertHostElement)
+    with the new and changed ports of the host only.
+
+    host = The host list of the current scan.
+    """
+    def filterHost(self, host):
+        currentIpv4, openPorts = host
+        baselinePorts = self.baseline.get(currentIpv4, {})
+        changedPorts = {}
+        self.currentPorts.setdefault(currentIpv4, {}).update(openPorts)
+
+        for port, fingerprint in openPorts.items():
+            if (not port in baselinePorts):
+                self.changes.append(["new", currentIpv4, port, "",
+                                     fingerprint])
+
+            elif (baselinePorts[port] != fingerprint):
+                self.changes.append(["changed", currentIpv4, port,
+                                     baselinePorts[port], fingerprint])
+            else:
+                continue
+
+            changedPorts[port] = fingerprint
+
+        return [currentIpv4, changedPorts]
+
+    """Return the host lists of the current scan
+    with the new and changed ports only (see filterHost).
+
+    nmapList = The list of hosts created by convertXmlToList.
+    """
+    def filterHosts(self, nmapList):
+        return [self.filterHost(host) for host in nmapList]
+
+    """Return the report lines of all differences (new, changed, closed).
+    Ports of the baseline that are not open anymore are reported as closed.
+    """
+    def getReport(self):
+        allChanges = list(self.changes)
+
+        for currentIpv4, baselinePorts in self.baseline.items():
+            currentPorts = self.currentPorts.get(currentIpv4, {})
+
+            for port, fingerprint in baselinePorts.items():
+                if (not port in currentPorts):
+                    allChanges.append(["closed", currentIpv4, port,
+                                       fingerprint, ""])
+
+        allLines = []
+        changeOrder = ["new", "changed", "closed"]
+
+        for change, currentIpv4, port, previous, current in sorted(
+                allChanges, key=lambda entry: changeOrder.index(entry[0])):
+            if (change == "changed"):
+                service = previous + " -> " + current
+            else:
+                service = previous or current
+
+            allLines.append(change + "\t" + currentIpv4 + ":" + str(port)
+                            + "\t" + service)
+
+        return allLines
+
+    """Print the report and write it to the given file.
+
+    pathToReport = The path to the report file (None = only print).
+    """
+    def printReport(self, pathToReport):
+        allLines = self.getReport()
+
+        print("")
+        print(f"{bcolor.purple}### Changes since baseline: ###{bcolor.ends}")
+        print("change\thost:port\tservice")
+
+        for line in allLines:
+            print(line)
+
+        if (pathToReport):
+            with open(pathToReport, "w") as reportFile:
+                for line in allLines:
+                    reportFile.write(line + "\n")
+
+
+"""Return the filter entries given by the user.
+Entries starting with @ are replaced by the lines of the given file.
+
+filterEntries = The values of the filter argument.
+"""
+def readFilterEntries(filterEntries):
+    allEntries = []
+
+    for entry in filterEntries:
+        negation = ""
+
+        if (entry.startswith("!")):
+            negation = "!"
+            entry = entry[1:]
+
+        if (entry.startswith("@")):
+            with open(entry[1:], "r") as file:
+                for line in file:
+                    line = line.strip()
+
+                    # skip empty lines and comments
+                    if (line and not line.startswith("#")):
+                        allEntries.extend(readFilterEntries([negation + line]))
+        else:
+            allEntries.append(negation + entry)
+
+    return allEntries
+
+
+"""Return a sorted list of [first, last] lists
+in which overlapping and adjacent intervals are merged.
+
+intervals = A list of [first, last] lists.
+"""
+def mergeIntervals(intervals):
+    mergedIntervals = []
+
+    for first, last in sorted(intervals):
+        if (mergedIntervals and first <= mergedIntervals[-1][1] + 1):
+            mergedIntervals[-1][1] = max(mergedIntervals[-1][1], last)
+        else:
+            mergedIntervals.append([first, last])
+
+    return mergedIntervals
+
+
+"""Return the intervals without the removed intervals.
+Both lists have to be merged (see mergeIntervals).
+
+intervals = A list of [first, last] lists.
+removedIntervals = A list of [first, last] lists.
+"""
+def subtractIntervals(intervals, removedIntervals):
+    remainingIntervals = []
+
+    for first, last in intervals:
+        for removedFirst, removedLast in removedIntervals:
+            if (removedLast < first or removedFirst > last):
+                continue
+
+            if (removedFirst > first):
+                remainingIntervals.append([first, removedFirst - 1])
+
+            first = removedLast + 1
+
+            if (first > last):
+                break
+
+        if (first <= last):
+            remainingIntervals.append([first, last])
+
+    return remainingIntervals
+
+
+"""Return the interval [first, last] of an ip address filter entry.
+ipv6 addresses are placed behind all ipv4 addresses.
+Returns None if the entry is no ip address, CIDR or range.
+
+entry = An ip address, a CIDR (10.0.0.0/8), a range (10.0.0.1-10.0.0.9)
+or a range of the last octet (10.0.0.1-9).
+"""
+def getAddressInterval(entry):
+    try:
+        if ("-" in entry):
+            firstAddress, lastAddress = entry.split("-", 1)
+
+            # range of the last octet
+            if (lastAddress.isdigit()):
+                lastAddress = firstAddress.rsplit(".", 1)[0] + "." + lastAddress
+
+            firstAddress = ipaddress.ip_address(firstAddress)
+            lastAddress = ipaddress.ip_address(lastAddress)
+        else:
+            network = ipaddress.ip_network(entry, strict=False)
+            firstAddress = network[0]
+            lastAddress = network[-1]
+
+    except ValueError:
+        return None
+
+    if (firstAddress.version == 6):
+        return [int(firstAddress) + 2**32, int(lastAddress) + 2**32]
+
+    return [int(firstAddress), int(lastAddress)]
+
+
+"""Compiled ip address filter given by the user (-ii, -ei).
+Entries can be ip addresses, CIDRs, ranges, nmap octet notations
+or @files, entries starting with ! are removed from the filter:
+10.0.0.0/16 !10.0.5.0/24
+The addresses are stored as merged intervals,
+so that a lookup needs O(log n).
+
+filterEntries = The values of the filter argument.
+"""
+class addressFilter:
+    def __init__(self, filterEntries):
+        includedIntervals = []
+        removedIntervals = []
+        self.names = set()
+
+        for entry in readFilterEntries(filterEntries):
+            if (entry.startswith("!")):
+                intervals = removedIntervals
+                entry = entry[1:]
+            else:
+                intervals = includedIntervals
+
+            interval = getAddressInterval(entry)
+
+            if (interval):
+                intervals.append(interval)
+                continue
+
+            # nmap octet notation or hostname
+            for address in iterTargetAddresses(entry):
+                interval = getAddressInterval(address)
+
+                if (interval):
+                    intervals.append(interval)
+                elif (intervals is includedIntervals):
+                    self.names.add(address)
+
+        self.intervals = subtractIntervals(mergeIntervals(includedIntervals),
+                                           mergeIntervals(removedIntervals))
+        self.firstAddresses = [first for first, last in self.intervals]
+
+    def __contains__(self, address):
+        interval = getAddressInterval(address)
+
+        if (not interval):
+            return address in self.names
+
+        index = bisect.bisect_right(self.firstAddresses, interval[0]) - 1
+        return index >= 0 and interval[0] <= self.intervals[index][1]
+
+
+"""Return a set of port numbers (int) given by the user (-ip, -ep).
+Entries can be port numbers, ranges (1-1024) or @files,
+entries starting with ! are removed from the set.
+
+filterEntries = The values of the filter argument.
+"""
+def compilePortFilter(filterEntries):
+    includedPorts = set()
+    removedPorts = set()
+
+    for entry in readFilterEntries(filterEntries):
+        if (entry.startswith("!")):
+            ports = removedPorts
+            entry = entry[1:]
+        else:
+            ports = includedPorts
+
+        if ("-" in entry):
+            firstPort, lastPort = entry.split("-", 1)
+            ports.update(range(int(firstPort), int(lastPort) + 1))
+        else:
+            ports.add(int(entry))
+
+    return includedPorts - removedPorts
+
+
+"""Return a dictionary that maps every open port number (int)
+to the hosts of the nmap scan that have this port open
+and the service fingerprints of the port on these hosts:
+{80: {"ip1": "http", "ip2": "http nginx"}, 22: {"ip2": "ssh"}}
+The hosts are stored as keys of a dictionary,
+this keeps their order and removes duplicates.
+IP addresses filtered by the user are not added.
+
+nmapList = The list of hosts created by convertXmlToList.
+"""
+def createPortIndex(nmapList):
+    portIndex = {}
+
+    for currPossTarget in nmapList:
+        # only scan IP addresses included by user
+        if (includeIpFilter is not None):
+            if (not currPossTarget[0] in includeIpFilter):
+                continue
+
+        # skip ip addresses excluded by user
+        if (excludeIpFilter is not None):
+            if (currPossTarget[0] in excludeIpFilter):
+                continue
+
+        for currentOpenPortOnHost, fingerprint in currPossTarget[1].items():
+            portIndex.setdefault(currentOpenPortOnHost, {})[currPossTarget[0]] = fingerprint
+
+    return portIndex
+
+
+"""Return a list with all open portnumbers.
+These ports are read from the given port index.
+
+index = The port index created by createPortIndex.
+"""
+def getAllOpenPorts(index):
+    return [str(portNum) for portNum in sorted(index)]
+
+
+"""Return a list of modules that matches the arguments given by the user.
+The open ports of the nmap scan result are not considered.
+"""
+def getSelectedModules():
+    selectedModules = []
+
+    for module in moduleRegistry["modules"]:
+        # flag used to skip the current module
+        skipModule = "0"
+ 
+        # skip excluded modules given by user
+        if (args.excludeModules != "NULL"):
+            for currExcludedMod in args.excludeModules:
+                if (currExcludedMod in module["name"]):
+                    skipModule = "1"
+                    break 
+ 
+            if (skipModule == "1"):
+                continue
+ 
+        # only execute included modules given by user
+        skipModule = "1"
+ 
+        if (args.includeModules != "NULL"):
+            for currIncludedMod in args.includeModules:
+                if (currIncludedMod in module["name"]):
+                    skipModule = "0"
+                    break 
+ 
+            if (skipModule == "1"):
+                continue
+ 
+        # get all undefined arguments of current module
+        requiredArgsOfModule = getVariablesFromString(module["syntax"], 1)
+        skipModule = "0"
+ 
+        # skip modules that need an argument, that has not been given by user
+        for currUndefArg in requiredArgsOfModule:
+            if (vars(args)[currUndefArg] == "NULL"):
+                skipModule = "1"
+                break
+ 
+        # execute only modules with lower equals risk level given by user
+        if (int(module["riskLevel"]) > int(args.riskLevel)):
+            skipModule = "1"
+ 
+        if (skipModule == "0"):
+            # insert the arguments given by user once
+            userValues = {}
+
+            for currArg in requiredArgsOfModule:
+                userValues[currArg] = vars(args)[currArg]
+
+            module = module.copy()
+            module["template"] = module["template"].bind(userValues)
+
+            if ("batchTemplate" in module):
+                module["batchTemplate"] = module["batchTemplate"].bind(
+                    userValues)
+
+            selectedModules.append(module)
+
+    return selectedModules
+
+
+"""Return a list of modules 
+that matches the open port numbers of the given port index.
+Each module is copied once for every matching port,
+the port key of the copy only contains this port.
+
+selectedModules = The modules returned by getSelectedModules.
+index = The port index created by createPortIndex.
+"""
+def getMatchingModules(selectedModules, index):
+    startTime = time.perf_counter()
+    matchingModules = []
+
+    for module in selectedModules:
+        # check if module uses wildcard as portnumber
+        if (module["port"] == "*"):
+            portsOfCurrentModule = getAllOpenPorts(index)
+        else:
+            portsOfCurrentModule = module["port"].split(",")
+
+        # check if ports of current module matches nmap scan
+        for currModPort in portsOfCurrentModule:
+            currModPort = currModPort.strip()
+
+            # skip module for current port 
+            # if list of targetable host is empty
+            if (not currModPort.isdigit() or not index.get(int(currModPort))):
+                continue
+
+            # only scan ports included by user
+            if (includePortFilter is not None):
+                if (not int(currModPort) in includePortFilter):
+                    continue
+
+            # skip ports excluded by user
+            if (excludePortFilter is not None):
+                if (int(currModPort) in excludePortFilter):
+                    continue
+
+            # append a copy of the module instead of a reference
+            # set only the matching portnumber inside port key
+            # otherwise createCommandFromTemplate will not
+            # be able to get correct portnumber
+            matchingModule = module.copy()
+            matchingModule["port"] = currModPort
+            matchingModules.append(matchingModule)
+
+    # create the commands of the modules that should run first first,
+    # the queue of the scheduler only orders the jobs it contains
+    matchingModules.sort(key = lambda module:
+                         getModulePriority(module, module["name"]))
+
+    profile.add("getMatchingModules", time.perf_counter() - startTime)
+    return matchingModules
+
+
+"""Return the amount of hosts per batch job of a module
+or 0 if the module is not executed in batches (see --batch).
+
+module = The module.
+"""
+def getBatchSize(module):
+    if (args.batch and "batchTemplate" in module):
+        return int(module.get("batchSize", defaultBatchSize))
+
+    return 0
+
+
+"""Return the amount of commands createCommandFromTemplate will create
+for the given modules (including commands that have already been executed).
+Modules executed in batches create one command per batchSize hosts.
+
+allExecutableModules = All modules that will be executed.
+index = The port index created by createPortIndex.
+"""
+def countCommands(allExecutableModules, index):
+    amountOfCommands = 0
+
+    for thisModule in allExecutableModules:
+        amountOfHosts = len(index[int(thisModule["port"])])
+        batchSize = getBatchSize(thisModule)
+
+        if (batchSize):
+            amountOfCommands += -(-amountOfHosts // batchSize)
+        else:
+            amountOfCommands += amountOfHosts
+
+    return amountOfCommands
+
+
+"""Return a job.
+If the output of the command is written by the executor,
+the printed command shows the equivalent shell command.
+
+module = The module the job is created from.
+name = The name of the job.
+host = The target host.
+command = The expanded command.
+outputFile = The path to the output file.
+streamOutput = True if the redirect of the output has been removed
+from the command (see getStreamedSyntax).
+portableCommand = The command in which the paths are still <variables>
+(see usesPortableCommands).
+portablePaths = A dictionary that maps the <variables> of portableCommand
+to the paths of this run.
+"""
+def createJob(module, name, host, command, outputFile, streamOutput,
+              portableCommand=None, portablePaths=None):
+    job = {"command": command,
+           "name": name,
+           "host": host,
+           "port": module["port"],
+           "outputFile": outputFile,
+           "module": module}
+
+    if (portableCommand is not None):
+        job["portableCommand"] = portableCommand
+        job["portablePaths"] = portablePaths
+
+    if (streamOutput):
+        suffix, compressor = outputCompressions[args.outputCompression]
+        job["outputFile"] = outputFile + suffix
+        job["execCommand"] = command
+        job["streamOutput"] = True
+        job["command"] = command + getOutputRedirect(job["outputFile"],
+                                                     compressor)
+
+        if (portableCommand is not None):
+            job["portableExecCommand"] = portableCommand
+            job["portableCommand"] = portableCommand + getOutputRedirect(
+                "<outputFile>" + suffix, compressor)
+
+    return job
+
+
+"""Return True if the commands are executed inside another output directory,
+so that the jobs need their commands with the paths as <variables>:
+the jobs of a plan file (see relocatePlanRecord)
+and the jobs of remote workers (see runWorker).
+"""
+def usesPortableCommands():
+    return bool(planFile or args.coordinator)
+
+
+"""Return the shell redirect that writes the output of a command
+to the given file (shown in the printed command of streamed jobs).
+
+outputFile = The path to the output file.
+compressor = The compressor command (see outputCompressions) or None.
+"""
+def getOutputRedirect(outputFile, compressor):
+    if (compressor):
+        return " 2>&1 | " + compressor + " > " + outputFile
+
+    return " > " + outputFile + " 2>&1"
+
+
+"""Return a job that executes the batchSyntax of a module
+once for the given jobs of single hosts.
+The targets are written to a file next to the output file of the batch.
+The output is split into the output files of the single hosts
+after the job has been finished (see splitBatchOutput).
+
+module = The module the jobs have been created from.
+hostJobs = The jobs of the single hosts.
+batchNumber = The number of the batch of the module and port.
+"""
+def createBatchJob(module, hostJobs, batchNumber):
+    batchName = (module["name"] + "-batch" + str(batchNumber)
+                 + "-" + module["port"])
+    batchOutput = args.output + "/" + module["name"] + "/" + batchName
+    pathToTargets = batchOutput + ".targets"
+    targetTemplate = commandTemplate(module.get("batchTarget", "<targetIp>"))
+
+    command = module["batchTemplate"].expand({"port": module["port"],
+                                              "targetFile": pathToTargets,
+                                              "outputFile": batchOutput})
+    portableCommand = None
+
+    if (usesPortableCommands()):
+        portableCommand = module["batchTemplate"].expand(
+            {"port": module["port"]})
+
+    # the batch is a single target for the caps of slotLimits
+    job = createJob(module, batchName, batchName, command, batchOutput,
+                    module.get("batchStreamOutput"), portableCommand,
+                    {"outputFile": batchOutput, "targetFile": pathToTargets})
+    job["batchJobs"] = hostJobs
+    job["targetFile"] = pathToTargets
+    job["targets"] = [targetTemplate.expand({"targetIp": hostJob["host"],
+                                             "port": module["port"]})
+                      for hostJob in hostJobs]
+
+    if (args.execute):
+        writeTargetFile(job)
+
+    return job
+
+
+"""Write the targets of a batch job to its target file.
+
+job = The batch job created by createBatchJob.
+"""
+def writeTargetFile(job):
+    with open(job["targetFile"], "w") as targetFile:
+        for target in job["targets"]:
+            targetFile.write(target + "\n")
+
+
+"""Yield jobs.
+Each job is a dictionary that contains the final command that will be executed,
+the name of the job, the target host and port, the output file
+and the module the job has been created from.
+Commands that have already been executed will not be executed again.
+With --resultCache the outputs of previous runs are reused (see resultCache).
+The compiled template of the module is expanded for every targetable host.
+With --batch, modules with a batchSyntax are executed once
+for up to batchSize hosts (see createBatchJob).
+
+allExecutableModules = All modules that will be executed.
+index = The port index created by createPortIndex.
+"""
+def createCommandFromTemplate(allExecutableModules, index):
+    global amountOfExecModules
+
+    for thisModule in allExecutableModules:
+        pathToModDir = args.output + "/" + thisModule["name"]
+
+        # create directories for modules
+        if (args.execute):
+            if (not os.path.isdir(pathToModDir)):
+                os.makedirs(pathToModDir)
+
+        template = thisModule["template"]
+        batchSize = getBatchSize(thisModule)
+        batchJobs = []
+        batchNumber = 1
+
+        # port and ip address are added to the output path
+        # in the order they occur inside the syntax
+        outputNameVars = [var for var in template.variables
+                          if var == "port" or var == "targetIp"]
+
+        # get list of hosts that can be targeted by current module
+        targetHosts = index[int(thisModule["port"])]
+
+        for host, fingerprint in targetHosts.items():
+            modOutput = pathToModDir + "/" + thisModule["name"]
+
+            for currArg in outputNameVars:
+                if (currArg == "port"):
+                    modOutput = modOutput + "-" + thisModule["port"]
+                else:
+                    modOutput = modOutput + "-" + host
+
+            exeString = template.expand({"port": thisModule["port"],
+                                         "targetIp": host,
+                                         "outputFile": modOutput})
+
+            jobName = (thisModule["name"] + "-" + host + "-"
+                       + thisModule["port"])
+
+            # the paths stay <variables> inside the portable command
+            portableCommand = None
+
+            if (usesPortableCommands()):
+                portableCommand = template.expand({"port": thisModule["port"],
+                                               "targetIp": host})
+
+            job = createJob(thisModule, jobName, host, exeString, modOutput,
+                            thisModule.get("streamOutput"), portableCommand,
+                            {"outputFile": modOutput})
+
+            # the output file differs between runs
+            # and is not part of the key of the result cache
+            if (outputCache):
+                job["cacheKey"] = outputCache.getKey(
+                    job, template.expand({"port": thisModule["port"],
+                                          "targetIp": host}),
+                    fingerprint)
+
+            # check if tool has already been executed
+            # on --resume the journal decides, since a job
+            # that has been interrupted or failed leaves an output file
+            if (jobName in journalStates):
+                alreadyExecuted = journalStates[jobName] == "done"
+            else:
+                alreadyExecuted = (os.path.exists(modOutput)
+                                   or os.path.exists(job["outputFile"]))
+
+            # skipped hosts of batches are counted after the last batch
+            if (alreadyExecuted):
+                print(f"{bcolor.yellow}###[DUPLICATE]###\t{bcolor.ends} "
+                      + jobName)
+
+                if (not batchSize):
+                    amountOfExecModules -= 1
+
+            elif (outputCache and outputCache.restore(job)):
+                print(f"{bcolor.yellow}###[CACHED]###\t{bcolor.ends} "
+                      + jobName)
+
+                if (not batchSize):
+                    amountOfExecModules -= 1
+
+            elif (batchSize):
+                batchJobs.append(job)
+
+                if (len(batchJobs) == batchSize):
+                    yield createBatchJob(thisModule, batchJobs, batchNumber)
+                    batchJobs = []
+                    batchNumber += 1
+
+            else:
+                yield job
+
+        if (batchJobs):
+            yield createBatchJob(thisModule, batchJobs, batchNumber)
+            batchNumber += 1
+
+        # less batches than counted if hosts have been skipped
+        if (batchSize):
+            amountOfExecModules -= (-(-len(targetHosts) // batchSize)
+                                    - (batchNumber - 1))
+
+
+# file suffix and compressor command per value of --outputCompression
+outputCompressions = {"none": ["", None],
+                      "gzip": [".gz", "gzip"],
+                      "zstd": [".zst", "zstd"]}
+
+
+"""Write the output of a job to its output file.
+The output can be compressed on the fly (gzip inside this process,
+zstd by an external zstd process) and truncated after maxBytes bytes.
+Output after the limit is read and discarded, so that the tool is not blocked.
+If the output is neither compressed nor limited,
+the file can be passed directly to the process (direct = True).
+
+pathToOutput = The path to the output file.
+compression = The compression (see outputCompressions).
+maxBytes = The maximal amount of uncompressed bytes (0 = unlimited).
+"""
+class outputWriter:
+    def __init__(self, pathToOutput, compression, maxBytes):
+        self.maxBytes = maxBytes
+        self.writtenBytes = 0
+        self.truncated = False
+        self.compressor = None
+        self.direct = compression == "none" and not maxBytes
+
+        if (compression == "gzip"):
+            self.file = gzip.open(pathToOutput, "wb", compresslevel=6)
+            self.output = self.file
+
+        elif (compression == "zstd"):
+            self.file = open(pathToOutput, "wb")
+            self.compressor = subprocess.Popen(["zstd", "-q", "-c"],
+                                               stdin=subprocess.PIPE,
+                                               stdout=self.file)
+            self.output = self.compressor.stdin
+
+        else:
+            self.file = open(pathToOutput, "wb")
+            self.output = self.file
+
+    """Write a chunk of the output.
+
+    data = The bytes read from the process.
+    """
+    def write(self, data):
+        if (self.truncated):
+            return
+
+        if (self.maxBytes and self.writtenBytes + len(data) > self.maxBytes):
+            data = data[:self.maxBytes - self.writtenBytes]
+            data += (b"\n[autopen] output truncated after "
+                     + str(self.maxBytes).encode() + b" bytes\n")
+            self.truncated = True
+
+        self.writtenBytes += len(data)
+        self.output.write(data)
+
+    """Copy the given stream until it is closed and close the output file.
+
+    stream = The stdout of the process.
+    """
+    def copyFrom(self, stream):
+        try:
+            while 1:
+                data = stream.read1(65536)
+
+                if (not data):
+                    break
+
+                self.write(data)
+        finally:
+            stream.close()
+            self.close()
+
+    """Same as copyFrom inside the event loop of the async engine.
+
+    readFd = The file descriptor of the read end of the pipe.
+    """
+    async def copyFromAsync(self, readFd):
+        import asyncio
+
+        stream = asyncio.StreamReader()
+        transport = None
+
+        try:
+            transport, protocol = await asyncio.get_running_loop(
+                ).connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stream),
+                                    os.fdopen(readFd, "rb", 0))
+
+            while 1:
+                data = await stream.read(65536)
+
+                if (not data):
+                    break
+
+                self.write(data)
+        finally:
+            if (transport):
+                transport.close()
+
+            self.close()
+
+    """Flush and close the output file."""
+    def close(self):
+        if (self.compressor):
+            self.compressor.stdin.close()
+            self.compressor.wait()
+
+        self.file.close()
+
+
+# allowed values of the batchSplit key of modules
+batchSplitModes = ["lines", "blocks", "link"]
+
+# default amount of hosts per batch
+defaultBatchSize = 256
+
+
+"""Yield the lines of an output file, compressed files are decompressed.
+
+pathToOutput = The path to the output file.
+"""
+def iterOutputLines(pathToOutput):
+    if (pathToOutput.endswith(".gz")):
+        with gzip.open(pathToOutput, "rb") as file:
+            yield from file
+
+    elif (pathToOutput.endswith(".zst")):
+        process = subprocess.Popen(["zstd", "-q", "-d", "-c", pathToOutput],
+                                   stdout=subprocess.PIPE)
+
+        try:
+            yield from process.stdout
+        finally:
+            process.stdout.close()
+            process.wait()
+
+    else:
+        with open(pathToOutput, "rb") as file:
+            yield from file
+
+
+"""Split the output of a finished batch job
+into the output files of the single hosts.
+The batchSplit key of the module decides how the output is split:
+lines = every line is written to the hosts mentioned inside the line
+blocks = lines without host belong to the host of the previous line
+(e.g. 'Nmap scan report for 10.0.0.1' starts the block of a host)
+link = every host gets a copy of the whole output (see copyFile)
+
+job = The finished batch job created by createBatchJob.
+"""
+def splitBatchOutput(job):
+    splitMode = job["module"].get("batchSplit", "lines")
+
+    if (splitMode == "link"):
+        for hostJob in job["batchJobs"]:
+            copyFile(job["outputFile"], hostJob["outputFile"])
+        return
+
+    allWriters = {}
+
+    for hostJob in job["batchJobs"]:
+        if (hostJob.get("streamOutput")):
+            compression = args.outputCompression
+        else:
+            compression = "none"
+
+        allWriters[hostJob["host"].encode()] = outputWriter(
+            hostJob["outputFile"], compression, 0)
+
+    # a host must not match inside of another ip address (10.0.0.1 in 10.0.0.10)
+    hostPattern = re.compile(rb"(?<![\w.:])("
+                             + b"|".join(re.escape(host) for host
+                                         in sorted(allWriters, key=len,
+                                                   reverse=True))
+                             + rb")(?![\w]|\.\d)")
+    currentHosts = []
+
+    try:
+        for line in iterOutputLines(job["outputFile"]):
+            lineHosts = set(hostPattern.findall(line))
+
+            if (lineHosts):
+                currentHosts = lineHosts
+            elif (splitMode == "lines"):
+                continue
+
+            for host in currentHosts:
+                allWriters[host].write(line)
+    finally:
+        for writer in allWriters.values():
+            writer.close()
+
+
+# categories of nmap scripts, the scripts of a category are not known
+nmapScriptCategories = ["all", "auth", "broadcast", "brute", "default",
+                        "discovery", "dos", "exploit", "external", "fuzzer",
+                        "intrusive", "malware", "safe", "version", "vuln"]
+
+
+"""Return the options and the list of script expressions
+of a module that only executes nmap scripts against a single port
+('nmap options --script "scripts" <targetIp> -p <port> > <outputFile> 2>&1')
+or None if the module can not be coalesced with other nmap modules.
+Only script names and wildcards are supported (no categories),
+since the results are assigned to the modules by the names of the scripts.
+
+module = The module.
+"""
+def getNmapScriptOptions(module):
+    match = re.fullmatch(r"nmap ([^<>|;&\"']*?) --script (\"[^\"]+\"|[^\s\"']+)"
+                         + r" <targetIp> -p <port> > <outputFile> 2>&1",
+                         module["syntax"])
+
+    if (not match):
+        return None
+
+    allScripts = match.group(2).strip('"').split(",")
+
+    for script in allScripts:
+        if (not re.fullmatch(r"[\w.*?-]+", script)
+            or script in nmapScriptCategories):
+            return None
+
+    return [match.group(1), allScripts]
+
+
+# the timeout of a merged nmap job is at most the longest timeout
+# of its modules multiplied by this factor
+coalescedTimeoutFactor = 2
+
+
+"""Return a single nmap job that executes the scripts
+and scans the ports of the given jobs of a host.
+
+host = The host of the jobs.
+options = The nmap options of the jobs.
+hostJobs = The jobs of the nmap script modules.
+"""
+def createMergedNmapJob(host, options, hostJobs):
+    allScripts = []
+    allPorts = []
+
+    for hostJob in hostJobs:
+        for script in getNmapScriptOptions(hostJob["module"])[1]:
+            if (not script in allScripts):
+                allScripts.append(script)
+
+        if (not hostJob["port"] in allPorts):
+            allPorts.append(hostJob["port"])
+
+    # the merged job runs longer than a single module,
+    # but not as long as all modules one after another
+    allTimeouts = [float(hostJob["module"].get("timeout", args.timeout))
+                   for hostJob in hostJobs]
+    mergedModule = {"name": "nmap-scripts",
+                    "riskLevel": max(hostJob["module"]["riskLevel"]
+                                     for hostJob in hostJobs),
+                    "port": ",".join(allPorts),
+                    "priority": min(int(hostJob["module"].get(
+                                        "priority", defaultPriority))
+                                    for hostJob in hostJobs),
+                    "slotWeight": max(int(hostJob["module"].get(
+                                          "slotWeight", 1))
+                                      for hostJob in hostJobs),
+                    "timeout": min(sum(allTimeouts),
+                                   max(allTimeouts) * coalescedTimeoutFactor)}
+
+    pathToModDir = args.output + "/" + mergedModule["name"]
+
+    if (args.execute):
+        os.makedirs(pathToModDir, exist_ok=True)
+
+    jobName = mergedModule["name"] + "-" + host
+    outputFile = pathToModDir + "/" + jobName
+    commandPrefix = ("nmap " + options + " --script \"" + ",".join(allScripts)
+                     + "\" " + host + " -p " + mergedModule["port"] + " -oX ")
+    portableCommand = None
+
+    if (usesPortableCommands()):
+        portableCommand = commandPrefix + "<outputFile>.xml"
+
+    mergedJob = createJob(mergedModule, jobName, host,
+                          commandPrefix + outputFile + ".xml", outputFile,
+                          True, portableCommand, {"outputFile": outputFile})
+    mergedJob["xmlFile"] = outputFile + ".xml"
+    mergedJob["coalescedJobs"] = hostJobs
+    return mergedJob
+
+
+"""Yield the given jobs and merge the jobs of nmap script modules
+for the same host and the same nmap options into a single nmap job
+with combined --script and -p lists.
+All other jobs are passed through immediately.
+The jobs are expected in the order of the modules (createCommandFromTemplate),
+the merged jobs of a host are yielded as soon as the jobs of all
+nmap script modules that target the host have been created.
+The result is split into the output files of the modules
+afterwards (see splitNmapOutput).
+
+jobs = The jobs created by createCommandFromTemplate.
+allExecutableModules = The modules the jobs are created from.
+index = The port index the jobs are created from.
+"""
+def coalesceNmapJobs(jobs, allExecutableModules, index):
+    nmapModules = []
+    reportedModules = set()
+
+    for module in allExecutableModules:
+        if (getNmapScriptOptions(module) is not None):
+            nmapModules.append(module)
+
+        # the module is executed on its own
+        elif (module.get("syntax", "").startswith("nmap ")
+              and "--script" in module["syntax"]
+              and not module["name"] in reportedModules):
+            reportedModules.add(module["name"])
+            print(f"{bcolor.yellow}###[NOT COALESCED]###\t{bcolor.ends} "
+                  + module["name"] + " - only script names and wildcards"
+                  + " can be coalesced")
+
+    # the amount of nmap script modules per host
+    # whose jobs have not been created yet
+    pendingModules = collections.Counter()
+
+    for module in nmapModules:
+        pendingModules.update(index[int(module["port"])].keys())
+
+    modulePositions = {id(module): position for position, module
+                       in enumerate(allExecutableModules)}
+    nmapModuleIds = {id(module) for module in nmapModules}
+    nmapJobs = {}
+    finishedPosition = 0
+
+    # merge the jobs of the hosts whose nmap script modules are finished
+    def finishModules(position):
+        nonlocal finishedPosition
+        global amountOfExecModules
+
+        for module in allExecutableModules[finishedPosition:position]:
+            if (not id(module) in nmapModuleIds):
+                continue
+
+            for host in index[int(module["port"])]:
+                pendingModules[host] -= 1
+
+                if (pendingModules[host] > 0 or not host in nmapJobs):
+                    continue
+
+                for options, hostJobs in nmapJobs.pop(host).items():
+                    if (len(hostJobs) == 1):
+                        yield hostJobs[0]
+                    else:
+                        amountOfExecModules -= len(hostJobs) - 1
+                        yield createMergedNmapJob(host, options, hostJobs)
+
+        finishedPosition = max(finishedPosition, position)
+
+    for job in jobs:
+        # all modules before the module of the job are finished
+        yield from finishModules(modulePositions.get(id(job["module"]),
+                                                     finishedPosition))
+
+        if (not id(job["module"]) in nmapModuleIds or "batchJobs" in job):
+            yield job
+        else:
+            options = getNmapScriptOptions(job["module"])[0]
+            nmapJobs.setdefault(job["host"], {}).setdefault(
+                options, []).append(job)
+
+    yield from finishModules(len(allExecutableModules))
+
+
+"""Return the text of a script element of an nmap xml file
+in the format of the normal output of nmap.
+
+scriptElement = The script element.
+"""
+def formatNmapScript(scriptElement):
+    allLines = scriptElement.get("output", "").rstrip("\n").split("\n")
+    allLines[0] = scriptElement.get("id", "") + ": " + allLines[0]
+
+    if (len(allLines) == 1):
+        return "|_" + allLines[0] + "\n"
+
+    return ("| " + allLines[0] + "\n"
+            + "".join("|" + line + "\n" for line in allLines[1:-1])
+            + "|_" + allLines[-1] + "\n")
+
+
+"""Write the results of a finished coalesced nmap job
+into the output files of the merged modules.
+Every module gets the state of its port and the output of the scripts
+that match its script expressions (same format as the normal output of nmap).
+
+job = The finished job created by coalesceNmapJobs.
+"""
+def splitNmapOutput(job):
+    hostElement = ET.parse(job["xmlFile"]).find("host")
+
+    for hostJob in job["coalescedJobs"]:
+        allScripts = getNmapScriptOptions(hostJob["module"])[1]
+
+        def isScriptOfModule(scriptElement):
+            return any(fnmatch.fnmatchcase(scriptElement.get("id", ""), script)
+                       for script in allScripts)
+
+        if (hostJob.get("streamOutput")):
+            compression = args.outputCompression
+        else:
+            compression = "none"
+
+        writer = outputWriter(hostJob["outputFile"], compression, 0)
+
+        try:
+            writer.write(("Nmap scan report for " + hostJob["host"]
+                          + "\n").encode())
+
+            if (hostElement is None):
+                writer.write(b"Host seems down.\n")
+                continue
+
+            writer.write(b"PORT\tSTATE\tSERVICE\tVERSION\n")
+
+            for portElement in hostElement.iter("port"):
+                if (portElement.get("portid") != hostJob["port"]):
+                    continue
+
+                stateElement = portElement.find("state")
+                serviceElement = portElement.find("service")
+                portLine = [portElement.get("portid") + "/"
+                            + portElement.get("protocol", "tcp"),
+                            "" if stateElement is None
+                            else stateElement.get("state", ""),
+                            "", ""]
+
+                if (serviceElement is not None):
+                    portLine[2] = serviceElement.get("name", "")
+                    portLine[3] = " ".join(
+                        serviceElement.get(key) for key
+                        in ["product", "version", "extrainfo"]
+                        if serviceElement.get(key))
+
+                writer.write(("\t".join(portLine) + "\n").encode())
+
+                for scriptElement in portElement.iter("script"):
+                    if (isScriptOfModule(scriptElement)):
+                        writer.write(formatNmapScript(scriptElement).encode())
+
+            hostScripts = [scriptElement for scriptElement
+                           in hostElement.findall("hostscript/script")
+                           if isScriptOfModule(scriptElement)]
+
+            if (hostScripts):
+                writer.write(b"\nHost script results:\n")
+
+                for scriptElement in hostScripts:
+                    writer.write(formatNmapScript(scriptElement).encode())
+        finally:
+            writer.close()
+
+
+# seconds between SIGTERM and SIGKILL when the processes of a job are stopped
+killGracePeriod = 5
+
+# process groups of all running jobs, stopped on exit (see stopRunningJobs)
+runningProcessGroups = set()
+
+# module key, ulimit option and factor of the optional resource limits
+resourceLimits = [["cpuLimit", "-t", 1],
+                  ["memoryLimit", "-v", 1024],
+                  ["fileLimit", "-n", 1]]
+
+
+"""Return the command with the resource limits of its module:
+cpuLimit = CPU seconds, memoryLimit = megabytes of address space
+and fileLimit = open files.
+The limits are set by the shell before the command is executed,
+so that they apply to all processes started by the command.
+If a limit can not be set, the command is not executed.
+
+module = The module of the job.
+command = The command that will be executed inside a shell.
+"""
+def getLimitedCommand(module, command):
+    limitCalls = ["ulimit " + option + " " + str(int(module[key]) * factor)
+                  + " || exit 126; "
+                  for key, option, factor in resourceLimits if key in module]
+
+    return "".join(limitCalls) + command
+
+
+"""Send a signal to all processes of a process group.
+Returns False if the process group does not exist anymore.
+
+processGroup = The id of the process group (the pid of the started process).
+sig = The signal (0 only checks for existence).
+"""
+def signalProcessGroup(processGroup, sig):
+    try:
+        os.killpg(processGroup, sig)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # a setuid tool inside the group, the others got the signal
+        pass
+
+    return True
+
+
+"""Stop all remaining processes of a process group
+(e.g. tools started in the background or the tool of a killed shell).
+Sends SIGTERM and SIGKILL to the processes that are still running
+after killGracePeriod seconds.
+The process that started the group must have been reaped,
+otherwise it is still part of the group as zombie.
+
+processGroup = The id of the process group.
+"""
+def stopProcessGroup(processGroup):
+    if (signalProcessGroup(processGroup, signal.SIGTERM)):
+        deadline = time.monotonic() + killGracePeriod
+
+        while (time.monotonic() < deadline):
+            time.sleep(0.1)
+
+            if (not signalProcessGroup(processGroup, 0)):
+                break
+        else:
+            signalProcessGroup(processGroup, signal.SIGKILL)
+
+    runningProcessGroups.discard(processGroup)
+
+
+"""Stop the process groups of all running jobs,
+used on exit and after a keyboard interrupt.
+Every job is started inside its own session, therefore a keyboard
+interrupt or the exit of autopen does not reach the tools.
+"""
+def stopRunningJobs():
+    allProcessGroups = list(runningProcessGroups)
+
+    for processGroup in allProcessGroups:
+        signalProcessGroup(processGroup, signal.SIGTERM)
+
+    deadline = time.monotonic() + killGracePeriod
+
+    while (time.monotonic() < deadline
+           and any(signalProcessGroup(processGroup, 0)
+                   for processGroup in allProcessGroups)):
+        time.sleep(0.1)
+
+    for processGroup in allProcessGroups:
+        signalProcessGroup(processGroup, signal.SIGKILL)
+        runningProcessGroups.discard(processGroup)
+
+
+# maximal interval in seconds between two samples of the peak memory of a job,
+# the first samples are taken earlier, since most tools are short-lived
+memorySampleInterval = 0.5
+
+
+"""Return the highest peak resident set size (VmHWM) in kB
+of the given process and its descendants (0 if none of them is running).
+The descendants are read from /proc/<pid>/task/<tid>/children.
+Unlike ru_maxrss, VmHWM does not contain the peak memory autopen had
+when the process has been forked, since it belongs to the executed program.
+
+pid = The process id.
+"""
+def getProcessTreePeakRss(pid):
+    peakRssKb = 0
+    allPids = [pid]
+
+    while (allPids):
+        currPid = str(allPids.pop())
+
+        try:
+            with open("/proc/" + currPid + "/status", "rb") as statusFile:
+                for line in statusFile:
+                    if (line.startswith(b"VmHWM:")):
+                        peakRssKb = max(peakRssKb, int(line.split()[1]))
+                        break
+
+            for taskId in os.listdir("/proc/" + currPid + "/task"):
+                with open("/proc/" + currPid + "/task/" + taskId
+                          + "/children", "rb") as childrenFile:
+                    allPids.extend(int(childPid) for childPid
+                                   in childrenFile.read().split())
+        except (OSError, ValueError):
+            continue
+
+    return peakRssKb
+
+
+"""Wait for the termination of the given child process without reaping it
+and return the highest peak memory of the process and its descendants
+(see getProcessTreePeakRss) sampled while waiting.
+Growth within the last interval before the termination is not sampled.
+The process is waited for through a pidfd,
+without pidfd support (Linux < 5.3) it is polled.
+
+pid = The process id of the child process.
+"""
+def waitForExit(pid):
+    peakRssKb = 0
+    interval = 0.01
+
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        pidfd = None
+
+    try:
+        while (1):
+            peakRssKb = max(peakRssKb, getProcessTreePeakRss(pid))
+
+            if (pidfd is not None):
+                if (select.select([pidfd], [], [], interval)[0]):
+                    break
+
+            elif (os.waitid(os.P_PID, pid,
+                            os.WEXITED | os.WNOWAIT | os.WNOHANG)):
+                break
+
+            else:
+                time.sleep(interval)
+
+            interval = min(interval * 2, memorySampleInterval)
+    finally:
+        if (pidfd is not None):
+            os.close(pidfd)
+
+    return peakRssKb
+
+
+"""Return a list with the exit code of the process, a flag
+that is True if the process has been killed after the timeout,
+the resource usage of the process and its waited-for children
+and the sampled peak memory in kB (see waitForExit, None if not sampled):
+[0, False, resourceUsage, 2048]
+The process must have been started inside its own session.
+After the timeout, the whole process group gets SIGTERM
+and SIGKILL after killGracePeriod seconds.
+Processes of the group that are still running
+after the termination of the process are stopped (see stopProcessGroup).
+
+process = The started subprocess.Popen object.
+timeout = The timeout in seconds (None = no timeout).
+"""
+def waitForProcess(process, timeout):
+    lock = threading.Lock()
+    processState = {"exited": False, "timedOut": False}
+
+    def killProcess(sig):
+        with lock:
+            # never send a signal to a process that has already been reaped
+            if (not processState["exited"]):
+                processState["timedOut"] = True
+                signalProcessGroup(process.pid, sig)
+
+    allTimers = []
+
+    if (timeout is not None):
+        allTimers = [threading.Timer(timeout, killProcess,
+                                     args=(signal.SIGTERM,)),
+                     threading.Timer(timeout + killGracePeriod, killProcess,
+                                     args=(signal.SIGKILL,))]
+
+    for timer in allTimers:
+        timer.daemon = True
+        timer.start()
+
+    # wait for the termination without reaping the process
+    peakRssKb = waitForExit(process.pid)
+
+    with lock:
+        processState["exited"] = True
+
+    for timer in allTimers:
+        timer.cancel()
+
+    # reap the process and get its resource usage
+    pid, status, resourceUsage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    stopProcessGroup(process.pid)
+
+    return [process.returncode, processState["timedOut"], resourceUsage,
+            peakRssKb or None]
+
+
+"""Return a dictionary with the result of the executed job:
+state = One of 'done', 'failed' or 'timeout'.
+exitCode = The exit code of the command (None after a timeout).
+resourceUsage = The resource usage of the command.
+maxRssKb = The sampled peak memory of the command in kB (see waitForExit).
+Execute given tool inside a shell and wait for its termination.
+
+job = The job created by createCommandFromTemplate.
+"""
+def executeModule(job):
+    writer = None
+    copyThread = None
+
+    # run command in new shell and session and wait for termination
+    if (job.get("streamOutput")):
+        writer = outputWriter(job["outputFile"], args.outputCompression,
+                              int(args.maxOutputSize) * 1024 * 1024)
+        command = getLimitedCommand(job["module"], job["execCommand"])
+
+        if (writer.direct):
+            process = subprocess.Popen(command, shell=True,
+                                       stdout=writer.file,
+                                       stderr=subprocess.STDOUT,
+                                       start_new_session=True)
+            writer.close()
+
+        else:
+            process = subprocess.Popen(command, shell=True,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT,
+                                       start_new_session=True)
+            copyThread = threading.Thread(target=writer.copyFrom,
+                                          args=(process.stdout,), daemon=True)
+            copyThread.start()
+
+    else:
+        process = subprocess.Popen(getLimitedCommand(job["module"],
+                                                     job["command"]),
+                                   shell=True, stdout=subprocess.DEVNULL,
+                                   start_new_session=True)
+
+    runningProcessGroups.add(process.pid)
+
+    timeout = getTimeout(job)
+    exitCode, timedOut, resourceUsage, peakRssKb = waitForProcess(process,
+                                                                  timeout)
+
+    # children of a killed process can keep the pipe open,
+    # the thread closes the output file as soon as they terminate
+    if (copyThread):
+        copyThread.join(5 if timedOut else None)
+
+    result = {"exitCode": exitCode, "resourceUsage": resourceUsage,
+              "timeout": timeout, "truncated": bool(writer and writer.truncated),
+              "maxRssKb": peakRssKb}
+
+    if (timedOut):
+        print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " + job["command"])
+        result["state"] = "timeout"
+        result["exitCode"] = None
+    else:
+        result["state"] = getJobState(job, exitCode)
+        splitFinishedJob(job, result)
+
+    return result
+
+
+"""Split the output of a successfully finished batch job (see splitBatchOutput)
+or coalesced nmap job (see splitNmapOutput)
+and mark the job as failed if this is not possible.
+
+job = The finished job.
+result = The result of the job.
+"""
+def splitFinishedJob(job, result):
+    if (result["state"] != "done"):
+        return
+
+    try:
+        if ("batchJobs" in job):
+            splitBatchOutput(job)
+
+        elif ("coalescedJobs" in job):
+            splitNmapOutput(job)
+    except (OSError, ET.ParseError) as exc:
+        print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " + job["name"]
+              + " - unable to split output: " + str(exc))
+        result["state"] = "failed"
+
+
+"""Print the result of a terminated job and return its state.
+
+job = The job created by createCommandFromTemplate.
+exitCode = The exit code of the command.
+"""
+def getJobState(job, exitCode):
+    # skip error code 124 
+    # since timeout is necessary for the usage of netcat
+    # skip error code 3 of module ssh-audit
+    if (exitCode == 0 or exitCode == 124
+        or (exitCode == 3 and "ssh-audit" in job["command"])):
+        print(f"{bcolor.green}###[DONE]###\t{bcolor.ends} " + job["name"])
+        return "done"
+
+    print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " + job["command"])
+    return "failed"
+
+
+"""Return the arguments of a command that can be executed without a shell
+or None if the command uses any feature of the shell.
+
+command = The command of a job without the redirect of its output.
+"""
+def getExecArguments(command):
+    if (re.search(r"[|&;<>()$`*?\[\]{}~!#\\\n]", command)):
+        return None
+
+    try:
+        allArguments = shlex.split(command)
+    except ValueError:
+        return None
+
+    # environment variables are set by the shell
+    if (not allArguments or "=" in allArguments[0]):
+        return None
+
+    return allArguments
+
+
+"""Wait for the termination of the given child process inside the event loop
+without reaping it and return the highest peak memory of the process
+and its descendants sampled while waiting (see waitForExit).
+The pidfd of the process is watched by the event loop,
+without pidfd support (Linux < 5.3) the process is polled.
+
+pid = The process id of the child process.
+"""
+async def waitForExitAsync(pid):
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+    peakRssKb = 0
+    interval = 0.01
+
+    def setExited():
+        if (not exited.done()):
+            exited.set_result(None)
+
+    try:
+        pidfd = os.pidfd_open(pid)
+        loop.add_reader(pidfd, setExited)
+    except (AttributeError, OSError):
+        pidfd = None
+
+    try:
+        while (1):
+            peakRssKb = max(peakRssKb, getProcessTreePeakRss(pid))
+
+            if (pidfd is None and os.waitid(os.P_PID, pid, os.WEXITED
+                                            | os.WNOWAIT | os.WNOHANG)):
+                break
+
+            await asyncio.wait([exited], timeout=interval)
+
+            if (exited.done()):
+                break
+
+            interval = min(interval * 2, memorySampleInterval)
+    finally:
+        if (pidfd is not None):
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+
+    return peakRssKb
+
+
+"""Execute the command of a job inside the event loop of the async engine.
+Commands whose output is written by autopen are executed without a shell
+if possible, all other commands are executed by /bin/sh.
+The processes are not started by asyncio, so that no child watcher of asyncio
+is involved: the event loop waits for them through pidfds
+(see waitForExitAsync) and they are reaped by os.wait4.
+Returns the same result as executeModule.
+
+job = The job created by createCommandFromTemplate.
+"""
+async def executeModuleAsync(job):
+    import asyncio
+
+    timeout = getTimeout(job)
+    writer = None
+    copyTask = None
+
+    if (job.get("streamOutput")):
+        writer = outputWriter(job["outputFile"], args.outputCompression,
+                              int(args.maxOutputSize) * 1024 * 1024)
+        command = getLimitedCommand(job["module"], job["execCommand"])
+        execArguments = getExecArguments(command)
+
+        if (not execArguments):
+            execArguments = ["/bin/sh", "-c", command]
+
+        if (writer.direct):
+            try:
+                process = subprocess.Popen(execArguments, stdout=writer.file,
+                                           stderr=subprocess.STDOUT,
+                                           start_new_session=True)
+            finally:
+                writer.close()
+
+        # the output is copied by the event loop
+        else:
+            readFd, writeFd = os.pipe()
+
+            try:
+                process = subprocess.Popen(execArguments, stdout=writeFd,
+                                           stderr=subprocess.STDOUT,
+                                           start_new_session=True)
+            except Exception:
+                os.close(readFd)
+                writer.close()
+                raise
+            finally:
+                os.close(writeFd)
+
+            copyTask = asyncio.ensure_future(writer.copyFromAsync(readFd))
+
+    else:
+        process = subprocess.Popen(["/bin/sh", "-c",
+                                    getLimitedCommand(job["module"],
+                                                      job["command"])],
+                                   stdout=subprocess.DEVNULL,
+                                   start_new_session=True)
+
+    runningProcessGroups.add(process.pid)
+
+    # the process is not reaped before os.wait4,
+    # so the signals never reach another process with the same pid
+    exitTask = asyncio.ensure_future(waitForExitAsync(process.pid))
+
+    try:
+        peakRssKb = await asyncio.wait_for(asyncio.shield(exitTask), timeout)
+        timedOut = False
+    except asyncio.TimeoutError:
+        # the process group gets SIGKILL if SIGTERM is ignored
+        signalProcessGroup(process.pid, signal.SIGTERM)
+
+        try:
+            peakRssKb = await asyncio.wait_for(asyncio.shield(exitTask),
+                                               killGracePeriod)
+        except asyncio.TimeoutError:
+            signalProcessGroup(process.pid, signal.SIGKILL)
+            peakRssKb = await exitTask
+
+        timedOut = True
+
+    # the process has exited, os.wait4 does not block
+    pid, status, resourceUsage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # stop remaining processes of the group without blocking the event loop
+    if (signalProcessGroup(process.pid, 0)):
+        await asyncio.get_running_loop().run_in_executor(
+            None, stopProcessGroup, process.pid)
+    else:
+        runningProcessGroups.discard(process.pid)
+
+    # children of a killed process can keep the pipe open
+    if (copyTask):
+        try:
+            await asyncio.wait_for(copyTask, 5 if timedOut else None)
+        except asyncio.TimeoutError:
+            pass
+
+    result = {"exitCode": process.returncode, "resourceUsage": resourceUsage,
+              "timeout": timeout,
+              "truncated": bool(writer and writer.truncated),
+              "maxRssKb": peakRssKb or None}
+
+    if (timedOut):
+        print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " + job["command"])
+        result["state"] = "timeout"
+        result["exitCode"] = None
+    else:
+        result["state"] = getJobState(job, process.returncode)
+        await asyncio.get_running_loop().run_in_executor(
+            None, splitFinishedJob, job, result)
+
+    return result
+
+
+"""Append-only journal of all jobs of a run.
+Every state change of a job is written as one JSON line,
+the file is flushed after every line,
+so that a crashed run can be resumed (see --resume).
+Also used to write the metrics of finished jobs.
+
+pathToJournal = The path to the journal file.
+"""
+class runJournal:
+    def __init__(self, pathToJournal):
+        self.lock = threading.Lock()
+        self.file = open(pathToJournal, "a", encoding="utf-8")
+
+    """Append a record for a job.
+
+    job = The job created by createCommandFromTemplate.
+    state = The new state of the job.
+    extraFields = Additional keys that will be added to the record.
+    """
+    def write(self, job, state, **extraFields):
+        record = {"name": job["name"], "state": state, "time": time.time()}
+        record.update(extraFields)
+        line = json.dumps(record) + "\n"
+
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    """Close the journal file."""
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+"""Return a dictionary that maps the name of every job
+to the last state written to the given journal file.
+A job with the last state 'running' has been interrupted by a crash.
+
+pathToJournal = The path to the journal file.
+"""
+def loadJournalStates(pathToJournal):
+    jobStates = {}
+
+    if (not os.path.exists(pathToJournal)):
+        return jobStates
+
+    with open(pathToJournal, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # skip line that has been written partially
+                continue
+
+            jobStates[record["name"]] = record["state"]
+
+    for name, state in jobStates.items():
+        if (state == "running"):
+            jobStates[name] = "interrupted"
+
+    return jobStates
+
+
+"""Durations of successfully finished jobs of previous runs per module.
+The durations are stored inside the cache directory of autopen
+and are used to derive timeouts (see --adaptiveTimeout).
+
+pathToHistory = The path to the json file of the history.
+"""
+class durationHistory:
+    # amount of durations that are kept per module
+    maxSamples = 200
+
+    def __init__(self, pathToHistory):
+        self.pathToHistory = pathToHistory
+        self.lock = threading.Lock()
+        self.durations = self.load()
+        self.newDurations = {}
+
+    """Return the durations stored inside the history file."""
+    def load(self):
+        try:
+            with open(self.pathToHistory, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    """Add the duration of a successfully finished job.
+
+    moduleName = The name of the module.
+    duration = The wall time of the job in seconds.
+    """
+    def add(self, moduleName, duration):
+        with self.lock:
+            self.durations.setdefault(moduleName, []).append(duration)
+            self.newDurations.setdefault(moduleName, []).append(duration)
+
+    """Return the given percentile of the durations of a module
+    or None if there are less than minSamples durations.
+
+    moduleName = The name of the module.
+    percentile = The percentile between 0 and 100.
+    minSamples = The minimal amount of durations.
+    """
+    def getPercentile(self, moduleName, percentile, minSamples):
+        with self.lock:
+            durations = sorted(self.durations.get(moduleName, [])
+                               [-self.maxSamples:])
+
+        if (len(durations) < minSamples):
+            return None
+
+        index = min(len(durations) - 1,
+                    int(len(durations) * percentile / 100))
+        return durations[index]
+
+    """Add the durations of this run to the history file.
+    The file is read again, so that parallel runs do not overwrite
+    their durations.
+    """
+    def save(self):
+        with self.lock:
+            allDurations = self.load()
+
+            for moduleName, durations in self.newDurations.items():
+                allDurations[moduleName] = (allDurations.get(moduleName, [])
+                                            + durations)[-self.maxSamples:]
+
+            self.newDurations = {}
+
+        try:
+            os.makedirs(os.path.dirname(self.pathToHistory), exist_ok=True)
+
+            with open(self.pathToHistory + ".tmp", "w") as file:
+                json.dump(allDurations, file)
+
+            os.replace(self.pathToHistory + ".tmp", self.pathToHistory)
+        except OSError:
+            pass
+
+
+# ioctl of linux that shares the data blocks of two files (FICLONE)
+ficloneRequest = 0x40049409
+
+
+"""Copy a file to the given path.
+The file is never hard linked, since a tool appending to its output file
+would change the other file as well.
+File systems that support it share the data blocks (reflink)
+until one of the files is changed.
+The path is replaced atomically, since parallel runs share the result cache.
+
+source = The path to the existing file.
+destination = The path to the new file.
+"""
+def copyFile(source, destination):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    tmpDestination = (destination + ".tmp" + str(os.getpid()) + "-"
+                      + str(threading.get_ident()))
+
+    try:
+        with open(source, "rb") as sourceFile:
+            with open(tmpDestination, "wb") as destinationFile:
+                try:
+                    fcntl.ioctl(destinationFile.fileno(), ficloneRequest,
+                                sourceFile.fileno())
+                except OSError:
+                    shutil.copyfileobj(sourceFile, destinationFile)
+
+        shutil.copystat(source, tmpDestination)
+        os.replace(tmpDestination, destination)
+    except OSError:
+        if (os.path.exists(tmpDestination)):
+            os.remove(tmpDestination)
+
+        raise
+
+
+"""Outputs of successfully finished jobs of previous runs.
+The outputs are stored inside the cache directory of autopen
+under a key of the module, the command without the output file,
+the host, the port and the service fingerprint of the nmap scan,
+so that they can be reused by runs with another output directory.
+Outputs are copied between the cache and the output directory
+(see copyFile).
+
+pathToCache = The path to the directory of the cached outputs.
+maxAge = The maximal age of a reused output in seconds.
+"""
+class resultCache:
+    def __init__(self, pathToCache, maxAge):
+        self.pathToCache = pathToCache
+        self.maxAge = maxAge
+
+    """Return the key of a job.
+
+    job = The job created by createCommandFromTemplate.
+    command = The command of the job without the output file.
+    fingerprint = The service fingerprint of the port of the job.
+    """
+    def getKey(self, job, command, fingerprint):
+        # the suffix of a compressed output is part of the key,
+        # since the cached file has the format of the output file
+        keyFields = [job["module"]["name"], command, job["host"], job["port"],
+                     fingerprint, os.path.splitext(job["outputFile"])[1]]
+
+        return hashlib.sha256(json.dumps(keyFields).encode()).hexdigest()
+
+    """Return the path to the cached output of the given key.
+
+    key = The key returned by getKey.
+    """
+    def getPath(self, key):
+        return self.pathToCache + "/" + key[:2] + "/" + key
+
+    """Return True if a cached output of the job exists
+    and has been copied to its output file.
+    Without --execute the output file is not created.
+
+    job = The job created by createCommandFromTemplate.
+    """
+    def restore(self, job):
+        pathToCachedOutput = self.getPath(job["cacheKey"])
+
+        try:
+            if (time.time() - os.path.getmtime(pathToCachedOutput)
+                > self.maxAge):
+                return False
+
+            if (args.execute):
+                copyFile(pathToCachedOutput, job["outputFile"])
+        except OSError:
+            return False
+
+        return True
+
+    """Store the output of a successfully finished job.
+    The outputs of the hosts of batch jobs and coalesced nmap jobs
+    are stored separately.
+
+    job = The finished job.
+    """
+    def store(self, job):
+        for hostJob in job.get("batchJobs", job.get("coalescedJobs", [job])):
+            if (not "cacheKey" in hostJob):
+                continue
+
+            try:
+                copyFile(hostJob["outputFile"],
+                              self.getPath(hostJob["cacheKey"]))
+            except OSError:
+                pass
+
+    """Remove cached outputs that are older than maxAge."""
+    def prune(self):
+        try:
+            cacheDirs = list(os.scandir(self.pathToCache))
+        except OSError:
+            return
+
+        for cacheDir in cacheDirs:
+            try:
+                for entry in os.scandir(cacheDir.path):
+                    if (time.time() - entry.stat().st_mtime > self.maxAge):
+                        os.remove(entry.path)
+            except OSError:
+                pass
+
+
+"""Return the timeout in seconds of the given job (None = no timeout).
+With --adaptiveTimeout the timeout is the 95th percentile
+of the previous durations of the module multiplied by the given factor
+(at least 30 seconds), if at least 5 durations are known.
+Otherwise the timeout key of the module or the timeout given by user is used.
+Batch jobs use the batchTimeout key of the module
+or the timeout of a single host multiplied by the amount of hosts.
+
+job = The job created by createCommandFromTemplate.
+"""
+def getTimeout(job):
+    if ("timeout" in job):
+        return job["timeout"]
+
+    if (args.adaptiveTimeout):
+        percentile95 = history.getPercentile(getHistoryName(job), 95, 5)
+
+        if (percentile95 is not None):
+            return max(30.0, percentile95 * float(args.adaptiveTimeout))
+
+    timeout = float(job["module"].get("timeout", args.timeout))
+
+    if ("batchJobs" in job):
+        if ("batchTimeout" in job["module"]):
+            return float(job["module"]["batchTimeout"])
+
+        return timeout * len(job["batchJobs"])
+
+    return timeout
+
+
+"""Return the name under which the durations of a job are stored
+inside the durationHistory.
+Batch jobs are stored separately, since they scan several hosts.
+
+job = The job created by createCommandFromTemplate.
+"""
+def getHistoryName(job):
+    if ("batchJobs" in job):
+        return job["module"]["name"] + "-batch"
+
+    return job["module"]["name"]
+
+
+"""Return the hosts of a job (all hosts of a batch job).
+
+job = The job created by createCommandFromTemplate.
+"""
+def getJobHosts(job):
+    if ("batchJobs" in job):
+        return [hostJob["host"] for hostJob in job["batchJobs"]]
+
+    return [job["host"]]
+
+
+"""Collect the time spent inside the phases of the planning
+(reading the nmap results, matching modules and creating commands),
+so that the overhead of autopen can be measured apart from the tools
+(see --profile and benchmark/benchmark.py).
+"""
+class runProfile:
+    def __init__(self):
+        self.startTime = time.perf_counter()
+        self.phases = collections.defaultdict(float)
+        self.lock = threading.Lock()
+
+    """Add the duration of a phase.
+
+    phase = The name of the phase (the name of the measured function).
+    duration = The duration in seconds.
+    """
+    def add(self, phase, duration):
+        with self.lock:
+            self.phases[phase] += duration
+
+    """Yield the items of the given iterator and add the time spent
+    to create them to the given phase.
+    The time spent by the caller between two items is not added.
+
+    phase = The name of the phase.
+    iterator = The iterator or generator.
+    """
+    def iterate(self, phase, iterator):
+        iterator = iter(iterator)
+
+        while 1:
+            startTime = time.perf_counter()
+
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(phase, time.perf_counter() - startTime)
+                return
+
+            self.add(phase, time.perf_counter() - startTime)
+            yield item
+
+    """Write the phases, the statistics of the scheduler
+    and the peak memory to the given json file.
+
+    pathToProfile = The path to the json file.
+    schedulerStatistics = The statistics returned by getStatistics (or None).
+    """
+    def write(self, pathToProfile, schedulerStatistics):
+        profileData = {"wallTime": round(time.perf_counter() - self.startTime,
+                                         3),
+                       "phases": {phase: round(duration, 3)
+                                  for phase, duration in self.phases.items()},
+                       "plannedCommands": amountOfExecModules,
+                       "scheduler": schedulerStatistics,
+                       "peakRssKb": resource.getrusage(
+                           resource.RUSAGE_SELF).ru_maxrss,
+                       "peakChildRssKb": None}
+
+        # the highest sampled peak of a job (see waitForExit),
+        # ru_maxrss of the children contains the peak memory of autopen
+        peakChildRssKb = max([counters["maxRssKb"] for counters
+                              in summary.perModule.values()], default=0)
+
+        if (peakChildRssKb):
+            profileData["peakChildRssKb"] = peakChildRssKb
+
+        with open(pathToProfile, "w") as file:
+            json.dump(profileData, file, indent=4)
+            file.write("\n")
+
+
+"""Collect the planned jobs and the metrics of all finished jobs
+per module and per host for the summary at the end of a run.
+"""
+class runSummary:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.perModule = {}
+        self.perHost = {}
+
+    """Return the counters of the given key inside the given dictionary.
+
+    summaryDict = perModule or perHost.
+    key = The name of the module or the host.
+    """
+    def getCounters(self, summaryDict, key):
+        if (not key in summaryDict):
+            summaryDict[key] = {"planned": 0, "done": 0, "failed": 0,
+                                "timeout": 0, "duration": 0.0, "cpu": 0.0,
+                                "maxRssKb": 0, "outputBytes": 0}
+
+        return summaryDict[key]
+
+    """Count a planned job.
+
+    job = The job created by createCommandFromTemplate.
+    """
+    def addPlanned(self, job):
+        with self.lock:
+            self.getCounters(self.perModule, job["module"]["name"])["planned"] += 1
+
+            for host in getJobHosts(job):
+                self.getCounters(self.perHost, host)["planned"] += 1
+
+    """Add the metrics of a finished job.
+    The metrics of a batch job are shared equally by its hosts.
+
+    job = The job created by createCommandFromTemplate.
+    metrics = The metrics record of the job.
+    """
+    def addFinished(self, job, metrics):
+        allHosts = getJobHosts(job)
+
+        with self.lock:
+            allCounters = [[self.getCounters(self.perModule,
+                                             job["module"]["name"]), 1]]
+
+            for host in allHosts:
+                allCounters.append([self.getCounters(self.perHost, host),
+                                    len(allHosts)])
+
+            for counters, share in allCounters:
+                counters[metrics["state"]] += 1
+                counters["duration"] += metrics["duration"] / share
+                counters["cpu"] += (metrics["cpuUser"]
+                                    + metrics["cpuSystem"]) / share
+                counters["maxRssKb"] = max(counters["maxRssKb"],
+                                           metrics["maxRssKb"] or 0)
+                counters["outputBytes"] += metrics["outputBytes"] / share
+
+    """Print the summary table of the given dictionary.
+    Rows are sorted by the amount of planned jobs.
+
+    title = The headline of the table.
+    summaryDict = perModule or perHost.
+    """
+    def printTable(self, title, summaryDict):
+        print("")
+        print(f"{bcolor.purple}### " + title + f": ###{bcolor.ends}")
+
+        if (args.execute):
+            print("planned\tdone\tfailed\ttimeout\twall(s)\tcpu(s)\t"
+                  + "maxRSS(MB)\toutput(KB)\t - \tname")
+        else:
+            print("planned\t - \tname")
+
+        allRows = sorted(summaryDict.items(),
+                         key=lambda item: (item[1]["planned"], item[0]),
+                         reverse=True)
+
+        for key, counters in allRows:
+            if (args.execute):
+                print(str(counters["planned"]) + "\t" + str(counters["done"])
+                      + "\t" + str(counters["failed"]) + "\t"
+                      + str(counters["timeout"]) + "\t"
+                      + "%.1f" % counters["duration"] + "\t"
+                      + "%.1f" % counters["cpu"] + "\t"
+                      + ("%.1f" % (counters["maxRssKb"] / 1024)
+                         if counters["maxRssKb"] else "-") + "\t\t"
+                      + "%.1f" % (counters["outputBytes"] / 1024) + "\t\t - \t"
+                      + key)
+            else:
+                print(str(counters["planned"]) + "\t - \t" + key)
+
+    """Print the summary per module and per host."""
+    def print(self):
+        self.printTable("Summary per Module", self.perModule)
+        self.printTable("Summary per Host", self.perHost)
+
+    """Write the metrics per module in the Prometheus textfile format.
+    The file is replaced atomically.
+
+    pathToFile = The path to the Prometheus textfile.
+    """
+    def writePrometheus(self, pathToFile):
+        allMetrics = [
+            ["autopen_jobs_total", "counter", "Finished jobs per module and state.",
+             None],
+            ["autopen_job_duration_seconds_sum", "counter",
+             "Wall time of all jobs per module.", "duration"],
+            ["autopen_job_cpu_seconds_sum", "counter",
+             "CPU time (user and system) of all jobs per module.", "cpu"],
+            ["autopen_job_max_rss_bytes", "gauge",
+             "Peak resident set size of a job per module.", "maxRssKb"],
+            ["autopen_job_output_bytes_sum", "counter",
+             "Size of all output files per module.", "outputBytes"]]
+        lines = []
+
+        for metricName, metricType, metricHelp, counterKey in allMetrics:
+            lines.append("# HELP " + metricName + " " + metricHelp)
+            lines.append("# TYPE " + metricName + " " + metricType)
+
+            for module, counters in sorted(self.perModule.items()):
+                if (counterKey is None):
+                    for state in ["done", "failed", "timeout"]:
+                        lines.append(metricName + '{module="' + module
+                                     + '",state="' + state + '"} '
+                                     + str(counters[state]))
+                    continue
+
+                value = counters[counterKey]
+
+                if (counterKey == "maxRssKb"):
+                    # unknown if the jobs stayed below the peak of autopen
+                    if (not value):
+                        continue
+
+                    value = value * 1024
+
+                lines.append(metricName + '{module="' + module + '"} '
+                             + str(value))
+
+        with open(pathToFile + ".tmp", "w") as file:
+            file.write("\n".join(lines) + "\n")
+
+        os.replace(pathToFile + ".tmp", pathToFile)
+
+
+"""Keep track of the slots used by running jobs
+and decide which queued job is allowed to start next.
+Every job uses the amount of slots given by the slotWeight key of its module.
+Jobs are only started while the caps for concurrent jobs per host,
+per host and port and the maxPerHost key of their module are not reached.
+
+totalSlots = The amount of slots that can be used at the same time.
+maxPerHost = The maximal amount of concurrent jobs per host (0 = unlimited).
+maxPerPort = The maximal amount of concurrent jobs
+per host and port (0 = unlimited).
+"""
+class slotLimits:
+    def __init__(self, totalSlots, maxPerHost, maxPerPort):
+        self.totalSlots = totalSlots
+        self.maxPerHost = maxPerHost
+        self.maxPerPort = maxPerPort
+        self.usedSlots = 0
+        self.runningPerHost = collections.Counter()
+        self.runningPerPort = collections.Counter()
+        self.runningPerModule = collections.Counter()
+
+    """Return the amount of slots used by the given job.
+    A job never uses more than all slots.
+
+    job = The job created by createCommandFromTemplate.
+    """
+    def getWeight(self, job):
+        return min(int(job["module"].get("slotWeight", 1)), self.totalSlots)
+
+    """Return True if the given job can be started right now.
+
+    job = The job created by createCommandFromTemplate.
+    """
+    def canStart(self, job):
+        if (self.usedSlots + self.getWeight(job) > self.totalSlots):
+            return False
+
+        if (self.maxPerHost
+            and self.runningPerHost[job["host"]] >= self.maxPerHost):
+            return False
+
+        if (self.maxPerPort
+            and self.runningPerPort[(job["host"], job["port"])]
+                >= self.maxPerPort):
+            return False
+
+        maxPerHostOfModule = int(job["module"].get("maxPerHost", 0))
+
+        if (maxPerHostOfModule
+            and self.runningPerModule[(job["host"], job["module"]["name"])]
+                >= maxPerHostOfModule):
+            return False
+
+        return True
+
+    """Mark the slots of the given job as used.
+
+    job = The job that will be started.
+    """
+    def acquire(self, job):
+        self.usedSlots += self.getWeight(job)
+        self.runningPerHost[job["host"]] += 1
+        self.runningPerPort[(job["host"], job["port"])] += 1
+        self.runningPerModule[(job["host"], job["module"]["name"])] += 1
+
+    """Release the slots of the given job.
+
+    job = The job that has been finished.
+    """
+    def release(self, job):
+        self.usedSlots -= self.getWeight(job)
+        self.runningPerHost[job["host"]] -= 1
+        self.runningPerPort[(job["host"], job["port"])] -= 1
+        self.runningPerModule[(job["host"], job["module"]["name"])] -= 1
+
+        # keep the counters small on large networks
+        if (not self.runningPerHost[job["host"]]):
+            del self.runningPerHost[job["host"]]
+
+        if (not self.runningPerPort[(job["host"], job["port"])]):
+            del self.runningPerPort[(job["host"], job["port"])]
+
+        if (not self.runningPerModule[(job["host"], job["module"]["name"])]):
+            del self.runningPerModule[(job["host"], job["module"]["name"])]
+
+
+"""Return the key used to order modules and jobs (lower keys run first):
+(priority, riskLevel, expected duration)
+The expected duration is the median of the previous durations
+(see durationHistory) or the timeout if no duration is known,
+so that short modules with a high signal run first.
+With --order config all keys are equal.
+
+module = The module.
+historyName = The name of the durations inside the history.
+"""
+def getModulePriority(module, historyName):
+    if (args.order == "config"):
+        return (0, 0, 0.0)
+
+    expectedDuration = history.getPercentile(historyName, 50, 1)
+
+    if (expectedDuration is None):
+        expectedDuration = float(module.get("timeout", args.timeout))
+
+    return (int(module.get("priority", defaultPriority)),
+            int(module.get("riskLevel", 1)),
+            expectedDuration)
+
+
+"""Return the key used to order the given job (see getModulePriority).
+Discovery scans always run first.
+
+job = The job created by createCommandFromTemplate.
+"""
+def getJobPriority(job):
+    if (job.get("discovery")):
+        return (0, 0, 0.0)
+
+    return getModulePriority(job["module"], getHistoryName(job))
+
+
+# priority of modules without priority key
+defaultPriority = 5
+
+# amount of startable jobs with the same priority
+# that are compared to interleave the hosts
+interleaveWindow = 64
+
+
+"""Queue of jobs ordered by their priority (see getJobPriority).
+Jobs with the same priority keep the order they have been added in.
+
+"""
+class jobQueue:
+    def __init__(self):
+        self.heap = []
+        self.sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    """Return a list of all queued jobs (in no particular order)."""
+    def getJobs(self):
+        return [entry[2] for entry in self.heap]
+
+    """Add a job to the queue.
+    A job that is added again (e.g. after its worker died)
+    gets its previous position.
+
+    job = The job created by createCommandFromTemplate.
+    """
+    def push(self, job):
+        if (not "queueEntry" in job):
+            job["queueEntry"] = [getJobPriority(job), next(self.sequence)]
+
+        heapq.heappush(self.heap, job["queueEntry"] + [job])
+
+    """Remove and return the job that should be started next
+    or None if no queued job can be started.
+    Jobs that can not be started because of the caps of slotLimits are skipped.
+    Among the jobs with the same priority,
+    a job for a host with less running jobs is preferred,
+    so that the work is interleaved across hosts.
+
+    limits = The slotLimits object of the scheduler.
+    """
+    def popNext(self, limits):
+        skippedEntries = []
+        selectedEntry = None
+        comparedEntries = 0
+
+        while (self.heap):
+            entry = heapq.heappop(self.heap)
+            job = entry[2]
+
+            if (not limits.canStart(job)):
+                skippedEntries.append(entry)
+                continue
+
+            if (selectedEntry is None):
+                selectedEntry = entry
+
+            elif (entry[0] != selectedEntry[0]):
+                skippedEntries.append(entry)
+                break
+
+            elif (limits.runningPerHost[job["host"]]
+                  < limits.runningPerHost[selectedEntry[2]["host"]]):
+                skippedEntries.append(selectedEntry)
+                selectedEntry = entry
+
+            else:
+                skippedEntries.append(entry)
+
+            comparedEntries += 1
+
+            # no better job can be found
+            if (not limits.runningPerHost[selectedEntry[2]["host"]]
+                or comparedEntries >= interleaveWindow):
+                break
+
+        for entry in skippedEntries:
+            heapq.heappush(self.heap, entry)
+
+        if (selectedEntry is None):
+            return None
+
+        return selectedEntry[2]
+
+
+"""Execute jobs inside a fixed amount of worker threads.
+Jobs are added to a bounded queue by submit().
+A worker takes the next job as soon as enough slots are free
+and the concurrency caps of the job are not reached (see slotLimits),
+submit() blocks while the queue is full.
+The scheduler collects statistics about the queue depth
+and the utilisation of the slots.
+
+limits = The slotLimits object, its totalSlots is the amount of workers.
+queueSize = The maximal amount of queued jobs.
+jobJournal = The runJournal the states of the jobs are written to (or None).
+jobMetrics = The runJournal the metrics of the jobs are written to (or None).
+summary = The runSummary that collects the metrics (or None).
+"""
+class moduleScheduler:
+    def __init__(self, limits, queueSize, jobJournal, jobMetrics, summary):
+        self.queue = jobQueue()
+        self.queueSize = queueSize
+        self.limits = limits
+        self.journal = jobJournal
+        self.metrics = jobMetrics
+        self.summary = summary
+        self.lock = threading.Lock()
+        self.jobFinished = threading.Condition(self.lock)
+        self.notFull = threading.Condition(self.lock)
+        self.closed = False
+        self.running = {}
+        self.runningSince = {}
+
+        # used for the status of the progressReporter
+        self.finishedStates = collections.Counter()
+        self.recentlyFinished = collections.deque()
+
+        # used for statistics and the progress counter
+        self.submitted = 0
+        self.started = 0
+        self.busySlotTime = 0.0
+        self.maxQueueDepth = 0
+        self.sumQueueDepth = 0
+        self.peakThreads = threading.active_count()
+        self.startTime = time.monotonic()
+
+        self.workers = []
+        self.startWorkers()
+
+    """Start one worker thread per slot."""
+    def startWorkers(self):
+        for i in range(self.limits.totalSlots):
+            currWorker = threading.Thread(target=self.worker, daemon=True)
+            self.workers.append(currWorker)
+            currWorker.start()
+
+    """Add a job to the queue.
+
+    job = The job created by createCommandFromTemplate.
+    """
+    def submit(self, job):
+        with self.notFull:
+            while (len(self.queue) >= self.queueSize):
+                self.notFull.wait()
+
+            self.queue.push(job)
+            self.submitted += 1
+            self.maxQueueDepth = max(self.maxQueueDepth, len(self.queue))
+            self.sumQueueDepth += len(self.queue)
+            self.jobFinished.notify()
+
+    """Run queued jobs until the scheduler has been closed
+    and the queue is empty.
+    """
+    def worker(self):
+        while 1:
+            with self.jobFinished:
+                while 1:
+                    if (not self.queue and self.closed):
+                        return
+
+                    job = self.queue.popNext(self.limits)
+
+                    if (job is not None):
+                        break
+
+                    self.jobFinished.wait()
+
+                counter = self.takeJob(job)
+
+            startTime, startTimestamp = self.beginJob(job, counter)
+
+            try:
+                result = executeModule(job)
+            except Exception as exc:
+                print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " 
+                      + job["command"] + " - " + str(exc))
+                result = {"state": "failed", "exitCode": None,
+                          "resourceUsage": None}
+
+            self.finishJob(job, result, startTime, startTimestamp)
+
+    """Mark the slots of a job removed from the queue as used.
+    Must be called while holding the lock.
+    Returns the start counter of the job.
+
+    job = The job returned by jobQueue.popNext.
+    """
+    def takeJob(self, job):
+        self.limits.acquire(job)
+        self.running[job["name"]] = job
+        self.runningSince[job["name"]] = time.monotonic()
+        self.started += 1
+        self.notFull.notify()
+        return self.started
+
+    """Print the start of a job and write it to the journal.
+    Returns the start time (monotonic) and the start timestamp (unix time).
+
+    job = The job that will be started.
+    counter = The start counter of the job.
+    """
+    def beginJob(self, job, counter):
+        if (args.verbose):
+            printName = job["command"]
+        else:
+            printName = job["name"]
+
+        # the total changes while jobs are created
+        # (skipped and merged jobs), it is printed once it is final
+        if (allJobsCreated):
+            progressText = str(counter) + "/" + str(amountOfExecModules)
+        else:
+            progressText = str(counter)
+
+        print(f"{bcolor.blue}###[START]###\t{bcolor.ends} "
+              + printName + " - " + progressText)
+
+        # the threads of the running jobs (see asyncModuleScheduler)
+        self.peakThreads = max(self.peakThreads, threading.active_count())
+
+        startTimestamp = time.time()
+        if (self.journal):
+            self.journal.write(job, "running", start=startTimestamp)
+
+        return [time.monotonic(), startTimestamp]
+
+    """Record the result of a job and release its slots.
+
+    job = The finished job.
+    result = The result returned by executeModule.
+    startTime = The start time returned by beginJob.
+    startTimestamp = The start timestamp returned by beginJob.
+    """
+    def finishJob(self, job, result, startTime, startTimestamp):
+        duration = time.monotonic() - startTime
+        self.recordResult(job, result, startTimestamp, time.time(), duration)
+
+        with self.lock:
+            self.busySlotTime += duration * self.limits.getWeight(job)
+            self.limits.release(job)
+            del self.running[job["name"]]
+            del self.runningSince[job["name"]]
+            self.finishedStates[result["state"]] += 1
+            self.recentlyFinished.append([time.monotonic(),
+                                          job["module"]["name"]])
+            self.jobFinished.notify_all()
+
+    """Write the final state of a job to the journal
+    and its metrics to the metrics file and the summary.
+
+    job = The finished job.
+    result = The result returned by executeModule.
+    startTimestamp = The start time of the job (unix time).
+    endTimestamp = The end time of the job (unix time).
+    duration = The wall time of the job in seconds.
+    """
+    def recordResult(self, job, result, startTimestamp, endTimestamp,
+                     duration):
+        if (self.journal):
+            self.journal.write(job, result["state"],
+                               exitCode=result["exitCode"],
+                               start=startTimestamp, end=endTimestamp,
+                               duration=round(duration, 3))
+
+            # the hosts of a batch and the modules of a coalesced nmap job
+            # are resumed on their own,
+            # their output files have been written by splitFinishedJob
+            if (result["state"] == "done"):
+                for splitJob in job.get("batchJobs",
+                                        job.get("coalescedJobs", [])):
+                    self.journal.write(splitJob, "done", mergedInto=job["name"])
+
+        resourceUsage = result["resourceUsage"]
+
+        try:
+            outputBytes = os.path.getsize(job["outputFile"])
+        except OSError:
+            outputBytes = 0
+
+        metrics = {"module": job["module"]["name"],
+                   "host": job["host"],
+                   "port": job["port"],
+                   "exitCode": result["exitCode"],
+                   "start": startTimestamp,
+                   "end": endTimestamp,
+                   "duration": round(duration, 3),
+                   "timeout": result.get("timeout"),
+                   "truncated": result.get("truncated", False),
+                   "cpuUser": 0.0,
+                   "cpuSystem": 0.0,
+                   "maxRssKb": result.get("maxRssKb"),
+                   "outputBytes": outputBytes}
+
+        if (resourceUsage):
+            metrics["cpuUser"] = round(resourceUsage.ru_utime, 3)
+            metrics["cpuSystem"] = round(resourceUsage.ru_stime, 3)
+
+        if (self.metrics):
+            self.metrics.write(job, result["state"], **metrics)
+
+        # only successful durations are used to derive timeouts
+        if (result["state"] == "done" and not job.get("discovery")):
+            history.add(getHistoryName(job), round(duration, 3))
+
+        # truncated outputs are not reused
+        if (outputCache and result["state"] == "done"
+            and not result.get("truncated")):
+            outputCache.store(job)
+
+        # the discovery scan is not part of the summary of the modules
+        if (self.summary and not job.get("discovery")):
+            metrics["state"] = result["state"]
+            self.summary.addFinished(job, metrics)
+
+    """Write the state 'interrupted' to the journal for all running jobs."""
+    def markInterrupted(self):
+        with self.lock:
+            runningJobs = list(self.running.values())
+
+        if (self.journal):
+            for job in runningJobs:
+                self.journal.write(job, "interrupted")
+
+    """Wait until all queued jobs have been executed
+    without closing the scheduler.
+    """
+    def waitIdle(self):
+        with self.jobFinished:
+            while (self.queue or self.running):
+                self.jobFinished.wait()
+
+    """Wait until all queued jobs have been executed."""
+    def join(self):
+        with self.lock:
+            self.closed = True
+            self.jobFinished.notify_all()
+
+        for currWorker in self.workers:
+            currWorker.join()
+
+        self.endTime = time.monotonic()
+
+    """Return queue depth, slot utilisation and throughput as dictionary."""
+    def getStatistics(self):
+        runtime = max(self.endTime - self.startTime, 0.001)
+        totalSlotTime = runtime * self.limits.totalSlots
+
+        if (self.submitted):
+            avgQueueDepth = self.sumQueueDepth / self.submitted
+        else:
+            avgQueueDepth = 0
+
+        return {"executedCommands": self.started,
+                "runtime": round(runtime, 3),
+                "commandsPerMinute": round(self.started / runtime * 60, 1),
+                "slots": self.limits.totalSlots,
+                "slotUtilisation": round(self.busySlotTime / totalSlotTime
+                                         * 100, 1),
+                "idleSlotTime": round(max(totalSlotTime - self.busySlotTime,
+                                          0), 3),
+                "avgQueueDepth": round(avgQueueDepth, 1),
+                "maxQueueDepth": self.maxQueueDepth,
+                "peakThreads": self.peakThreads}
+
+    """Print queue depth, slot utilisation and throughput."""
+    def printStatistics(self):
+        statistics = self.getStatistics()
+
+        print("")
+        print(f"{bcolor.purple}### Scheduler statistics: ###{bcolor.ends}")
+        print("Executed commands:\t" + str(statistics["executedCommands"]))
+        print("Runtime:\t\t" + "%.1f" % statistics["runtime"] + " s")
+        print("Commands per minute:\t"
+              + "%.1f" % statistics["commandsPerMinute"])
+        print("Slot utilisation:\t" + "%.1f" % statistics["slotUtilisation"]
+              + " % of " + str(statistics["slots"]) + " slots")
+        print("Queue depth:\t\t" + "%.1f" % statistics["avgQueueDepth"]
+              + " average, " + str(statistics["maxQueueDepth"]) + " maximum")
+
+
+"""Execute jobs as subprocesses inside the event loop of a single thread.
+Instead of one worker thread per slot, an event loop starts
+every queued job as soon as enough slots are free (see slotLimits)
+and waits for all running processes at the same time.
+The processes are waited for through pidfds (see executeModuleAsync),
+so the amount of threads does not grow with the amount of slots.
+This allows thousands of concurrent lightweight jobs.
+Queueing, journal, metrics and statistics are the same as in moduleScheduler.
+"""
+class asyncModuleScheduler(moduleScheduler):
+    """Start the thread of the event loop."""
+    def startWorkers(self):
+        # only imported by the async engine, since it slows down the start
+        import asyncio
+
+        self.loop = asyncio.new_event_loop()
+        self.wakeUp = None
+        currWorker = threading.Thread(target=self.runEventLoop, daemon=True)
+        self.workers.append(currWorker)
+        currWorker.start()
+
+    def runEventLoop(self):
+        try:
+            self.loop.run_until_complete(self.startJobs())
+        finally:
+            self.loop.close()
+
+    """Wake up the event loop (thread safe)."""
+    def wakeUpLoop(self):
+        def setEvent():
+            if (self.wakeUp):
+                self.wakeUp.set()
+
+        self.loop.call_soon_threadsafe(setEvent)
+
+    """Start queued jobs until the scheduler has been closed,
+    the queue is empty and all jobs have been finished.
+    """
+    async def startJobs(self):
+        import asyncio
+
+        self.wakeUp = asyncio.Event()
+        allTasks = set()
+
+        while 1:
+            self.wakeUp.clear()
+            startedJobs = []
+
+            with self.lock:
+                if (not self.queue and not self.running and self.closed):
+                    return
+
+                while 1:
+                    job = self.queue.popNext(self.limits)
+
+                    if (job is None):
+                        break
+
+                    startedJobs.append([job, self.takeJob(job)])
+
+            for job, counter in startedJobs:
+                task = asyncio.ensure_future(self.runJob(job, counter))
+                allTasks.add(task)
+                task.add_done_callback(allTasks.discard)
+
+            await self.wakeUp.wait()
+
+    """Execute a single job.
+
+    job = The job taken from the queue.
+    counter = The start counter of the job.
+    """
+    async def runJob(self, job, counter):
+        startTime, startTimestamp = self.beginJob(job, counter)
+
+        try:
+            result = await executeModuleAsync(job)
+        except Exception as exc:
+            print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " 
+                  + job["command"] + " - " + str(exc))
+            result = {"state": "failed", "exitCode": None,
+                      "resourceUsage": None}
+
+        self.finishJob(job, result, startTime, startTimestamp)
+        self.wakeUp.set()
+
+    def submit(self, job):
+        super().submit(job)
+        self.wakeUpLoop()
+
+    def join(self):
+        with self.lock:
+            self.closed = True
+
+        self.wakeUpLoop()
+        super().join()
+
+
+# seconds between two heartbeats of a worker
+heartbeatInterval = 5
+
+# seconds without message after which a worker is treated as dead
+workerTimeout = 30
+
+
+"""Return the socket family and the address of the given address.
+Addresses that contain a slash are paths of unix sockets,
+all other addresses have the form host:port.
+
+address = The address given by --coordinator or --worker.
+"""
+def getSocketAddress(address):
+    if ("/" in address):
+        return [socket.AF_UNIX, address]
+
+    host, port = address.rsplit(":", 1)
+    host = host.strip("[]")
+
+    if (":" in host):
+        return [socket.AF_INET6, (host, int(port))]
+
+    return [socket.AF_INET, (host, int(port))]
+
+
+"""Send a message of the coordinator protocol (one JSON object per line).
+
+connection = The socket.
+sendLock = The lock that serializes the messages of the socket.
+message = The message.
+"""
+def sendMessage(connection, sendLock, message):
+    data = (json.dumps(message) + "\n").encode()
+
+    with sendLock:
+        connection.sendall(data)
+
+
+"""Return the proof that the sender of a handshake message knows the token:
+an HMAC (SHA-256) of the role of the sender and the nonce of the other side.
+The role prevents that a proof is sent back to the side that expects it.
+
+token = The shared secret (see --token).
+role = 'coordinator' or 'worker'.
+nonce = The random nonce of the other side.
+"""
+def getHandshakeProof(token, role, nonce):
+    return hmac.new(token.encode(), (role + ":" + nonce).encode(),
+                    hashlib.sha256).hexdigest()
+
+
+"""Return the absolute path of a path relative to the output directory.
+Raise a ValueError for paths outside of the output directory.
+
+relativePath = The path received from the other side.
+"""
+def getPathInsideOutput(relativePath):
+    relativePath = os.path.normpath(relativePath)
+
+    if (os.path.isabs(relativePath) or relativePath.startswith("..")):
+        raise ValueError("path outside of output directory: " + relativePath)
+
+    return args.output + "/" + relativePath
+
+
+# bytes of a file that are sent inside a single message
+fileChunkSize = 1024 * 1024
+
+
+"""Send the given files as file messages of at most fileChunkSize bytes,
+so that large output files are never read into memory at once.
+Return the paths of the sent files relative to the output directory.
+
+connection = The socket.
+sendLock = The lock that serializes the messages of the socket.
+allPaths = The paths to the files (missing files are skipped).
+"""
+def sendFiles(connection, sendLock, allPaths):
+    sentFiles = []
+
+    for path in allPaths:
+        if (not os.path.isfile(path)):
+            continue
+
+        relativePath = os.path.relpath(path, args.output)
+
+        with open(path, "rb") as file:
+            offset = 0
+
+            while 1:
+                chunk = file.read(fileChunkSize)
+                sendMessage(connection, sendLock,
+                            {"type": "file",
+                             "path": relativePath,
+                             "offset": offset,
+                             "data": base64.b64encode(chunk).decode(),
+                             "last": len(chunk) < fileChunkSize})
+                offset += len(chunk)
+
+                if (len(chunk) < fileChunkSize):
+                    break
+
+        sentFiles.append(relativePath)
+
+    return sentFiles
+
+
+"""Write the file messages of a connection into the output directory.
+A file is written to a temporary file and replaces the file
+when its last chunk has been received.
+Errors are kept per file until the message that refers to the file
+(job or result) has been received.
+"""
+class fileReceiver:
+    def __init__(self):
+        self.openFiles = {}
+        self.errors = {}
+
+    """Write the chunk of a file message.
+
+    message = The file message.
+    """
+    def receive(self, message):
+        relativePath = message["path"]
+
+        try:
+            path = getPathInsideOutput(relativePath)
+
+            # the first chunk starts the file (again)
+            if (message["offset"] == 0):
+                self.discard(relativePath)
+                self.errors.pop(relativePath, None)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.openFiles[relativePath] = open(path + ".part", "wb")
+
+            if (relativePath in self.errors):
+                return
+
+            file = self.openFiles[relativePath]
+
+            if (file.tell() != message["offset"]):
+                raise ValueError("missing chunk of " + relativePath)
+
+            file.write(base64.b64decode(message["data"]))
+
+            if (message["last"]):
+                file.close()
+                del self.openFiles[relativePath]
+                os.replace(path + ".part", path)
+
+        except (OSError, ValueError, KeyError) as exc:
+            self.discard(relativePath)
+            self.errors[relativePath] = str(exc)
+
+    """Return the errors of the given files and forget them.
+
+    allPaths = The paths relative to the output directory.
+    """
+    def popErrors(self, allPaths):
+        return [relativePath + ": " + self.errors.pop(relativePath)
+                for relativePath in allPaths if relativePath in self.errors]
+
+    """Close and remove an incomplete file.
+
+    relativePath = The path relative to the output directory.
+    """
+    def discard(self, relativePath):
+        file = self.openFiles.pop(relativePath, None)
+
+        if (file):
+            file.close()
+
+            try:
+                os.remove(file.name)
+            except OSError:
+                pass
+
+    """Remove all incomplete files."""
+    def close(self):
+        for relativePath in list(self.openFiles):
+            self.discard(relativePath)
+
+
+"""Distribute jobs to remote workers (see --coordinator and --worker).
+Workers connect to the given address and announce their amount of slots.
+The coordinator sends queued jobs to every worker with free slots
+(the caps of slotLimits apply to all workers together),
+the worker executes the job and sends back the result and the output files.
+Files are sent in chunks (see sendFiles) before the job or result
+that refers to them.
+A worker that has not sent any message (e.g. heartbeat) for workerTimeout
+seconds is treated as dead and its running jobs are queued again.
+Journal, metrics and summary are written by the coordinator.
+Coordinator and worker prove to each other that they know the token
+(see getHandshakeProof), the token itself is never sent.
+
+address = The address the coordinator listens on (host:port or unix socket).
+token = The shared secret of coordinator and workers.
+"""
+class remoteModuleScheduler(moduleScheduler):
+    def __init__(self, limits, queueSize, jobJournal, jobMetrics, summary,
+                 address, token):
+        self.address = address
+        self.token = token
+        super().__init__(limits, queueSize, jobJournal, jobMetrics, summary)
+
+    """Listen for workers."""
+    def startWorkers(self):
+        family, socketAddress = getSocketAddress(self.address)
+
+        if (family == socket.AF_UNIX and os.path.exists(socketAddress)):
+            os.unlink(socketAddress)
+
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(socketAddress)
+        self.server.listen()
+
+        print(f"{bcolor.purple}###[COORDINATOR]###\t{bcolor.ends} "
+              + "waiting for workers on " + self.address)
+
+        threading.Thread(target=self.acceptWorkers, daemon=True).start()
+
+    def acceptWorkers(self):
+        while 1:
+            connection, remoteAddress = self.server.accept()
+            threading.Thread(target=self.serveWorker, args=(connection,),
+                             daemon=True).start()
+
+    """Receive the messages of a single worker.
+
+    connection = The socket of the worker.
+    """
+    def serveWorker(self, connection):
+        connection.settimeout(workerTimeout)
+        reader = connection.makefile("rb")
+        sendLock = threading.Lock()
+        receiver = fileReceiver()
+        worker = None
+
+        try:
+            hello = json.loads(reader.readline())
+
+            if (hello.get("type") != "hello"):
+                return
+
+            nonce = os.urandom(16).hex()
+            sendMessage(connection, sendLock,
+                        {"type": "challenge",
+                         "nonce": nonce,
+                         "proof": getHandshakeProof(self.token, "coordinator",
+                                                    str(hello["nonce"]))})
+            answer = json.loads(reader.readline())
+
+            # constant time comparison, the token must not leak by timing
+            if (answer.get("type") != "proof"
+                or not hmac.compare_digest(
+                    str(answer.get("proof", "")).encode(),
+                    getHandshakeProof(self.token, "worker", nonce).encode())):
+                sendMessage(connection, sendLock,
+                            {"type": "error", "message": "invalid token"})
+                return
+
+            worker = {"name": str(hello["worker"]),
+                      "slots": max(1, int(hello["slots"])),
+                      "jobs": {},
+                      "alive": True}
+
+            sendMessage(connection, sendLock,
+                        {"type": "hello",
+                         "outputCompression": args.outputCompression,
+                         "maxOutputSize": args.maxOutputSize})
+
+            print(f"{bcolor.purple}###[WORKER]###\t{bcolor.ends} "
+                  + worker["name"] + " connected ("
+                  + str(worker["slots"]) + " slots)")
+
+            threading.Thread(target=self.sendJobs,
+                             args=(connection, sendLock, worker),
+                             daemon=True).start()
+
+            # heartbeats only reset the timeout of the socket
+            for line in reader:
+                message = json.loads(line)
+
+                if (message.get("type") == "file"):
+                    receiver.receive(message)
+
+                elif (message.get("type") == "result"):
+                    message["fileErrors"] = receiver.popErrors(
+                        message.get("files", []))
+                    self.receiveResult(worker, message)
+
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        finally:
+            if (worker):
+                self.removeWorker(worker)
+
+            receiver.close()
+            connection.close()
+
+    """Send queued jobs to a worker as long as it has free slots.
+
+    connection = The socket of the worker.
+    sendLock = The lock of the socket.
+    worker = The state of the worker.
+    """
+    def sendJobs(self, connection, sendLock, worker):
+        while 1:
+            with self.jobFinished:
+                while 1:
+                    if (not worker["alive"]):
+                        return
+
+                    if (not self.queue and not self.running and self.closed):
+                        try:
+                            sendMessage(connection, sendLock, {"type": "exit"})
+                        except OSError:
+                            pass
+                        return
+
+                    if (len(worker["jobs"]) < worker["slots"]):
+                        job = self.queue.popNext(self.limits)
+
+                        if (job is not None):
+                            break
+
+                    self.jobFinished.wait()
+
+                counter = self.takeJob(job)
+                worker["jobs"][job["name"]] = [job, time.monotonic(),
+                                               time.time()]
+
+            startTime, startTimestamp = self.beginJob(job, counter)
+
+            with self.lock:
+                if (job["name"] in worker["jobs"]):
+                    worker["jobs"][job["name"]] = [job, startTime,
+                                                   startTimestamp]
+
+            try:
+                jobMessage = self.getJobMessage(job)
+                jobMessage["files"] = sendFiles(connection, sendLock,
+                                                [job["targetFile"]]
+                                                if "targetFile" in job else [])
+                sendMessage(connection, sendLock, jobMessage)
+            except OSError:
+                # the receiving thread queues the jobs again
+                connection.shutdown(socket.SHUT_RDWR)
+                return
+
+    """Return the message that contains a job.
+    All paths are relative to the output directory.
+    The paths inside the commands are <variables> (see usesPortableCommands),
+    the worker expands them with the paths inside its output directory.
+
+    job = The job created by createCommandFromTemplate.
+    """
+    def getJobMessage(self, job):
+        message = {"type": "job",
+                   "name": job["name"],
+                   "host": job["host"],
+                   "port": job["port"],
+                   "moduleName": job["module"]["name"],
+                   "resourceLimits": {key: job["module"][key] for key, option,
+                                      factor in resourceLimits
+                                      if key in job["module"]},
+                   "command": job["portableCommand"],
+                   "paths": {variable: os.path.relpath(path, args.output)
+                             for variable, path
+                             in job["portablePaths"].items()},
+                   "outputFile": os.path.relpath(job["outputFile"],
+                                                 args.output),
+                   "timeout": getTimeout(job),
+                   "resultFiles": [os.path.relpath(job["outputFile"],
+                                                   args.output)]}
+
+        if (job.get("streamOutput")):
+            message["execCommand"] = job["portableExecCommand"]
+            message["streamOutput"] = True
+
+        if ("xmlFile" in job):
+            message["resultFiles"].append(os.path.relpath(job["xmlFile"],
+                                                          args.output))
+
+        return message
+
+    """Store the result and the output files of a job of a worker.
+
+    worker = The state of the worker.
+    message = The result message.
+    """
+    def receiveResult(self, worker, message):
+        with self.lock:
+            jobState = worker["jobs"].get(message["name"])
+
+        if (not jobState):
+            return
+
+        job, startTime, startTimestamp = jobState
+        resourceUsage = None
+
+        if (message.get("resourceUsage")):
+            resourceUsage = types.SimpleNamespace(
+                ru_utime=message["resourceUsage"][0],
+                ru_stime=message["resourceUsage"][1])
+
+        result = {"exitCode": message.get("exitCode"),
+                  "resourceUsage": resourceUsage,
+                  "timeout": message.get("timeout"),
+                  "truncated": message.get("truncated", False),
+                  "maxRssKb": message.get("maxRssKb")}
+
+        if (message["fileErrors"]):
+            print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " + job["name"]
+                  + " - unable to store output: "
+                  + ", ".join(message["fileErrors"]))
+            message["state"] = "failed"
+
+        if (message.get("state") == "done"):
+            result["state"] = getJobState(job, result["exitCode"])
+            splitFinishedJob(job, result)
+        else:
+            print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} "
+                  + job["command"])
+            result["state"] = message.get("state", "failed")
+
+        with self.lock:
+            del worker["jobs"][job["name"]]
+
+        self.finishJob(job, result, startTime, startTimestamp)
+
+    """Remove a disconnected worker and queue its running jobs again.
+
+    worker = The state of the worker.
+    """
+    def removeWorker(self, worker):
+        with self.lock:
+            worker["alive"] = False
+            lostJobs = [jobState[0] for jobState in worker["jobs"].values()]
+            worker["jobs"] = {}
+
+            for job in lostJobs:
+                self.limits.release(job)
+                del self.running[job["name"]]
+                del self.runningSince[job["name"]]
+                self.queue.push(job)
+                self.started -= 1
+
+            self.jobFinished.notify_all()
+
+        print(f"{bcolor.purple}###[WORKER]###\t{bcolor.ends} "
+              + worker["name"] + " disconnected")
+
+        for job in lostJobs:
+            print(f"{bcolor.yellow}###[REQUEUE]###\t{bcolor.ends} "
+                  + job["name"])
+
+            if (self.journal):
+                self.journal.write(job, "requeued")
+
+    """Wait until all jobs have been executed by the workers."""
+    def join(self):
+        with self.jobFinished:
+            self.closed = True
+            self.jobFinished.notify_all()
+
+            while (self.queue or self.running):
+                self.jobFinished.wait()
+
+        self.endTime = time.monotonic()
+
+
+"""Report the progress of a scheduler without blocking it.
+A background thread rewrites a json status file after every interval
+and optionally a compact status line on the terminal (see --statusLine).
+On SIGUSR1 the full status is printed (see requestDump).
+The throughput is measured over the last statusWindow seconds,
+the ETA is based on the observed throughput or, as long as
+less than minObservedJobs jobs have finished,
+on the median durations of the queued jobs inside the history.
+
+scheduler = The moduleScheduler whose progress is reported.
+pathToStatus = The path to the json status file.
+interval = The seconds between two updates of the status.
+statusLine = True, if a status line should be printed on the terminal.
+"""
+class progressReporter:
+    # seconds of finished jobs the throughput is measured over
+    statusWindow = 300
+    # amount of finished jobs before the observed throughput is used
+    minObservedJobs = 5
+    # amount of running jobs listed as slowest jobs
+    slowestJobs = 5
+
+    def __init__(self, scheduler, pathToStatus, interval, statusLine):
+        self.scheduler = scheduler
+        self.pathToStatus = pathToStatus
+        self.interval = interval
+        self.statusLine = statusLine and os.isatty(1)
+        self.startTime = time.monotonic()
+        self.wakeUp = threading.Event()
+        self.dumpRequested = False
+        self.stopped = False
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    """Signal handler of SIGUSR1.
+    The status is printed by the thread of the reporter,
+    since the interrupted thread may hold the lock of the scheduler.
+
+    sig = The type of signal.
+    frame = The current stack frame.
+    """
+    def requestDump(self, sig, frame):
+        self.dumpRequested = True
+        self.wakeUp.set()
+
+    """Update the status after every interval until stop is called."""
+    def run(self):
+        while (not self.stopped):
+            self.wakeUp.wait(self.interval)
+            self.wakeUp.clear()
+
+            if (self.stopped):
+                break
+
+            status = self.getStatus()
+            self.writeStatus(status)
+
+            if (self.dumpRequested):
+                self.dumpRequested = False
+                self.printStatus(status)
+
+            elif (self.statusLine):
+                print("\033[K" + self.getStatusLine(status), end="\r",
+                      flush=True)
+
+    """Stop the thread and write the final status."""
+    def stop(self):
+        self.stopped = True
+        self.wakeUp.set()
+        self.thread.join()
+
+        if (self.statusLine):
+            print("\033[K", end="", flush=True)
+
+        self.writeStatus(self.getStatus())
+
+    """Return the counters, the throughput, the slowest running jobs
+    and the ETA as dictionary.
+    """
+    def getStatus(self):
+        now = time.monotonic()
+
+        with self.scheduler.lock:
+            runningJobs = list(self.scheduler.running.values())
+            runningSince = dict(self.scheduler.runningSince)
+            queuedJobs = self.scheduler.queue.getJobs()
+            finishedStates = dict(self.scheduler.finishedStates)
+
+            recentlyFinished = self.scheduler.recentlyFinished
+            while (recentlyFinished
+                   and recentlyFinished[0][0] < now - self.statusWindow):
+                recentlyFinished.popleft()
+
+            finishedModules = [moduleName for finishTime, moduleName
+                               in recentlyFinished]
+
+        finishedCount = sum(finishedStates.values())
+        unfinishedCount = max(amountOfExecModules - finishedCount,
+                              len(runningJobs) + len(queuedJobs))
+
+        # the throughput is measured since the start for short runs
+        windowMinutes = max(min(now - self.startTime, self.statusWindow),
+                            1) / 60
+
+        jobsPerMinute = {}
+        for moduleName in finishedModules:
+            jobsPerMinute[moduleName] = jobsPerMinute.get(moduleName, 0) + 1
+
+        jobsPerMinute = {moduleName: round(count / windowMinutes, 1)
+                         for moduleName, count
+                         in sorted(jobsPerMinute.items(),
+                                   key=lambda item: -item[1])}
+
+        slowestRunning = sorted(([job["name"], round(now - runningSince.get(
+                                  job["name"], now), 1)]
+                                 for job in runningJobs),
+                                key=lambda item: -item[1])[:self.slowestJobs]
+
+        eta = None
+        etaSource = None
+
+        if (finishedCount >= self.minObservedJobs and finishedModules):
+            eta = unfinishedCount / (len(finishedModules) / windowMinutes) * 60
+            etaSource = "observed"
+
+        else:
+            # the timeout is no estimation of the duration
+            expectedCosts = []
+            expectedWeights = []
+            runningWork = 0.0
+            longestRunning = 0.0
+
+            for job in runningJobs + queuedJobs:
+                expectedDuration = history.getPercentile(getHistoryName(job),
+                                                         50, 1)
+
+                if (expectedDuration is None):
+                    continue
+
+                weight = int(job["module"].get("slotWeight", 1))
+                expectedCosts.append(expectedDuration * weight)
+                expectedWeights.append(weight)
+
+                # the remaining time of a running job
+                if (job["name"] in runningSince):
+                    remainingDuration = max(expectedDuration - (
+                        now - runningSince[job["name"]]), 0)
+                    runningWork += remainingDuration * weight
+                    longestRunning = max(longestRunning, remainingDuration)
+
+            if (expectedCosts):
+                # jobs that have not been started yet (slot seconds)
+                waitingCount = max(unfinishedCount - len(runningJobs), 0)
+                remainingWork = (runningWork + waitingCount
+                                 * sum(expectedCosts) / len(expectedCosts))
+
+                # less jobs than slots can not use all slots
+                usableSlots = min(self.scheduler.limits.totalSlots,
+                                  (waitingCount + len(runningJobs))
+                                  * sum(expectedWeights)
+                                  / len(expectedWeights))
+
+                eta = max(longestRunning, remainingWork / max(usableSlots, 1))
+                etaSource = "history"
+
+        return {"timestamp": round(time.time(), 3),
+                "elapsed": round(now - self.startTime, 1),
+                "planned": amountOfExecModules,
+                "running": len(runningJobs),
+                "queued": len(queuedJobs),
+                "done": finishedStates.get("done", 0),
+                "failed": finishedStates.get("failed", 0),
+                "timeout": finishedStates.get("timeout", 0),
+                "finished": finishedCount,
+                "jobsPerMinute": round(len(finishedModules) / windowMinutes,
+                                       1),
+                "jobsPerMinutePerModule": jobsPerMinute,
+                "slowestRunning": slowestRunning,
+                "eta": None if eta is None else round(eta, 1),
+                "etaSource": etaSource}
+
+    """Rewrite the status file with the given status.
+    The file is replaced at once, so that readers never see a partial file.
+
+    status = The status returned by getStatus.
+    """
+    def writeStatus(self, status):
+        pathToTmp = self.pathToStatus + ".tmp"
+
+        try:
+            with open(pathToTmp, "w", encoding="utf-8") as file:
+                json.dump(status, file, indent=4)
+                file.write("\n")
+
+            os.replace(pathToTmp, self.pathToStatus)
+        except OSError as exc:
+            print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} "
+                  + "can not write the status file - " + str(exc))
+
+    """Return the given number of seconds as h:mm:ss or ? if unknown.
+
+    seconds = The number of seconds (or None).
+    """
+    def formatDuration(self, seconds):
+        if (seconds is None):
+            return "?"
+
+        seconds = int(seconds)
+        return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60,
+                                 seconds % 60)
+
+    """Return the compact status line.
+
+    status = The status returned by getStatus.
+    """
+    def getStatusLine(self, status):
+        return ("[" + str(status["finished"]) + "/" + str(status["planned"])
+                + "] running " + str(status["running"])
+                + " queued " + str(status["queued"])
+                + " failed " + str(status["failed"])
+                + " timeout " + str(status["timeout"])
+                + " | " + "%.1f" % status["jobsPerMinute"] + " jobs/min"
+                + " | ETA " + self.formatDuration(status["eta"]))
+
+    """Print the full status.
+
+    status = The status returned by getStatus.
+    """
+    def printStatus(self, status):
+        print("")
+        print(f"{bcolor.purple}### Status: ###{bcolor.ends}")
+        print("Elapsed:\t\t" + self.formatDuration(status["elapsed"]))
+        print("Finished:\t\t" + str(status["finished"]) + " of "
+              + str(status["planned"]) + " (" + str(status["done"])
+              + " done, " + str(status["failed"]) + " failed, "
+              + str(status["timeout"]) + " timeout)")
+        print("Running:\t\t" + str(status["running"]))
+        print("Queued:\t\t\t" + str(status["queued"]))
+        print("Jobs per minute:\t" + "%.1f" % status["jobsPerMinute"])
+        print("ETA:\t\t\t" + self.formatDuration(status["eta"])
+              + (" (" + status["etaSource"] + ")" if status["etaSource"]
+                 else ""))
+
+        if (status["jobsPerMinutePerModule"]):
+            print("")
+            print("jobs/min\t - \tmodule")
+            for moduleName, rate in status["jobsPerMinutePerModule"].items():
+                print("%.1f" % rate + "\t\t - \t" + moduleName)
+
+        if (status["slowestRunning"]):
+            print("")
+            print("running\t\t - \tslowest running jobs")
+            for jobName, seconds in status["slowestRunning"]:
+                print(self.formatDuration(seconds) + "\t\t - \t" + jobName)
+
+        print("")
+
+
+"""Connect to a coordinator and execute the jobs it sends
+until the coordinator sends exit or closes the connection.
+The output files are stored inside the output directory of the worker
+and are sent back to the coordinator.
+
+address = The address of the coordinator (host:port or unix socket).
+"""
+def runWorker(address):
+    family, socketAddress = getSocketAddress(address)
+
+    # the coordinator may not be ready yet
+    for attempt in range(30):
+        try:
+            connection = socket.socket(family, socket.SOCK_STREAM)
+            connection.connect(socketAddress)
+            break
+        except OSError as exc:
+            connection.close()
+            lastError = exc
+            time.sleep(1)
+    else:
+        print("Error: unable to connect to coordinator - " + str(lastError))
+        exit(1)
+
+    sendLock = threading.Lock()
+    reader = connection.makefile("rb")
+    nonce = os.urandom(16).hex()
+    sendMessage(connection, sendLock,
+                {"type": "hello",
+                 "worker": socket.gethostname() + "-" + str(os.getpid()),
+                 "slots": int(args.threadAmount),
+                 "nonce": nonce})
+
+    # a failed authentication is not retried like a failed connect
+    challenge = json.loads(reader.readline() or "{}")
+
+    if (challenge.get("type") != "challenge"):
+        print("Error: coordinator refused connection - "
+              + challenge.get("message", "connection closed"))
+        exit(1)
+
+    # the jobs are executed as shell commands,
+    # so they are only accepted from a coordinator that knows the token
+    if (not hmac.compare_digest(
+            str(challenge.get("proof", "")).encode(),
+            getHandshakeProof(args.token, "coordinator", nonce).encode())):
+        print("Error: the coordinator does not know the token")
+        exit(1)
+
+    sendMessage(connection, sendLock,
+                {"type": "proof",
+                 "proof": getHandshakeProof(args.token, "worker",
+                                            str(challenge["nonce"]))})
+    hello = json.loads(reader.readline() or "{}")
+
+    if (hello.get("type") != "hello"):
+        print("Error: coordinator refused connection - "
+              + hello.get("message", "connection closed"))
+        exit(1)
+
+    # the output files must be written the way the coordinator expects them
+    args.outputCompression = hello["outputCompression"]
+    args.maxOutputSize = hello["maxOutputSize"]
+    os.makedirs(args.output, exist_ok=True)
+
+    def sendHeartbeats():
+        while 1:
+            time.sleep(heartbeatInterval)
+
+            try:
+                sendMessage(connection, sendLock, {"type": "heartbeat"})
+            except OSError:
+                return
+
+    def runRemoteJob(message):
+        # the paths are expanded inside the output directory of the worker
+        allPaths = {variable: getPathInsideOutput(path)
+                    for variable, path in message["paths"].items()}
+        job = {"command": commandTemplate(message["command"]).expand(allPaths),
+               "name": message["name"],
+               "host": message["host"],
+               "port": message["port"],
+               "outputFile": getPathInsideOutput(message["outputFile"]),
+               "module": dict(message.get("resourceLimits", {}),
+                              name=message["moduleName"]),
+               "timeout": message["timeout"]}
+
+        if (message.get("streamOutput")):
+            job["execCommand"] = commandTemplate(
+                message["execCommand"]).expand(allPaths)
+            job["streamOutput"] = True
+
+        result = {"type": "result", "name": job["name"], "state": "failed",
+                  "exitCode": None, "resourceUsage": None,
+                  "timeout": job["timeout"], "truncated": False, "files": []}
+
+        try:
+            if (message["fileErrors"]):
+                raise ValueError("unable to store input: "
+                                 + ", ".join(message["fileErrors"]))
+
+            os.makedirs(os.path.dirname(job["outputFile"]), exist_ok=True)
+            jobResult = executeModule(job)
+
+            result["state"] = jobResult["state"]
+            result["exitCode"] = jobResult["exitCode"]
+            result["truncated"] = jobResult["truncated"]
+            result["maxRssKb"] = jobResult["maxRssKb"]
+
+            if (jobResult["resourceUsage"]):
+                result["resourceUsage"] = [jobResult["resourceUsage"].ru_utime,
+                                           jobResult["resourceUsage"].ru_stime]
+
+            result["files"] = sendFiles(
+                connection, sendLock,
+                [getPathInsideOutput(path) for path in message["resultFiles"]])
+
+        except Exception as exc:
+            print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " 
+                  + job["command"] + " - " + str(exc))
+
+        try:
+            sendMessage(connection, sendLock, result)
+        except OSError:
+            pass
+
+    threading.Thread(target=sendHeartbeats, daemon=True).start()
+    receiver = fileReceiver()
+    allThreads = []
+
+    try:
+        for line in reader:
+            message = json.loads(line)
+
+            if (message.get("type") == "exit"):
+                break
+
+            if (message.get("type") == "file"):
+                receiver.receive(message)
+
+            if (message.get("type") == "job"):
+                message["fileErrors"] = receiver.popErrors(message["files"])
+                print(f"{bcolor.blue}###[START]###\t{bcolor.ends} "
+                      + message["name"])
+                jobThread = threading.Thread(target=runRemoteJob,
+                                             args=(message,), daemon=True)
+                jobThread.start()
+                allThreads.append(jobThread)
+                allThreads = [currThread for currThread in allThreads
+                              if currThread.is_alive()]
+    except (OSError, ValueError):
+        pass
+
+    for currThread in allThreads:
+        currThread.join()
+
+    receiver.close()
+    connection.close()
+
+
+# severities of findings, ordered from lowest to highest
+severityLevels = ["info", "low", "medium", "high", "critical"]
+
+# removes the color codes of tools that color their output
+ansiEscapePattern = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+# output directory and rules of the parser config per module name,
+# set by initFindingsParser inside the parser processes
+findingsOutputDir = ""
+rulesPerModule = {}
+
+
+"""Return the rules of the parser config.
+Every rule applies to the modules matching one of its modules patterns
+(fnmatch) and creates a finding for every line matching its pattern.
+The named group severity overrides the severity of the rule,
+the credential is created from the named groups (e.g. '<user>:<password>').
+Exits with an error message if the config is invalid.
+
+pathToParserConfig = The path to the parser config.
+"""
+def loadParserRules(pathToParserConfig):
+    try:
+        with open(pathToParserConfig, "r", encoding="utf-8") as file:
+            allRules = json.load(file)
+    except (OSError, ValueError) as exc:
+        print("Error: unable to read " + pathToParserConfig + ": " + str(exc))
+        exit(1)
+
+    for rule in allRules:
+        errorPrefix = ("Error in " + pathToParserConfig + " - "
+                       + str(rule.get("name", "")) + ": ")
+
+        try:
+            rule["compiledPattern"] = re.compile(rule.get("pattern", ""))
+        except re.error as exc:
+            print(errorPrefix + "invalid pattern (" + str(exc) + ")")
+            exit(1)
+
+        if (not rule.get("name") or not rule.get("pattern")
+            or not isinstance(rule.get("modules"), list)):
+            print(errorPrefix + "name, modules and pattern are required")
+            exit(1)
+
+        if (not rule.get("severity") in severityLevels):
+            print(errorPrefix + "severity must be one of "
+                  + ", ".join(severityLevels))
+            exit(1)
+
+        rule["credentialTemplate"] = commandTemplate(rule.get("credential",
+                                                              ""))
+
+    return allRules
+
+
+"""Return the module name, host and port of an output file
+or None if the file is not the output of a single host
+(e.g. the output or the target file of a batch).
+Output files are named <module>-<ip>-<port> (order given by the syntax).
+
+moduleName = The name of the directory of the module.
+fileName = The name of the output file.
+"""
+def getOutputFileTarget(moduleName, fileName):
+    for suffix, compressor in outputCompressions.values():
+        if (suffix and fileName.endswith(suffix)):
+            fileName = fileName[:-len(suffix)]
+
+    if (not fileName.startswith(moduleName + "-")):
+        return None
+
+    host = None
+    port = ""
+
+    for part in fileName[len(moduleName) + 1:].split("-"):
+        if (part.isdigit()):
+            port = part
+            continue
+
         try:
-            # check if json key exists 
-            if (currModule[var]):
-                continue
-        except:
-            requiredVars.append(var)
+            ipaddress.IPv4Address(part)
+        except ValueError:
+            return None
 
-    if (removeExpArgs == 1):
-        # define exceptional arguments 
-        exceptionalArguments = ["outputFile", "port", "targetIp", "xmlFile"]
-        
-        # remove exceptional variables from json arguments
-        for currExceptArg in exceptionalArguments:
-            if (currExceptArg in requiredVars): 
-                requiredVars.remove(currExceptArg)
+        host = part
 
-    return requiredVars
+    if (host is None):
+        return None
 
+    return [moduleName, host, port]
 
-"""Return a list of strings that will be added to argumentParser.
-These strings are defined in the modules.json file within the syntax key.
-For each module, the values set in <variable> are defined as arguments.
-Exceptional arguments like:
-'outputFile', 'port', 'targetIp', 'xmlFile'
-will not be added to the argumentParser.
+
+"""Set the output directory and the rules inside a process
+of the pool of updateFindingsIndex.
+
+pathToOutput = The output directory.
+moduleRules = The rules of the parser config per module name.
 """
-def getArgsOfJson():
-    availableModules = loadModules(pathToScriptDir + "/modules.json")
-
-    # define arguments given by json config
-    allJsonArgs = []
-    
-    for currModule in availableModules:
-        allRequiredVars = getVariablesFromString(currModule["syntax"], 1)
-    
-        for currArg in allRequiredVars:
-            allJsonArgs.append(currArg)
-    
-    # remove duplicated undefined variables
-    uniqJsonArgs = sorted(set(allJsonArgs))
- 
-    return uniqJsonArgs
+def initFindingsParser(pathToOutput, moduleRules):
+    global findingsOutputDir
+    global rulesPerModule
 
+    findingsOutputDir = pathToOutput
+    rulesPerModule = moduleRules
 
-"""Catch user interrupt (ctrl + c).
 
-sig = The type of signal, that should be catched.
-frame = The function that should be executed.
+"""Return the findings of an output file.
+Executed inside the processes of the pool of updateFindingsIndex.
+Every line creates at most one finding (the first matching rule).
+
+task = The list [relative path, module, host, port, mtime, size].
 """
-def signal_handler(sig, frame):
-    print ("\nCatched keyboard interrupt, exit programm!")
+def parseOutputFile(task):
+    relativePath, moduleName, host, port = task[:4]
+    allFindings = []
 
     try:
-        print ("Remove empty directories and files before leaving...")
-        if (args.execute):
-            # remove empty directories
-            for directory in os.scandir(args.output):
-                if os.path.isdir(directory) and not os.listdir(directory):
-                    os.rmdir(directory)
+        for lineNumber, line in enumerate(iterOutputLines(findingsOutputDir
+                                                          + "/" + relativePath),
+                                          1):
+            line = ansiEscapePattern.sub("", line.decode("utf-8", "replace"))
+            line = line.strip()
 
-        # remove all temporary files
-        for tmpFile in allTempFiles:
-            os.remove(tmpFile)
+            for rule in rulesPerModule[moduleName]:
+                match = rule["compiledPattern"].search(line)
 
-        print("Done")
-        exit(0)
+                if (not match):
+                    continue
 
-    except:
-        exit(0)
+                # groups that did not participate in the match are empty
+                groups = match.groupdict("")
+                severity = (groups.get("severity")
+                            or rule["severity"]).lower()
 
+                if (not severity in severityLevels):
+                    severity = rule["severity"]
 
-"""Return a list with following structure:
-[["ip1","port80","port443"],["ip2","port22","port80"]]
-This list is created from an XML nmap scan result.
+                allFindings.append([relativePath, moduleName, host, port,
+                                    severity, severityLevels.index(severity),
+                                    rule["name"],
+                                    rule["credentialTemplate"].expand(groups),
+                                    line[:1000], lineNumber])
+                break
+    except OSError:
+        pass
 
-pathToNmapXml = The full path to the current nmap xml result file.
-"""
-def convertXmlToList(pathToNmapXml):
-    # read XML file into 2 dimensional list
-    nmapAsList = []
- 
-    tree = ET.parse(pathToNmapXml)
-    xmlRoot = tree.getroot()
- 
-    # get hosts
-    for currentHost in xmlRoot.findall("./host"):
-        # flush all buffers
-        currentIpv4 = ""
-        allOpenPortsOfCurrentIp = ""
- 
-        for currentAddress in currentHost.findall("address"):
-            # ipv4 needs to stay highest node
-            currentIpv4 = currentAddress.get("addr")
-            break
- 
-        # check if ports are iterable
-        if (currentHost.find("ports")):
-            for extraPortsOrPort in currentHost.find("ports"):
-                currentPortId = extraPortsOrPort.get("portid")
- 
-                for state in extraPortsOrPort.findall("state"):
-                    state = state.get("state")
- 
-                    # check if current port is open
-                    if (state == "open"):
-                        allOpenPortsOfCurrentIp = allOpenPortsOfCurrentIp  \
-                                                  + currentPortId + ","
- 
-        # remove last char (,) from all open ports of current ipv4
-        allOpenPortsOfCurrentIp = allOpenPortsOfCurrentIp[:-1]
- 
-        # add ip and all its open ports to nmap as list
-        nmapAsList.append([currentIpv4,allOpenPortsOfCurrentIp]) 
-    
-    return nmapAsList
+    return [task, allFindings]
 
 
-"""Create a temporary file 
-that contains all hosts of the nmap scan that matches a specific port number.
-One host per line.
+"""Create or update the findings index (sqlite) of the output directory.
+Only output files of modules with parser rules
+that are new or have been changed since the last update are parsed,
+the files are parsed by a pool of processes.
+Prints the amount of parsed files and findings per severity.
 
-portnumbers = The port number that should be matched.
+allRules = The rules returned by loadParserRules.
 """
-def getAllTargetableHosts(portnumber):
+def updateFindingsIndex(allRules):
+    import multiprocessing
+    import sqlite3
+
+    rulesHash = hashlib.sha256(json.dumps(
+        [[rule["name"], rule["modules"], rule["pattern"], rule["severity"],
+          rule.get("credential", "")] for rule in allRules]).encode()).hexdigest()
+
+    database = sqlite3.connect(args.output + "/autopen-findings.sqlite")
+    database.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY,
+                                          mtime INTEGER, size INTEGER);
+        CREATE TABLE IF NOT EXISTS findings (path TEXT, module TEXT,
+            host TEXT, port TEXT, severity TEXT, severityLevel INTEGER,
+            rule TEXT, credential TEXT, evidence TEXT, line INTEGER);
+        CREATE INDEX IF NOT EXISTS findingsPath ON findings (path);
+        CREATE INDEX IF NOT EXISTS findingsCredential ON findings (credential)
+            WHERE credential != '';
+        CREATE INDEX IF NOT EXISTS findingsSeverity
+            ON findings (severityLevel);
+        CREATE INDEX IF NOT EXISTS findingsHost ON findings (host);
+        CREATE INDEX IF NOT EXISTS findingsModule ON findings (module);
+    """)
+
+    # all files have to be parsed again if the rules have been changed
+    previousHash = database.execute("SELECT value FROM meta"
+                                    + " WHERE key = 'rulesHash'").fetchone()
+
+    if (not previousHash or previousHash[0] != rulesHash):
+        database.execute("DELETE FROM files")
+        database.execute("DELETE FROM findings")
+        database.execute("INSERT OR REPLACE INTO meta VALUES"
+                         + " ('rulesHash', ?)", (rulesHash,))
+
+    indexedFiles = {path: [mtime, size] for path, mtime, size
+                    in database.execute("SELECT * FROM files")}
+
+    # the port of modules without <port> inside the output file name
+    modulePorts = {module["name"]: module["port"]
+                   for module in moduleRegistry["modules"]
+                   if module["port"].isdigit()}
+    rulesOfModules = {}
+    allTasks = []
+
+    for moduleDir in os.scandir(args.output):
+        if (not moduleDir.is_dir()):
+            continue
 
-    for currPossTarget in nmapIpPortList:
-        filePointer = open(tempFileNameTemplate + portnumber, "a")
-        # only scan IP addresses included by user
-        if (args.includeIps != "NULL"):
-            if (not currPossTarget[0] in args.includeIps):
-                continue
+        moduleRules = [rule for rule in allRules
+                       if any(fnmatch.fnmatchcase(moduleDir.name, pattern)
+                              for pattern in rule["modules"])]
 
-        # skip ip addresses excluded by user
-        if (args.excludeIps != "NULL"):
-            if (currPossTarget[0] in args.excludeIps):
-                continue
+        if (not moduleRules):
+            continue
 
-        # get every open port of current possible target host
-        splittedOpenPortsOnHost = currPossTarget[1].split(",")
- 
-        for currentOpenPortOnHost in splittedOpenPortsOnHost:
-            # skip empty splitted port lists
-            if (currentOpenPortOnHost == ""):
+        rulesOfModules[moduleDir.name] = moduleRules
+
+        for outputFile in os.scandir(moduleDir.path):
+            target = getOutputFileTarget(moduleDir.name, outputFile.name)
+
+            if (target is None or not outputFile.is_file()):
                 continue
 
-            # write current host to file if ports are matching
-            if (currentOpenPortOnHost == portnumber):
-                # prevent duplicate ip addresses inside file of targetable hosts
-                filePointer2 = open(tempFileNameTemplate + portnumber, "r")
-                allLines = filePointer2.readlines()
+            if (not target[2]):
+                target[2] = modulePorts.get(moduleDir.name, "")
+
+            relativePath = moduleDir.name + "/" + outputFile.name
+            fileStat = outputFile.stat()
+            fileState = [fileStat.st_mtime_ns, fileStat.st_size]
+
+            if (indexedFiles.pop(relativePath, None) != fileState):
+                allTasks.append([relativePath] + target + fileState)
+
+    # remove changed and deleted files
+    removedPaths = [[task[0]] for task in allTasks] \
+                   + [[path] for path in indexedFiles]
+    database.executemany("DELETE FROM findings WHERE path = ?", removedPaths)
+    database.executemany("DELETE FROM files WHERE path = ?", removedPaths)
+
+    if (allTasks):
+        # the processes are started by a fork server instead of forking
+        # autopen, whose threads could hold locks during the fork
+        with multiprocessing.get_context("forkserver").Pool(
+                initializer=initFindingsParser,
+                initargs=(args.output, rulesOfModules)) as pool:
+            for task, allFindings in pool.imap_unordered(parseOutputFile,
+                                                         allTasks,
+                                                         chunksize=64):
+                database.execute("INSERT INTO files VALUES (?, ?, ?)",
+                                 (task[0], task[4], task[5]))
+                database.executemany("INSERT INTO findings VALUES"
+                                     + " (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     allFindings)
+
+    database.commit()
+
+    print("")
+    print(f"{bcolor.purple}### Findings index: ###{bcolor.ends}")
+    print("Parsed output files:\t" + str(len(allTasks)))
+
+    for severity, amount in database.execute(
+            "SELECT severity, COUNT(*) FROM findings"
+            + " GROUP BY severityLevel ORDER BY severityLevel DESC"):
+        print(severity + ":\t\t\t" + str(amount))
+
+    database.close()
+
+
+# filters of --findingsQuery and the sql condition they are converted to
+findingsFilters = {"module": "module GLOB ?",
+                   "host": "host GLOB ?",
+                   "port": "port = ?",
+                   "rule": "rule GLOB ?",
+                   "severity": "severityLevel >= ?",
+                   "text": "evidence LIKE ?"}
+
+
+"""Print the findings of the findings index matching all given filters.
+
+queryFilters = The filters given by the user:
+creds (findings with a credential), module=PATTERN, host=PATTERN, port=PORT,
+rule=PATTERN, severity=MINIMAL_SEVERITY, text=TEXT
+"""
+def printFindings(queryFilters):
+    import sqlite3
 
-                if (not currPossTarget[0] + "\n" in allLines):
-                    filePointer.write(currPossTarget[0] + "\n")
+    pathToIndex = args.output + "/autopen-findings.sqlite"
 
-                filePointer2.close()
-                break
+    if (not os.path.isfile(pathToIndex)):
+        print("Error: no findings index inside " + args.output
+              + " (use --indexFindings)")
+        exit(1)
+
+    conditions = []
+    parameters = []
 
-        filePointer.close() 
+    for queryFilter in queryFilters:
+        if (queryFilter == "creds"):
+            conditions.append("credential != ''")
+            continue
 
+        key, separator, value = queryFilter.partition("=")
 
+        if (not separator or not key in findingsFilters):
+            print("Error: invalid filter " + queryFilter + " (possible"
+                  + " filters: creds, " + "=, ".join(findingsFilters) + "=)")
+            exit(1)
 
-"""Return a list with all open portnumbers.
-These ports are read from the nmap list.
-"""
-def getAllOpenPorts():
-    allPorts = []
+        if (key == "severity"):
+            if (not value in severityLevels):
+                print("Error: severity must be one of "
+                      + ", ".join(severityLevels))
+                exit(1)
 
-    for ipv4Addr in nmapIpPortList:
-        # collect all ports of every single host
-        splitPort = ipv4Addr[1].split(",")
+            value = severityLevels.index(value)
 
-        for portNum in splitPort:
-            allPorts.append(portNum)
+        elif (key == "text"):
+            value = "%" + value + "%"
 
-    uniqPorts = sorted(set(allPorts))
-    return uniqPorts
+        conditions.append(findingsFilters[key])
+        parameters.append(value)
 
+    query = ("SELECT severity, host, port, module, credential, evidence"
+             + " FROM findings")
 
-"""Return a json object 
-that contains modules which matches the arguments given by the user.
-Furthermore this modules matches the open port numbers 
-of current nmap scan result.
+    if (conditions):
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += " ORDER BY severityLevel DESC, host, port, module, line"
+
+    database = sqlite3.connect(pathToIndex)
+
+    # the findings are often piped to other commands (e.g. head)
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+    print(f"{bcolor.purple}### Findings: ###{bcolor.ends}")
+    print("severity\thost:port\tmodule\tcredential\tevidence")
+
+    for severity, host, port, module, credential, evidence \
+            in database.execute(query, parameters):
+        if (port):
+            host = host + ":" + port
+
+        print(severity + "\t" + host + "\t" + module + "\t" + credential
+              + "\t" + evidence)
+
+    database.close()
+
+
+# increased whenever the records of a plan file change
+planFormat = 3
+
+
+"""Return the expected cost of a job used to balance the shards of a plan:
+the median of the previous durations of the module (see durationHistory)
+or the timeout, multiplied by the slotWeight of the module.
+
+job = The job created by createCommandFromTemplate.
 """
-def getMatchingModules():
-    # read all modules from json file
-    allModules = loadModules(pathToScriptDir + "/modules.json")
-    matchingModules = []
+def getExpectedCost(job):
+    expectedDuration = history.getPercentile(getHistoryName(job), 50, 1)
 
-    for module in allModules:
-        # flag used to skip the current module
-        skipModule = "0"
- 
-        # skip excluded modules given by user
-        if (args.excludeModules != "NULL"):
-            for currExcludedMod in args.excludeModules:
-                if (currExcludedMod in module["name"]):
-                    skipModule = "1"
-                    break 
- 
-            if (skipModule == "1"):
-                continue
- 
-        # only execute included modules given by user
-        skipModule = "1"
- 
-        if (args.includeModules != "NULL"):
-            for currIncludedMod in args.includeModules:
-                if (currIncludedMod in module["name"]):
-                    skipModule = "0"
-                    break 
- 
-            if (skipModule == "1"):
-                continue
- 
-        # get all undefined arguments of current module
-        requiredArgsOfModule = getVariablesFromString(module["syntax"], 1)
-        skipModule = "0"
- 
-        # skip modules that need an argument, that has not been given by user
-        for currUndefArg in requiredArgsOfModule:
-            if (vars(args)[currUndefArg] == "NULL"):
-                skipModule = "1"
-                break
- 
-        # execute only modules with lower equals risk level given by user
-        if (int(module["riskLevel"]) > int(args.riskLevel)):
-            skipModule = "1"
- 
-        if (skipModule == "1"):
-            continue
-        else:
-            # check if module uses wildcard as portnumber
-            if (module["port"] == "*"):
-                allPortsAsString = ""
-                overallPort = getAllOpenPorts()
+    if (expectedDuration is None):
+        expectedDuration = getTimeout(job) or 0.0
 
-                for port in overallPort:
-                    allPortsAsString = allPortsAsString + "," + port
+    return round(expectedDuration * int(job["module"].get("slotWeight", 1)),
+                 3)
 
-                # remove leading ,
-                module["port"] = allPortsAsString[1:]
 
-            # check if ports of current module matches nmap scan
-            portsOfCurrentModule = module["port"].split(",")
+"""Return the record of a job inside a plan file (see --planOut).
+The compiled templates of the module are not part of the record,
+since the commands have already been created.
 
-            for currModPort in portsOfCurrentModule:
-                # only scan ports included by user
-                if (args.includePorts != "NULL"):
-                    if (not currModPort in args.includePorts):
-                        continue
+job = The job created by createCommandFromTemplate.
+"""
+def getPlanRecord(job):
+    record = {key: value for key, value in job.items()
+              if not key in ["module", "batchJobs", "coalescedJobs",
+                             "queueEntry"]}
+    record["module"] = {key: value for key, value in job["module"].items()
+                        if not isinstance(value, commandTemplate)}
 
-                # skip ports excluded by user
-                elif (args.excludePorts!= "NULL"):
-                    if (currModPort in args.excludePorts):
-                        continue
+    for key in ["batchJobs", "coalescedJobs"]:
+        if (key in job):
+            record[key] = [getPlanRecord(hostJob) for hostJob in job[key]]
 
-                pathToTempFileCurrPort = tempFileNameTemplate + currModPort
+    return record
 
-                # get list of hosts that can be targeted by current module
-                # for a given port
-                if (not os.path.exists(pathToTempFileCurrPort)):
-                    getAllTargetableHosts(currModPort)
-                    allTempFiles.append(pathToTempFileCurrPort)
 
-                # skip module for current port 
-                # if list of targetable host is empty
-                if (os.stat(pathToTempFileCurrPort).st_size == 0):
-                    continue
-                else:
-                    # set only the matching portnumber inside port key
-                    # otherwise createCommandFromTemplate will not
-                    # be able to get correct portnumber
-                    module["port"] = currModPort
+"""Return the given path of a plan file moved from the output directory
+of the plan to the given output directory.
+Paths outside the output directory of the plan stay unchanged.
 
-                    # append a copy of the module instead of a reference
-                    matchingModules.append(module.copy())
+path = A path of a plan record (relative to the working directory
+of the plan).
+header = The header of the plan file (see readPlan).
+outputDir = The output directory of this run.
+"""
+def relocatePlanPath(path, header, outputDir):
+    absolutePath = os.path.normpath(os.path.join(header["workingDir"], path))
 
-    return matchingModules
+    if (absolutePath.startswith(header["output"] + "/")):
+        return outputDir + absolutePath[len(header["output"]):]
 
+    return path
 
-"""Return a list of lists.
-These lists contain all final commands that will be executed.
-Commands that have already been executed will not be executed again.
-This function will fill the syntax key of the modules.json file accordingly.
 
-allExecutableModules = All modules that will be executed.
+"""Return the job of the given record of a plan file
+with its paths moved to the given output directory.
+Only the path fields of the job are rewritten, the commands are created
+again from the commands of the plan in which the paths are <variables>
+(see createJob), so that other arguments are never changed.
+
+record = A record of a plan file (see getPlanRecord).
+header = The header of the plan file (see readPlan).
+outputDir = The output directory of this run.
+"""
+def relocatePlanRecord(record, header, outputDir):
+    job = dict(record)
+
+    for key in ["outputFile", "targetFile", "xmlFile"]:
+        if (key in job):
+            job[key] = relocatePlanPath(job[key], header, outputDir)
+
+    # the portable commands stay part of the job for remote workers
+    if ("portableCommand" in job):
+        job["portablePaths"] = {variable: relocatePlanPath(path, header,
+                                                           outputDir)
+                                for variable, path
+                                in job["portablePaths"].items()}
+        job["command"] = commandTemplate(job["portableCommand"]).expand(
+            job["portablePaths"])
+
+        if ("portableExecCommand" in job):
+            job["execCommand"] = commandTemplate(
+                job["portableExecCommand"]).expand(job["portablePaths"])
+
+    for key in ["batchJobs", "coalescedJobs"]:
+        if (key in job):
+            job[key] = [relocatePlanRecord(hostRecord, header, outputDir)
+                        for hostRecord in job[key]]
+
+    return job
+
+
+"""Return the header of a plan file and the line numbers of the jobs
+of the given shard (None = all jobs).
+The jobs are distributed to the shards by their expected cost
+(longest job to the shard with the lowest sum of costs),
+so that every machine that reads the same plan computes the same shards.
+
+pathToPlan = The path to the plan file.
+shard = The list [number of the shard (starting at 1), amount of shards]
+or None.
 """
-def createCommandFromTemplate(allExecutableModules):
-    allCommands = []
+def readPlan(pathToPlan, shard):
+    allCosts = []
 
-    for thisModule in allExecutableModules:
-        pathToModDir = args.output + "/" + thisModule["name"]
+    with open(pathToPlan, "r", encoding="utf-8") as planFile:
+        header = json.loads(planFile.readline() or "{}")
 
-        # create directories for modules
-        if (args.execute):
-            if (not os.path.isdir(pathToModDir)):
-                os.makedirs(pathToModDir)
+        if (header.get("planFormat") != planFormat):
+            print("Error: " + pathToPlan + " is not a plan file of this"
+                  + " version of autopen")
+            exit(1)
 
-        argumentsOfModule = getVariablesFromString(thisModule["syntax"], 0)
+        for lineNumber, line in enumerate(planFile):
+            record = json.loads(line)
+            allCosts.append([-record["cost"], record["name"], lineNumber])
 
-        with open(tempFileNameTemplate + thisModule["port"]) as targetHosts:
-            for host in targetHosts:
-                host = host.replace("\n","")
+    if (shard is None):
+        return [header, None]
 
-                # the command that will be appended to list of commands
-                exeString = thisModule["syntax"]
+    shardNumber, amountOfShards = shard
+    shardCosts = [0.0] * amountOfShards
+    selectedLines = set()
 
-                # add additional arguments given by to the output path
-                modOutput = pathToModDir + "/" + thisModule["name"]
+    for negativeCost, name, lineNumber in sorted(allCosts):
+        cheapestShard = shardCosts.index(min(shardCosts))
+        shardCosts[cheapestShard] -= negativeCost
 
-                for currArg in argumentsOfModule:
-                    # skip <outputFile> and <outputDir>
-                    if (currArg == "outputFile" or currArg == "outputDir"):
-                        continue
+        if (cheapestShard == shardNumber - 1):
+            selectedLines.add(lineNumber)
 
-                    # insert portnumber
-                    elif (currArg == "port"):
-                        modOutput = modOutput + "-" + thisModule["port"]
-                        exeString = exeString.replace("<port>",
-                                                      thisModule["port"])
+    return [header, selectedLines]
 
-                    elif (currArg == "targetIp"):
-                        # insert ip address
-                        modOutput = modOutput + "-" + host
-                        exeString = exeString.replace("<targetIp>", host)
-                        ipAddressCounter.append(host)
 
-                    else:
-                        # replace remaining arguments
-                        exeString = exeString.replace("<" + currArg + ">", 
-                                                      vars(args)[currArg])
-
-                # insert outputFile
-                exeString = exeString.replace("<outputFile>", modOutput)
-
-                # check if tool has already been executed
-                if (os.path.exists(modOutput)):
-                    print(f"{bcolor.yellow}###[DUPLICATE]###\t{bcolor.ends} "
-                          + thisModule["name"] + "-" + host + "-"
-                          + thisModule["port"])
-                else:
-                    allCommands.append([exeString, thisModule["name"] + "-"
-                                       + host + "-" + thisModule["port"]])
+"""Yield the jobs of a plan file (see --planIn).
+Jobs that have already been executed will not be executed again.
+
+pathToPlan = The path to the plan file.
+header = The header returned by readPlan.
+selectedLines = The line numbers of the jobs of the shard (None = all).
+"""
+def iterPlanJobs(pathToPlan, header, selectedLines):
+    global amountOfExecModules
+
+    with open(pathToPlan, "r", encoding="utf-8") as planFile:
+        planFile.readline()
+
+        for lineNumber, line in enumerate(planFile):
+            if (selectedLines is not None and not lineNumber in selectedLines):
+                continue
 
-    return allCommands
+            job = relocatePlanRecord(json.loads(line), header, args.output)
 
+            if (job["name"] in journalStates):
+                alreadyExecuted = journalStates[job["name"]] == "done"
+            else:
+                alreadyExecuted = os.path.exists(job["outputFile"])
+
+            if (alreadyExecuted):
+                print(f"{bcolor.yellow}###[DUPLICATE]###\t{bcolor.ends} "
+                      + job["name"])
+                amountOfExecModules -= 1
+                continue
+
+            if (args.execute):
+                # the modules of a coalesced nmap job have their own
+                # output directories
+                for outputJob in [job] + job.get("coalescedJobs", []):
+                    os.makedirs(os.path.dirname(outputJob["outputFile"]),
+                                exist_ok=True)
 
-"""Return exit status for executed command.
-Create thread and execute given tool.
+                if ("targets" in job):
+                    writeTargetFile(job)
 
-threading.Thread = The command that will be executed inside a shell.
-moduleName = The name of the module 
-that will be printed after successfull execution.
+            yield job
+
+
+"""Execute the given jobs or print them if they should not be executed.
+Jobs are consumed one by one, so that not all jobs have to be kept in memory.
+
+commands = The jobs created by createCommandFromTemplate.
+amountOfCommands = The amount of jobs (see countCommands).
+allExecutableModules = The modules the jobs are created from
+(used by --coalesceNmap, None for the jobs of a plan).
+index = The port index the jobs are created from (see allExecutableModules).
 """
-class threadForModule(threading.Thread):
-    def __init__(self, command, moduleName):
-        threading.Thread.__init__(self)
-        self.command = command
-        self.moduleName = moduleName
+def dispatchCommands(commands, amountOfCommands, allExecutableModules=None,
+                     index=None):
+    global amountOfExecModules
+    amountOfExecModules += amountOfCommands
+
+    # the time spent inside the scheduler is not part of the planning
+    commands = profile.iterate("createCommandFromTemplate", commands)
+
+    # the jobs of a plan have already been coalesced
+    if (args.coalesceNmap and allExecutableModules is not None):
+        commands = coalesceNmapJobs(commands, allExecutableModules, index)
+
+    for runCommand in commands:
+        summary.addPlanned(runCommand)
+
+        if (planFile):
+            planRecord = getPlanRecord(runCommand)
+            planRecord["cost"] = getExpectedCost(runCommand)
+            planFile.write(json.dumps(planRecord) + "\n")
 
-    def run(self):
-        # check if modules should only be printed
         if (args.execute):
-            try:
-                # run command in new shell and wait for termination
-                subprocess.check_output(self.command, shell=True, 
-                                        timeout=float(args.timeout))
-                print(f"{bcolor.green}###[DONE]###\t{bcolor.ends} "
-                      + self.moduleName)
-                return(0)
-
-            except subprocess.CalledProcessError as exc:
-                # skip error code 124 
-                # since timeout is necessary for the usage of netcat
-                if (exc.returncode == 124):
-                    print(f"{bcolor.green}###[DONE]###\t{bcolor.ends} "
-                          + self.moduleName)
-                    return(0)
-
-                # skip error code of module ssh-audit
-                if (exc.returncode == 3 and "ssh-audit" in self.command):
-                    print(f"{bcolor.green}###[DONE]###\t{bcolor.ends} "
-                          + self.moduleName)
-                    return(0)
+            journal.write(runCommand, "planned", command=runCommand["command"],
+                          outputFile=runCommand["outputFile"])
+            scheduler.submit(runCommand)
 
-                else:
-                    print(f"{bcolor.red}###[ERROR]###\t{bcolor.ends} " 
-                      + self.command)
-                    return(1)
+        elif (args.verbose):
+            print(runCommand["command"])
+
+        else:
+            print(runCommand["name"])
+
+
+# define colors for printing to stdout
+class bcolor:
+    purple = '\033[95m'
+    blue = '\033[94m'
+    green = '\033[92m'
+    yellow = "\033[1;33m"
+    red = '\033[91m'
+    ends= '\033[0m'
+
+
+# state of the run that is shared with the functions above, set by main()
+args = None
+moduleRegistry = None
+profile = None
+history = None
+summary = None
+scheduler = None
+journal = None
+journalStates = None
+outputCache = None
+planFile = None
+includeIpFilter = None
+excludeIpFilter = None
+includePortFilter = None
+excludePortFilter = None
+amountOfExecModules = 0
+allJobsCreated = False
 
 
 """MAIN
 
 """
-# define and configure static arguments
-argumentParser = argparse.ArgumentParser(description="""Automatic Pentesting.
+def main():
+    global args, moduleRegistry, profile, history, summary, scheduler
+    global journal, journalStates, outputCache, planFile
+    global includeIpFilter, excludeIpFilter, includePortFilter
+    global excludePortFilter, amountOfExecModules, allJobsCreated
+
+    # define and configure static arguments
+    argumentParser = argparse.ArgumentParser(
+        description="""Automatic Pentesting.
 Please dont be evil.
 
 Basic usage:
@@ -448,12 +5208,24 @@ Print matching modules for a given nmap xml file:
 Scan targets (top 1000 ports) and execute matching modules:
 ./autopen.py -o /tmp/output -ti 192.168.0.0/24 -e
 
+Merge several nmap xml files (or directories of xml files):
+./autopen.py -o /tmp/output -xf scan-team1.xml scans-team2/
+
+Start modules while nmap is still scanning:
+./autopen.py -o /tmp/output -ti 192.168.0.0/20 -pl -e
+
+Scan targets with 4 parallel nmap processes (1000 packets per second overall):
+./autopen.py -o /tmp/output -ti 10.0.0.0/16 -ns 4 -nr 1000 -e
+
 Exclude ip addresses:
 ./autopen.py -o /tmp/output -xf nmap-result.xml -ei 192.168.1.1 192.168.3.4 -e
 
 Only execute modules for given ip address and exclude ports:
 ./autopen.py -o /tmp/output -xf nmap-result.xml -ii 192.168.1.4 -ep 80 443 -e
 
+Exclude a network except one subnet and all ip addresses listed inside a file:
+./autopen.py -o /tmp/output -xf nmap-result.xml -ei 10.0.0.0/16 '!10.0.5.0/24' @out-of-scope.txt -e
+
 Exclude all modules that have one of the given substrings in their name:
 ./autopen.py -o /tmp/output -xf nmap-result.xml -im smb netcat -e
 
@@ -466,248 +5238,799 @@ Execute modules with higher risk level, use more threads and increase timeout:
 Special characters in passwords must be escaped.
 """, formatter_class=RawTextHelpFormatter)
 
-requiredArgs = argumentParser.add_mutually_exclusive_group(required=True)
-
-argumentParser.add_argument("-e",
-                            "--execute", 
-                            dest = "execute",
-                            help = "execute matching commands",
-                            action = "store_true")
-
-argumentParser.add_argument("-v",
-                            "--verbose",
-                            dest = "verbose",
-                            help = "print full command",
-                            action = "store_true")
-
-argumentParser.add_argument("-o",
-                            "--output",
-                            dest = "output",
-                            help = "path to output directory",
-                            required = "true")
-
-argumentParser.add_argument("-t",
-                            "--timeout",
-                            dest="timeout",
-                            help = "maximal time that a single thread"
-                                 + " is allowed to run"
-                                 + " in seconds (default 600)",
-                            default = "600")
-
-requiredArgs.add_argument("-ti",
-                            "--targetIp",
-                            dest = "targetIp",
-                            help = "initiate nmap scan for given ip addresses"
-                                   + " (use nmap ip address notation)")
-
-requiredArgs.add_argument("-xf",
-                            "--xmlFile",
-                            dest = "xmlFile",
-                            help = "full path to xml nmap file")
-
-argumentParser.add_argument("-rl",
-                            "--riskLevel",
-                            dest = "riskLevel",
-                            help = "set maximal riskLevel for modules"
-                                   + " (possible values 1-4, 2 is default)",
-                            default = "2")
-
-argumentParser.add_argument("-ta",
-                            "--threadAmount",
-                            dest = "threadAmount",
-                            help = "the amount of parallel running threads"
-                                   + " (default 5)",
-                            default = "5")
-
-argumentParser.add_argument("-em",
-                            "--exludeModules",
-                            dest = "excludeModules",
-                            nargs = "*",
-                            help = "modules that will be excluded "
-                                   + "(exclude ovewrites include)",
-                            default = "NULL")
-
-argumentParser.add_argument("-im",
-                            "--includeModules",
-                            dest = "includeModules",
-                            nargs = "*",
-                            help = "modules that will be included",
-                            default = "NULL")
-
-argumentParser.add_argument("-ii",
-                            "--includeIps",
-                            dest = "includeIps", 
-                            nargs = "*",
-                            help = "filter by including ipv4 addresses",
-                            default = "NULL")
-
-argumentParser.add_argument("-ei",
-                            "--excludeIps",
-                            dest = "excludeIps", 
-                            nargs = "*",
-                            help = "filter by excluding ipv4 addresses",
-                            default = "NULL")
-
-argumentParser.add_argument("-ip",
-                            "--includePorts", 
-                            dest = "includePorts", 
-                            nargs = "*",
-                            help = "filter by including port number",
-                            default = "NULL")
-
-argumentParser.add_argument("-ep",
-                            "--excludePorts",
-                            dest = "excludePorts", 
-                            nargs = "*",
-                            help = "filter by excluding port number",
-                            default = "NULL")
-
-# get path to directory that contains the json config
-pathToScript = os.path.realpath(__file__)
-pathToScriptDir  = os.path.dirname(pathToScript)
-argsFromJsonConf = getArgsOfJson()
-
-# add arguments of json file to argumentParser
-for currJsonArg in argsFromJsonConf:
-    capitalLetters = currJsonArg[0]
-
-    for char in currJsonArg:
-        if (char.isupper()):
-            capitalLetters = capitalLetters + char     
+    requiredArgs = argumentParser.add_mutually_exclusive_group(required=True)
+
+    argumentParser.add_argument("-e",
+                                "--execute", 
+                                dest = "execute",
+                                help = "execute matching commands",
+                                action = "store_true")
+
+    argumentParser.add_argument("-r",
+                                "--resume",
+                                dest = "resume",
+                                help = "use the journal inside the output"
+                                       + " directory to only execute commands"
+                                       + " that have not been finished"
+                                       + " successfully",
+                                action = "store_true")
+
+    argumentParser.add_argument("-v",
+                                "--verbose",
+                                dest = "verbose",
+                                help = "print full command",
+                                action = "store_true")
+
+    argumentParser.add_argument("-o",
+                                "--output",
+                                dest = "output",
+                                help = "path to output directory",
+                                required = "true")
+
+    argumentParser.add_argument("-t",
+                                "--timeout",
+                                dest="timeout",
+                                help = "maximal time that a single thread is"
+                                       + " allowed to run in seconds (default"
+                                       + " 600), the timeout key of a module"
+                                       + " is preferred",
+                                default = "600")
+
+    argumentParser.add_argument("-at",
+                                "--adaptiveTimeout",
+                                dest = "adaptiveTimeout",
+                                help = "derive the timeout of a module from"
+                                       + " the 95th percentile of its"
+                                       + " previous durations multiplied by"
+                                       + " the given factor (e.g. 3)")
+
+    argumentParser.add_argument("-rc",
+                                "--resultCache",
+                                dest = "resultCache",
+                                help = "reuse the outputs of previous runs"
+                                       + " (also of other output directories)"
+                                       + " that are younger than the given"
+                                       + " amount of hours, if module,"
+                                       + " command, host, port and nmap"
+                                       + " service fingerprint are unchanged"
+                                       + " (default 0 = disabled)",
+                                default = "0")
+
+    requiredArgs.add_argument("-ti",
+                                "--targetIp",
+                                dest = "targetIp",
+                                help = "initiate nmap scan for given ip"
+                                       + " addresses (use nmap ip address"
+                                       + " notation)")
+
+    argumentParser.add_argument("-ns",
+                                "--nmapShards",
+                                dest = "nmapShards",
+                                help = "split the targets of -ti into shards"
+                                       + " that are scanned by parallel nmap"
+                                       + " processes (default 1)",
+                                default = "1")
+
+    argumentParser.add_argument("-nr",
+                                "--nmapRate",
+                                dest = "nmapRate",
+                                help = "the overall --min-rate of the nmap"
+                                       + " scan, divided across all shards"
+                                       + " (default 600)",
+                                default = "600")
+
+    argumentParser.add_argument("-pl",
+                                "--pipeline",
+                                dest = "pipeline",
+                                help = "start modules for every host as soon"
+                                       + " as the nmap scan of -ti has"
+                                       + " finished the host",
+                                action = "store_true")
+
+    requiredArgs.add_argument("-xf",
+                                "--xmlFile",
+                                dest = "xmlFile",
+                                nargs = "+",
+                                help = "full path to xml nmap files or"
+                                       + " directories containing xml files"
+                                       + " (results are merged)")
+
+    argumentParser.add_argument("-bl",
+                                "--baseline",
+                                dest = "baseline",
+                                nargs = "+",
+                                help = "only execute modules for ports that"
+                                       + " are not open inside the given"
+                                       + " previous xml nmap files or"
+                                       + " directories or whose service has"
+                                       + " changed, the changes are printed"
+                                       + " as report")
+
+    requiredArgs.add_argument("-wo",
+                              "--worker",
+                              dest = "worker",
+                              help = "connect to the coordinator at the given"
+                                     + " address (host:port or path to unix"
+                                     + " socket) and execute its modules, -ta"
+                                     + " sets the amount of parallel modules")
+
+    requiredArgs.add_argument("-fi",
+                              "--indexFindings",
+                              dest = "indexFindings",
+                              action = "store_true",
+                              help = "parse the outputs inside -o into the"
+                                     + " findings index (only new and changed"
+                                     + " files, executed automatically after"
+                                     + " -e)")
+
+    requiredArgs.add_argument("-fq",
+                              "--findingsQuery",
+                              dest = "findingsQuery",
+                              nargs = "*",
+                              help = "print the findings of the findings index"
+                                     + " inside -o matching all given filters:"
+                                     + " creds, module=PATTERN, host=PATTERN,"
+                                     + " port=PORT, rule=PATTERN,"
+                                     + " severity=MINIMAL_SEVERITY, text=TEXT")
+
+    requiredArgs.add_argument("-pi",
+                              "--planIn",
+                              dest = "planIn",
+                              help = "execute or print the jobs of the given"
+                                     + " plan file (see --planOut) instead of"
+                                     + " planning them")
+
+    argumentParser.add_argument("-po",
+                                "--planOut",
+                                dest = "planOut",
+                                help = "write the planned jobs (command,"
+                                       + " module, host, port, output file"
+                                       + " and expected cost) to the given"
+                                       + " plan file (jsonl)")
+
+    argumentParser.add_argument("-sh",
+                                "--shard",
+                                dest = "shard",
+                                help = "execute only the given shard i/n of"
+                                       + " the plan of --planIn (e.g. 2/4),"
+                                       + " the jobs are distributed to the"
+                                       + " shards by their expected cost,"
+                                       + " every shard gets the same jobs on"
+                                       + " every machine")
+
+    argumentParser.add_argument("-co",
+                                "--coordinator",
+                                dest = "coordinator",
+                                help = "distribute the modules to workers"
+                                       + " connecting to the given address"
+                                       + " (host:port or path to unix socket),"
+                                       + " -ta limits the modules running on"
+                                       + " all workers together")
+
+    argumentParser.add_argument("-tk",
+                                "--token",
+                                dest = "token",
+                                help = "shared secret of coordinator and"
+                                       + " workers",
+                                default = "")
+
+    argumentParser.add_argument("-rl",
+                                "--riskLevel",
+                                dest = "riskLevel",
+                                help = "set maximal riskLevel for modules"
+                                       + " (possible values 1-4, 2 is"
+                                       + " default)",
+                                default = "2")
+
+    argumentParser.add_argument("-ta",
+                                "--threadAmount",
+                                dest = "threadAmount",
+                                help = "the amount of parallel running"
+                                       + " threads, modules with a slotWeight"
+                                       + " use several threads (default 5)",
+                                default = "5")
+
+    argumentParser.add_argument("-en",
+                                "--engine",
+                                dest = "engine",
+                                choices = ["threads", "async"],
+                                help = "execute every command inside its own"
+                                       + " thread (threads) or all commands"
+                                       + " inside a single asyncio event loop"
+                                       + " (async), use async with a high -ta"
+                                       + " for thousands of lightweight"
+                                       + " commands (default threads)",
+                                default = "threads")
+
+    argumentParser.add_argument("-or",
+                                "--order",
+                                dest = "order",
+                                choices = ["priority", "config"],
+                                help = "start the commands ordered by the"
+                                       + " priority and riskLevel of the"
+                                       + " modules and the median of their"
+                                       + " previous durations (priority) or"
+                                       + " in the order of the module configs"
+                                       + " (config), both are interleaved"
+                                       + " across hosts (default priority)",
+                                default = "priority")
+
+    argumentParser.add_argument("-b",
+                                "--batch",
+                                dest = "batch",
+                                action = "store_true",
+                                help = "execute modules with a batchSyntax"
+                                       + " once for a list of hosts instead"
+                                       + " of once per host")
+
+    argumentParser.add_argument("-cn",
+                                "--coalesceNmap",
+                                dest = "coalesceNmap",
+                                action = "store_true",
+                                help = "merge the nmap script modules of a"
+                                       + " host into a single nmap scan")
+
+    argumentParser.add_argument("-oc",
+                                "--outputCompression",
+                                dest = "outputCompression",
+                                choices = ["none", "gzip", "zstd"],
+                                help = "compress the output of modules on the"
+                                       + " fly, the output file gets the"
+                                       + " suffix .gz or .zst (default none)",
+                                default = "none")
+
+    argumentParser.add_argument("-ms",
+                                "--maxOutputSize",
+                                dest = "maxOutputSize",
+                                help = "truncate the output of a single module"
+                                       + " after the given amount of megabytes"
+                                       + " (default 0 = unlimited)",
+                                default = "0")
+
+    argumentParser.add_argument("-pf",
+                                "--prometheusFile",
+                                dest = "prometheusFile",
+                                help = "write the metrics per module to the"
+                                       + " given file (Prometheus textfile"
+                                       + " format)")
+
+    argumentParser.add_argument("-pr",
+                                "--profile",
+                                dest = "profile",
+                                help = "write the time spent to read the nmap"
+                                       + " results, to match modules and to"
+                                       + " create commands, the scheduler"
+                                       + " statistics and the peak memory to"
+                                       + " the given json file")
+
+    argumentParser.add_argument("-si",
+                                "--statusInterval",
+                                dest = "statusInterval",
+                                help = "the seconds between two updates of"
+                                       + " autopen-status.json inside the"
+                                       + " output directory, send SIGUSR1 to"
+                                       + " print the status (default 10)",
+                                default = "10")
+
+    argumentParser.add_argument("-sl",
+                                "--statusLine",
+                                dest = "statusLine",
+                                action = "store_true",
+                                help = "print a compact status line with the"
+                                       + " counters and the ETA on the"
+                                       + " terminal")
+
+    argumentParser.add_argument("-qs",
+                                "--queueSize",
+                                dest = "queueSize",
+                                help = "the maximal amount of queued commands"
+                                       + " waiting for a free thread"
+                                       + " (default 1000)",
+                                default = "1000")
+
+    argumentParser.add_argument("-mh",
+                                "--maxPerHost",
+                                dest = "maxPerHost",
+                                help = "the maximal amount of parallel running"
+                                       + " modules per target ip address"
+                                       + " (default 0 = unlimited)",
+                                default = "0")
+
+    argumentParser.add_argument("-mp",
+                                "--maxPerPort",
+                                dest = "maxPerPort",
+                                help = "the maximal amount of parallel"
+                                       + " running modules per target ip"
+                                       + " address and port (default 0 ="
+                                       + " unlimited)",
+                                default = "0")
+
+    argumentParser.add_argument("-em",
+                                "--exludeModules",
+                                dest = "excludeModules",
+                                nargs = "*",
+                                help = "modules that will be excluded "
+                                       + "(exclude ovewrites include)",
+                                default = "NULL")
+
+    argumentParser.add_argument("-im",
+                                "--includeModules",
+                                dest = "includeModules",
+                                nargs = "*",
+                                help = "modules that will be included",
+                                default = "NULL")
+
+    argumentParser.add_argument("-ii",
+                                "--includeIps",
+                                dest = "includeIps", 
+                                nargs = "*",
+                                help = "filter by including ip addresses,"
+                                       + " CIDRs, ranges or @files (prefix !"
+                                       + " removes entries)",
+                                default = "NULL")
+
+    argumentParser.add_argument("-ei",
+                                "--excludeIps",
+                                dest = "excludeIps", 
+                                nargs = "*",
+                                help = "filter by excluding ip addresses,"
+                                       + " CIDRs, ranges or @files (prefix !"
+                                       + " removes entries)",
+                                default = "NULL")
+
+    argumentParser.add_argument("-ip",
+                                "--includePorts", 
+                                dest = "includePorts", 
+                                nargs = "*",
+                                help = "filter by including port numbers,"
+                                       + " ranges or @files (prefix ! removes"
+                                       + " entries)",
+                                default = "NULL")
+
+    argumentParser.add_argument("-ep",
+                                "--excludePorts",
+                                dest = "excludePorts", 
+                                nargs = "*",
+                                help = "filter by excluding port numbers,"
+                                       + " ranges or @files (prefix ! removes"
+                                       + " entries)",
+                                default = "NULL")
+
+    # get path to directory that contains the json config
+    pathToScript = os.path.realpath(__file__)
+    pathToScriptDir  = os.path.dirname(pathToScript)
+
+    argumentParser.add_argument("-mc",
+                                "--moduleConfig",
+                                dest = "moduleConfig",
+                                help = "path to the module configuration"
+                                       + " (default modules.json next to"
+                                       + " autopen)",
+                                default = pathToScriptDir + "/modules.json")
+
+    argumentParser.add_argument("-md",
+                                "--moduleDir",
+                                dest = "moduleDir",
+                                nargs = "*",
+                                help = "directories with additional json"
+                                       + " module files (default modules.d"
+                                       + " next to autopen)",
+                                default = [pathToScriptDir + "/modules.d"])
+
+    argumentParser.add_argument("-pc",
+                                "--parserConfig",
+                                dest = "parserConfig",
+                                help = "path to the parser rules of the"
+                                       + " findings index (default"
+                                       + " parsers.json next to autopen)",
+                                default = pathToScriptDir + "/parsers.json")
+
+    argumentParser.add_argument("-lm",
+                                "--listModules",
+                                help = "print all available modules and exit",
+                                action = listModulesAction)
+
+    # the module configuration has to be known before all arguments are parsed
+    preParser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    preParser.add_argument("-mc", "--moduleConfig", dest="moduleConfig",
+                           default=pathToScriptDir + "/modules.json")
+    preParser.add_argument("-md", "--moduleDir", dest="moduleDir", nargs="*",
+                           default=[pathToScriptDir + "/modules.d"])
+    preArgs = preParser.parse_known_args()[0]
+
+    moduleRegistry = loadModuleRegistry(preArgs.moduleConfig,
+                                        preArgs.moduleDir)
+    argsFromJsonConf = getArgsOfJson()
+
+    # add arguments of json file to argumentParser
+    for currJsonArg in argsFromJsonConf:
+        capitalLetters = getShortOption(currJsonArg)
+
+        try:
+            argumentParser.add_argument("-" + capitalLetters,
+                                        "--" + currJsonArg,
+                                        dest=currJsonArg,
+                                        default="NULL")
+        except argparse.ArgumentError:
+            print("Error in modules.json - "
+                  + "collision for config argument name (args): "
+                  + currJsonArg)
+            print("Argparse conflicting option string: --"
+                  + currJsonArg + "/-" + capitalLetters)
+            exit(1)
+
+    args = argumentParser.parse_args()
+
+    # catch ctrl + c
+    signal.signal(signal.SIGINT, signal_handler)
+
+    # never leave the tools of running jobs behind
+    atexit.register(stopRunningJobs)
+
+    # compile the filters given by user once
+    includeIpFilter = None
+    excludeIpFilter = None
+    includePortFilter = None
+    excludePortFilter = None
+
     try:
-        argumentParser.add_argument("-" + capitalLetters.lower(),
-                                    "--" + currJsonArg,
-                                    dest=currJsonArg,
-                                    default="NULL")
-    except:
-        print("Error in modules.json - "
-              + "collision for config argument name (args): " + currJsonArg)
-        print("Argparse conflicting option string: --"
-              + currJsonArg + "/-" + capitalLetters)
+        if (args.includeIps != "NULL"):
+            includeIpFilter = addressFilter(args.includeIps)
+
+        if (args.excludeIps != "NULL"):
+            excludeIpFilter = addressFilter(args.excludeIps)
+
+        if (args.includePorts != "NULL"):
+            includePortFilter = compilePortFilter(args.includePorts)
+
+        if (args.excludePorts != "NULL"):
+            excludePortFilter = compilePortFilter(args.excludePorts)
+
+    except (OSError, ValueError) as exc:
+        print("Error in filter arguments - " + str(exc))
         exit(1)
 
-args = argumentParser.parse_args()
+    # collects the planned and finished modules per module and host
+    summary = runSummary()
 
-# catch ctrl + c
-signal.signal(signal.SIGINT, signal_handler)
+    # collects the time spent inside the phases of the planning
+    profile = runProfile()
 
-# define colors for printing to stdout
-class bcolor:
-    purple = '\033[95m'
-    blue = '\033[94m'
-    green = '\033[92m'
-    yellow = "\033[1;33m"
-    red = '\033[91m'
-    ends= '\033[0m'
+    # durations of previous runs, used by --adaptiveTimeout and --order
+    history = durationHistory(getCacheDir() + "/history.json")
+
+    if (not args.resultCache.isdigit()):
+        print("Error: the argument --resultCache must be a number of hours")
+        exit(1)
+
+    # outputs of previous runs, used by --resultCache
+    if (int(args.resultCache)):
+        outputCache = resultCache(getCacheDir() + "/results",
+                                  int(args.resultCache) * 3600)
+    else:
+        outputCache = None
+
+    if (not args.maxOutputSize.isdigit()):
+        print("Error: the argument --maxOutputSize"
+              + " must be a number of megabytes")
+        exit(1)
+
+    if (args.outputCompression == "zstd" and not shutil.which("zstd")):
+        print("Error: zstd is required for --outputCompression zstd")
+        exit(1)
+
+    if (args.adaptiveTimeout):
+        try:
+            if (float(args.adaptiveTimeout) <= 0):
+                raise ValueError
+        except ValueError:
+            print("Error: the factor of --adaptiveTimeout"
+                  + " must be a positive number")
+            exit(1)
+
+    try:
+        if (float(args.statusInterval) <= 0):
+            raise ValueError
+    except ValueError:
+        print("Error: the argument --statusInterval must be a positive number"
+              + " of seconds")
+        exit(1)
 
-# counts the overall ip addresses that will be scanned
-ipAddressCounter = []
+    if (args.coordinator and not args.execute):
+        print("Error: --coordinator requires --execute")
+        exit(1)
+
+    # the jobs contain the arguments given to the coordinator (e.g. passwords)
+    if (args.coordinator and not args.token
+        and getSocketAddress(args.coordinator)[0] != socket.AF_UNIX):
+        print("Error: a coordinator listening on host:port requires --token")
+        exit(1)
+
+    if (args.planIn and not os.path.isfile(args.planIn)):
+        print("Error: the plan " + args.planIn + " does not exist")
+        exit(1)
 
-# check if some xml input has been given by user
-if (args.xmlFile != "NULL" and args.xmlFile):
-    pathToNmap = args.xmlFile
+    # the shard of the plan that is executed, used by --shard
+    if (args.shard):
+        shardMatch = re.fullmatch(r"(\d+)/(\d+)", args.shard)
 
-    # convert xml nmap file to list
-    nmapIpPortList = convertXmlToList(pathToNmap)
+        if (not args.planIn or not shardMatch
+            or not 1 <= int(shardMatch.group(1)) <= int(shardMatch.group(2))):
+            print("Error: --shard requires --planIn and the format i/n"
+                  + " (e.g. 2/4)")
+            exit(1)
 
-else:
-    pathToNmap = args.output + "/nmap"
+        shard = [int(shardMatch.group(1)), int(shardMatch.group(2))]
+    else:
+        shard = None
 
-    # create directory for nmap
-    if (not os.path.exists(pathToNmap)):
-        os.makedirs(pathToNmap)
+    # execute the modules of a coordinator instead of planning them
+    if (args.worker):
+        runWorker(args.worker)
+        exit(0)
 
-    nmapScan = "nmap -p- -sT --min-rate 600 -Pn -oA " + pathToNmap + "/" \
-               + args.targetIp + "-p-sT " + args.targetIp
+    if (args.findingsQuery is not None):
+        printFindings(args.findingsQuery)
+        exit(0)
 
-    pathToNmap = pathToNmap + "/" + args.targetIp + "-p-sT.xml"
-    os.system(nmapScan)
+    # the parser rules are checked before the modules are executed
+    if (args.execute or args.indexFindings):
+        parserRules = loadParserRules(args.parserConfig)
 
-    # convert xml nmap file to list
-    nmapIpPortList = convertXmlToList(pathToNmap)
+    if (args.indexFindings):
+        if (not os.path.isdir(args.output)):
+            print("Error: the output directory " + args.output
+                  + " does not exist")
+            exit(1)
 
-# used to collect all temporary files
-allTempFiles = []
+        updateFindingsIndex(parserRules)
+        exit(0)
 
-# create temporary filenames based on path to nmap scan
-tempFileNameTemplate = pathToNmap.replace("/", "_")
-tempFileNameTemplate = "/tmp/autoPen" + tempFileNameTemplate + "-"
+    # open ports of a previous scan, used by --baseline
+    if (args.baseline):
+        for pathToBaseline in getNmapXmlFiles(args.baseline):
+            if (not os.path.isfile(pathToBaseline)):
+                print("Error: the baseline " + pathToBaseline
+                      + " does not exist")
+                exit(1)
 
-# remove temporary files that wrongly already exists
-os.system("rm " + tempFileNameTemplate + "* 2> /dev/null")
+        baseline = baselineDiff(args.baseline)
+    else:
+        baseline = None
 
-# get a list with modules that matches the arguments given by user
-executableModules = getMatchingModules()
+    # the last state of every job of previous runs, used by --resume
+    pathToJournal = args.output + "/autopen-journal.jsonl"
 
-# create commands from template
-commandsToExecute = createCommandFromTemplate(executableModules)
+    if (args.resume):
+        journalStates = loadJournalStates(pathToJournal)
+    else:
+        journalStates = {}
 
-# will contain the running threads
-threads = []
+    # get a list with modules that matches the arguments given by user
+    selectedModules = getSelectedModules()
 
-# count finished modules
-amountOfExecModules = len(commandsToExecute)
-counter = 1
+    # only the output of streamed modules is compressed and limited
+    if (args.execute):
+        for module in selectedModules:
+            if (not module.get("streamOutput")
+                or (args.batch and "batchSyntax" in module
+                    and not module.get("batchStreamOutput"))):
+                print(f"{bcolor.yellow}###[NOT STREAMED]###\t{bcolor.ends} "
+                      + module["name"] + " - the output is neither"
+                      + " compressed nor limited, output that is not"
+                      + " redirected to a file is discarded (end the"
+                      + " syntax with '> <outputFile> 2>&1')")
+
+    # count planned modules
+    amountOfExecModules = 0
+    allJobsCreated = False
 
-for runCommand in commandsToExecute:
-    # execute modules inside parallel threads
     if (args.execute):
-        if (args.verbose):
-            print(f"{bcolor.blue}###[START]###\t{bcolor.ends} "
-                  + runCommand[0] + " - " + str(counter) 
-                  + "/" + str(amountOfExecModules))
+        # execute modules inside parallel worker threads
+        limits = slotLimits(int(args.threadAmount), int(args.maxPerHost),
+                            int(args.maxPerPort))
+        if (not os.path.isdir(args.output)):
+            os.makedirs(args.output)
+
+        journal = runJournal(pathToJournal)
+        metricsJournal = runJournal(args.output + "/autopen-metrics.jsonl")
+        if (args.coordinator):
+            scheduler = remoteModuleScheduler(limits, int(args.queueSize),
+                                              journal, metricsJournal, summary,
+                                              args.coordinator, args.token)
+        elif (args.engine == "async"):
+            scheduler = asyncModuleScheduler(limits, int(args.queueSize),
+                                             journal, metricsJournal, summary)
         else:
-            print(f"{bcolor.blue}###[START]###\t{bcolor.ends} "
-                  + runCommand[1] + " - " + str(counter) 
-                  + "/" + str(amountOfExecModules))
+            scheduler = moduleScheduler(limits, int(args.queueSize), journal,
+                                        metricsJournal, summary)
+
+        # report the progress inside the status file and on SIGUSR1
+        progress = progressReporter(scheduler,
+                                    args.output + "/autopen-status.json",
+                                    float(args.statusInterval),
+                                    args.statusLine)
+        signal.signal(signal.SIGUSR1, progress.requestDump)
+
+    # the created jobs are written to a plan file, used by --planOut
+    if (args.planOut):
+        planFile = open(args.planOut, "w", encoding="utf-8")
+        # the paths of the plan are moved to the output directory
+        # of the run that executes the plan (see relocatePlanRecord)
+        planFile.write(json.dumps({"planFormat": planFormat,
+                                   "output": os.path.abspath(args.output),
+                                   "workingDir": os.getcwd()}) + "\n")
+    else:
+        planFile = None
 
-        counter += 1
+    # execute the jobs of a plan (or of a shard of the plan)
+    if (args.planIn):
+        planHeader, selectedLines = readPlan(args.planIn, shard)
 
-        while 1:
-            # run 5 threads in parallel
-            if (threading.active_count() < int(args.threadAmount)):
-                currThread = threadForModule(runCommand[0], runCommand[1])
-                threads.append(currThread)
-                currThread.start()
-                break
+        if (selectedLines is None):
+            amountOfPlanJobs = sum(1 for line in open(args.planIn)) - 1
+        else:
+            amountOfPlanJobs = len(selectedLines)
+
+        dispatchCommands(iterPlanJobs(args.planIn, planHeader, selectedLines),
+                         amountOfPlanJobs)
+        nmapIpPortList = []
+
+    # check if some xml input has been given by user
+    elif (args.xmlFile != "NULL" and args.xmlFile):
+        # convert xml nmap files to list
+        nmapIpPortList = convertXmlToList(args.xmlFile)
 
-            else:
-                time.sleep(3)
-    
     else:
-        if (args.verbose):
-            print(runCommand[0])
+        pathToNmap = args.output + "/nmap"
+
+        # create directory for nmap
+        if (not os.path.exists(pathToNmap)):
+            os.makedirs(pathToNmap)
+
+        # ip address notation like 10.0.0.0/24 must not create subdirectories
+        # or contain characters that are interpreted by the shell
+        pathToNmap = pathToNmap + "/" \
+                     + re.sub(r"[^\w.,-]", "_", args.targetIp) + "-p-sT"
+
+        # split the targets into shards that are scanned in parallel
+        # every shard gets an equal part of the overall rate
+        if (int(args.nmapShards) > 1):
+            nmapTargets = []
+
+            for shardFile in writeNmapShards(args.targetIp,
+                                             int(args.nmapShards), pathToNmap):
+                nmapTargets.append([shardFile[:-len(".txt")],
+                                    "-iL " + shardFile])
+        else:
+            nmapTargets = [[pathToNmap, args.targetIp]]
+
+        nmapRate = str(max(1, int(args.nmapRate) // max(1, len(nmapTargets))))
+        nmapScans = []
+
+        # the versions of the services are part of the key of the result cache
+        if (outputCache):
+            nmapOptions = "-p- -sT -sV"
+        else:
+            nmapOptions = "-p- -sT"
+
+        for pathToShard, targetsOfShard in nmapTargets:
+            if (args.pipeline):
+                # write xml to stdout, so that modules can be started
+                # while nmap is still scanning
+                nmapScan = "nmap " + nmapOptions + " --min-rate " + nmapRate \
+                           + " -Pn -oN " + pathToShard + ".nmap -oG " \
+                           + pathToShard + ".gnmap -oX - " + targetsOfShard
+            else:
+                nmapScan = "nmap " + nmapOptions + " --min-rate " + nmapRate \
+                           + " -Pn -oA " + pathToShard + " " + targetsOfShard
+
+            nmapScans.append([nmapScan, pathToShard + ".xml"])
+
+        if (args.pipeline):
+            for hostOfScan in iterParallelNmapScanHosts(nmapScans):
+                if (baseline):
+                    hostOfScan = baseline.filterHost(hostOfScan)
+
+                hostIndex = createPortIndex([hostOfScan])
+                modulesOfHost = getMatchingModules(selectedModules, hostIndex)
+                dispatchCommands(createCommandFromTemplate(modulesOfHost,
+                                                           hostIndex),
+                                 countCommands(modulesOfHost, hostIndex),
+                                 modulesOfHost, hostIndex)
+
+            nmapIpPortList = []
+
+        elif (len(nmapScans) == 1):
+            os.system(nmapScans[0][0])
+
+            # convert xml nmap file to list
+            nmapIpPortList = convertXmlToList([nmapScans[0][1]])
+
+        else:
+            # run the shards inside the worker pool
+            # the discovery scan of a coordinator is not distributed
+            if (args.execute and not args.coordinator):
+                discoveryScheduler = scheduler
+            else:
+                discoveryScheduler = moduleScheduler(
+                    slotLimits(len(nmapScans), 0, 0), len(nmapScans), None,
+                    None, None)
+
+            amountOfExecModules += len(nmapScans)
+
+            for shardNumber, (nmapScan, pathToNmapXml) in enumerate(nmapScans):
+                discoveryScheduler.submit({"command": nmapScan,
+                                           "name": "nmap-shard"
+                                                   + str(shardNumber + 1),
+                                           "host": pathToNmapXml,
+                                           "port": "*",
+                                           "outputFile": pathToNmapXml,
+                                           "module": {"name": "nmap"},
+                                           "timeout": None,
+                                           "discovery": True})
+
+            discoveryScheduler.waitIdle()
+
+            # merge the xml files of all shards
+            nmapIpPortList = convertXmlToList([pathToNmapXml for nmapScan,
+                                               pathToNmapXml in nmapScans])
+
+    # only plan modules for new ports and ports with a changed service
+    if (baseline):
+        nmapIpPortList = baseline.filterHosts(nmapIpPortList)
+
+        if (args.execute):
+            baseline.printReport(args.output + "/autopen-baseline-diff.txt")
         else:
-            print(runCommand[1])
+            baseline.printReport(None)
+
+    # map open ports to the hosts that can be targeted
+    portIndex = createPortIndex(nmapIpPortList)
+
+    # create commands from template while they are executed
+    executableModules = getMatchingModules(selectedModules, portIndex)
+    dispatchCommands(createCommandFromTemplate(executableModules, portIndex),
+                     countCommands(executableModules, portIndex),
+                     executableModules, portIndex)
 
-# wait for all modules to finish
-for x in threads:
-    x.join()
+    # all jobs have been created
+    allJobsCreated = True
 
-# print amount of modules for each ip addresses
-print("")
-print(f"{bcolor.purple}### Amount of Modules \
-to execute per Host: ###{bcolor.ends}")
+    if (planFile):
+        planFile.close()
 
-uniqIps = sorted(set(ipAddressCounter))
-countList = []
+    if (args.execute):
+        # wait for all modules to finish
+        scheduler.join()
+        progress.stop()
+        journal.close()
+        metricsJournal.close()
+        history.save()
+        scheduler.printStatistics()
+
+        if (outputCache):
+            outputCache.prune()
 
-for currIp in uniqIps:
-    countList.append([ipAddressCounter.count(currIp), "\t - \t" + currIp])
+        # parse the outputs of this and previous runs into the findings index
+        updateFindingsIndex(parserRules)
 
-# inverse sort order
-countList.sort(reverse=True)
+    # print the summary per module and per host
+    summary.print()
 
-for i in countList:
-    print(str(i[0]) + i[1])
+    if (args.prometheusFile):
+        summary.writePrometheus(args.prometheusFile)
 
-# remove all temporary files
-for tmpFile in allTempFiles:
-    os.remove(tmpFile)
+    if (args.profile):
+        profile.write(args.profile,
+                      scheduler.getStatistics() if args.execute else None)
+
+    if (args.execute):
+        # remove empty directories
+        for directory in os.scandir(args.output):
+            if os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
 
-if (args.execute):
-    # remove empty directories
-    for directory in os.scandir(args.output):
-        if os.path.isdir(directory) and not os.listdir(directory):
-            os.rmdir(directory)
 
+if (__name__ == "__main__"):
+    main()
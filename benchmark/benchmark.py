@@ -0,0 +1,383 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+
+"""Benchmark of the planning and scheduling overhead of autopen.
+Creates a synthetic nmap xml result and a module configuration
+whose commands are local stand-in tools (see stubTool.py),
+runs autopen with --profile for every amount of hosts and every -ta
+and appends the results to a json file, so that runs can be compared.
+"""
+
+
+# port numbers and service fingerprints of the synthetic scan
+commonPorts = [[21, "ftp", "vsftpd", "3.0.3"],
+               [22, "ssh", "OpenSSH", "8.9p1"],
+               [23, "telnet", "", ""],
+               [25, "smtp", "Postfix smtpd", ""],
+               [53, "domain", "ISC BIND", "9.16.1"],
+               [80, "http", "nginx", "1.18.0"],
+               [110, "pop3", "Dovecot pop3d", ""],
+               [111, "rpcbind", "", "2-4"],
+               [135, "msrpc", "Microsoft Windows RPC", ""],
+               [139, "netbios-ssn", "Samba smbd", "4.6.2"],
+               [143, "imap", "Dovecot imapd", ""],
+               [161, "snmp", "net-snmp", ""],
+               [389, "ldap", "OpenLDAP", "2.2.X - 2.3.X"],
+               [443, "https", "Apache httpd", "2.4.52"],
+               [445, "microsoft-ds", "", ""],
+               [1433, "ms-sql-s", "Microsoft SQL Server 2019", "15.00.2000"],
+               [2049, "nfs", "", "3-4"],
+               [3306, "mysql", "MySQL", "8.0.32"],
+               [3389, "ms-wbt-server", "xrdp", ""],
+               [5432, "postgresql", "PostgreSQL DB", "14.7"],
+               [5985, "http", "Microsoft HTTPAPI httpd", "2.0"],
+               [6379, "redis", "Redis key-value store", "6.0.16"],
+               [8080, "http-proxy", "", ""],
+               [8443, "https-alt", "", ""]]
+
+
+"""Return the ipv4 address of the host with the given number.
+
+hostNumber = The number of the host (starting at 0).
+"""
+def getHostAddress(hostNumber):
+    return ("10." + str(hostNumber // 65536 % 256) + "."
+            + str(hostNumber // 256 % 256) + "." + str(hostNumber % 256))
+
+
+"""Write a synthetic nmap xml result.
+The amount of open ports of every host is drawn between 1
+and 2 * portDensity - 1, so that hosts have an average of portDensity ports.
+
+pathToXml = The path to the xml file.
+amountOfHosts = The amount of hosts.
+portDensity = The average amount of open ports per host.
+"""
+def writeNmapXml(pathToXml, amountOfHosts, portDensity):
+    maxPorts = min(len(commonPorts), max(1, 2 * portDensity - 1))
+
+    with open(pathToXml, "w") as xmlFile:
+        xmlFile.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                      + '<nmaprun scanner="nmap" args="benchmark">\n')
+
+        for hostNumber in range(amountOfHosts):
+            openPorts = sorted(random.sample(commonPorts,
+                                             random.randint(1, maxPorts)))
+
+            xmlFile.write('<host><status state="up"/><address addr="'
+                          + getHostAddress(hostNumber)
+                          + '" addrtype="ipv4"/><ports>\n')
+
+            for port, service, product, version in openPorts:
+                xmlFile.write('<port protocol="tcp" portid="' + str(port)
+                              + '"><state state="open" reason="syn-ack"/>'
+                              + '<service name="' + service + '" product="'
+                              + product + '" version="' + version
+                              + '" method="probed"/></port>\n')
+
+            xmlFile.write('</ports></host>\n')
+
+        xmlFile.write('</nmaprun>\n')
+
+
+"""Write a module configuration with stand-in tools.
+Every module targets two ports of the synthetic scan.
+
+pathToModules = The path to the module configuration.
+amountOfModules = The amount of modules.
+distribution = The distribution of the durations (see stubTool.py).
+amountOfLines = The amount of lines every command prints.
+"""
+def writeModules(pathToModules, amountOfModules, distribution, amountOfLines):
+    pathToStub = os.path.dirname(os.path.abspath(__file__)) + "/stubTool.py"
+    allModules = []
+
+    for moduleNumber in range(amountOfModules):
+        ports = [commonPorts[moduleNumber % len(commonPorts)][0],
+                 commonPorts[(moduleNumber * 7 + 3) % len(commonPorts)][0]]
+
+        allModules.append({"name": "stub" + str(moduleNumber + 1),
+                           "riskLevel": "1",
+                           "syntax": sys.executable + " " + pathToStub + " "
+                                     + distribution + " " + str(amountOfLines)
+                                     + " <targetIp> <port> > <outputFile> 2>&1",
+                           "port": ",".join(str(port)
+                                            for port in sorted(set(ports)))})
+
+    with open(pathToModules, "w") as moduleFile:
+        json.dump(allModules, moduleFile, indent=4)
+
+
+"""Run autopen once for the given amount of hosts and -ta
+and return the result of the run.
+
+args = The arguments of the benchmark.
+amountOfHosts = The amount of hosts of the synthetic scan.
+threadAmount = The -ta of autopen.
+pathToModules = The path to the module configuration.
+"""
+def runBenchmark(args, amountOfHosts, threadAmount, pathToModules):
+    pathToAutopen = (os.path.dirname(os.path.dirname(os.path.abspath(
+                     __file__))) + "/autopen.py")
+    pathToRun = (args.workDir + "/hosts-" + str(amountOfHosts) + "-ta-"
+                 + str(threadAmount))
+    pathToXml = pathToRun + "/nmap.xml"
+    pathToProfile = pathToRun + "/profile.json"
+
+    # every run starts without the results of previous runs
+    shutil.rmtree(pathToRun, ignore_errors=True)
+    os.makedirs(pathToRun)
+
+    writeNmapXml(pathToXml, amountOfHosts, args.portDensity)
+
+    command = [sys.executable, pathToAutopen, "-xf", pathToXml,
+               "-o", pathToRun + "/output", "-mc", pathToModules,
+               "-md", "-pr", pathToProfile]
+
+    if (args.execute):
+        command += ["-e", "-ta", str(threadAmount), "-en", args.engine]
+
+    # the caches of autopen (registry, durations) are not shared between runs
+    environment = dict(os.environ, XDG_CACHE_HOME=pathToRun + "/cache")
+
+    startTime = time.perf_counter()
+    subprocess.run(command, stdout=subprocess.DEVNULL, env=environment,
+                   check=True)
+    wallTime = time.perf_counter() - startTime
+
+    with open(pathToProfile, "r") as profileFile:
+        profileData = json.load(profileFile)
+
+    return {"hosts": amountOfHosts,
+            "portDensity": args.portDensity,
+            "modules": args.modules,
+            "distribution": args.distribution,
+            "execute": args.execute,
+            "engine": args.engine,
+            "threadAmount": threadAmount,
+            "wallTime": round(wallTime, 3),
+            "profile": profileData}
+
+
+"""Append the results of all runs to the result file.
+
+pathToResults = The path to the json result file.
+allRuns = The results returned by runBenchmark.
+"""
+def writeResults(pathToResults, allRuns):
+    try:
+        with open(pathToResults, "r") as resultFile:
+            allResults = json.load(resultFile)
+    except (OSError, ValueError):
+        allResults = []
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+
+    allResults.append({"timestamp": datetime.datetime.now().isoformat(
+                                        timespec="seconds"),
+                       "commit": commit,
+                       "runs": allRuns})
+
+    with open(pathToResults, "w") as resultFile:
+        json.dump(allResults, resultFile, indent=4)
+        resultFile.write("\n")
+
+
+"""Print the most important values of every run.
+
+allRuns = The results returned by runBenchmark.
+"""
+def printResults(allRuns):
+    print("hosts\tta\tplanned\txml(s)\tmatch(s)\tcreate(s)\tcmd/min\t"
+          + "idle(s)\tthreads\tpeakRSS(MB)\twall(s)")
+
+    for run in allRuns:
+        phases = run["profile"]["phases"]
+        statistics = run["profile"]["scheduler"] or {}
+
+        print(str(run["hosts"]) + "\t"
+              + str(run["threadAmount"]) + "\t"
+              + str(run["profile"]["plannedCommands"]) + "\t"
+              + "%.3f" % phases.get("convertXmlToList", 0) + "\t"
+              + "%.3f" % phases.get("getMatchingModules", 0) + "\t\t"
+              + "%.3f" % phases.get("createCommandFromTemplate", 0) + "\t\t"
+              + str(statistics.get("commandsPerMinute", "-")) + "\t"
+              + str(statistics.get("idleSlotTime", "-")) + "\t"
+              + str(statistics.get("peakThreads", "-")) + "\t"
+              + "%.1f" % (run["profile"]["peakRssKb"] / 1024) + "\t\t"
+              + "%.1f" % run["wallTime"])
+
+
+# threads of autopen that may be running or not when the peak is sampled
+allowedThreadGrowth = 2
+
+
+"""Return the amounts of hosts whose async runs used more threads
+with a higher -ta. The async engine must not start a thread per process,
+only a few threads of autopen itself (e.g. progress) may come and go.
+
+allRuns = The results returned by runBenchmark.
+"""
+def getGrowingThreads(allRuns):
+    peakThreads = {}
+
+    for run in allRuns:
+        statistics = run["profile"]["scheduler"]
+
+        if (run["engine"] == "async" and statistics):
+            peakThreads.setdefault(run["hosts"], []).append(
+                statistics["peakThreads"])
+
+    return [amountOfHosts for amountOfHosts, allPeaks in peakThreads.items()
+            if max(allPeaks) - min(allPeaks) > allowedThreadGrowth]
+
+
+"""MAIN
+
+"""
+argumentParser = argparse.ArgumentParser(description="""Benchmark of autopen.
+Measures the planning and scheduling overhead with a synthetic nmap result
+and stand-in tools instead of the real tools.
+
+Planning only:
+python3 benchmark/benchmark.py -ho 1000 10000 100000
+
+Planning and execution with 50 parallel stand-in tools:
+python3 benchmark/benchmark.py -ho 1000 -e -ta 50 -di exp:0.2
+
+Check that the threads of the async engine do not grow with -ta:
+python3 benchmark/benchmark.py -ho 100 -e -en async -ta 10 300 -di fixed:1
+""", formatter_class=argparse.RawTextHelpFormatter)
+
+argumentParser.add_argument("-ho",
+                            "--hosts",
+                            dest = "hosts",
+                            nargs = "+",
+                            type = int,
+                            help = "the amounts of hosts of the synthetic"
+                                   + " nmap results (default 1000 10000)",
+                            default = [1000, 10000])
+
+argumentParser.add_argument("-pd",
+                            "--portDensity",
+                            dest = "portDensity",
+                            type = int,
+                            help = "the average amount of open ports per host"
+                                   + " (default 3)",
+                            default = 3)
+
+argumentParser.add_argument("-mo",
+                            "--modules",
+                            dest = "modules",
+                            type = int,
+                            help = "the amount of stand-in modules"
+                                   + " (default 20)",
+                            default = 20)
+
+argumentParser.add_argument("-di",
+                            "--distribution",
+                            dest = "distribution",
+                            help = "the distribution of the durations of the"
+                                   + " stand-in tools: fixed:SECONDS,"
+                                   + " uniform:MIN:MAX, exp:MEAN or"
+                                   + " lognormal:MU:SIGMA"
+                                   + " (default uniform:0.01:0.1)",
+                            default = "uniform:0.01:0.1")
+
+argumentParser.add_argument("-li",
+                            "--lines",
+                            dest = "lines",
+                            type = int,
+                            help = "the amount of lines every stand-in tool"
+                                   + " prints (default 10)",
+                            default = 10)
+
+argumentParser.add_argument("-e",
+                            "--execute",
+                            dest = "execute",
+                            action = "store_true",
+                            help = "execute the stand-in tools"
+                                   + " (default planning only)")
+
+argumentParser.add_argument("-ta",
+                            "--threadAmount",
+                            dest = "threadAmount",
+                            nargs = "+",
+                            type = int,
+                            help = "the amounts of -ta of autopen"
+                                   + " (default 20)",
+                            default = [20])
+
+argumentParser.add_argument("-en",
+                            "--engine",
+                            dest = "engine",
+                            choices = ["threads", "async"],
+                            help = "the -en of autopen (default threads)",
+                            default = "threads")
+
+argumentParser.add_argument("-se",
+                            "--seed",
+                            dest = "seed",
+                            type = int,
+                            help = "the seed of the synthetic nmap results"
+                                   + " (default 1)",
+                            default = 1)
+
+argumentParser.add_argument("-wd",
+                            "--workDir",
+                            dest = "workDir",
+                            help = "the directory for the synthetic nmap"
+                                   + " results and the output of autopen"
+                                   + " (default /tmp/autopen-benchmark)",
+                            default = "/tmp/autopen-benchmark")
+
+argumentParser.add_argument("-rf",
+                            "--resultFile",
+                            dest = "resultFile",
+                            help = "the json file the results are appended to"
+                                   + " (default benchmark/results.json)",
+                            default = os.path.dirname(os.path.abspath(
+                                __file__)) + "/results.json")
+
+args = argumentParser.parse_args()
+
+if (args.portDensity < 1 or args.modules < 1):
+    print("Error: --portDensity and --modules must be at least 1")
+    exit(1)
+
+os.makedirs(args.workDir, exist_ok=True)
+pathToModules = args.workDir + "/modules.json"
+writeModules(pathToModules, args.modules, args.distribution, args.lines)
+
+allRuns = []
+
+for amountOfHosts in args.hosts:
+    for threadAmount in args.threadAmount:
+        # the same seed creates the same hosts for every amount of hosts
+        random.seed(args.seed)
+        allRuns.append(runBenchmark(args, amountOfHosts, threadAmount,
+                                    pathToModules))
+
+printResults(allRuns)
+writeResults(args.resultFile, allRuns)
+
+growingThreads = getGrowingThreads(allRuns)
+
+if (growingThreads):
+    print("Error: the threads of the async engine grow with -ta (hosts "
+          + ", ".join(str(amountOfHosts) for amountOfHosts in growingThreads)
+          + ")")
+    exit(1)
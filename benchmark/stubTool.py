@@ -0,0 +1,51 @@
+import random
+import sys
+import time
+
+
+"""Stand-in for a pentesting tool used by the benchmark.
+Sleeps for a duration drawn from the given distribution
+and prints the given amount of lines.
+
+usage: stubTool.py DISTRIBUTION LINES TARGETIP PORT
+
+Possible distributions (durations in seconds):
+fixed:SECONDS
+uniform:MIN:MAX
+exp:MEAN
+lognormal:MU:SIGMA
+"""
+
+
+"""Return a duration in seconds drawn from the given distribution.
+
+distribution = The distribution (see above).
+"""
+def getDuration(distribution):
+    name, *parameters = distribution.split(":")
+    parameters = [float(parameter) for parameter in parameters]
+
+    if (name == "fixed"):
+        return parameters[0]
+
+    if (name == "uniform"):
+        return random.uniform(parameters[0], parameters[1])
+
+    if (name == "exp"):
+        return random.expovariate(1 / parameters[0])
+
+    if (name == "lognormal"):
+        return random.lognormvariate(parameters[0], parameters[1])
+
+    raise ValueError("unknown distribution " + name)
+
+
+"""MAIN
+
+"""
+distribution, amountOfLines, targetIp, port = sys.argv[1:5]
+
+time.sleep(getDuration(distribution))
+
+for lineNumber in range(int(amountOfLines)):
+    print(targetIp + ":" + port + " stub output line " + str(lineNumber))
@@ -0,0 +1,32 @@
+import argparse
+import importlib.util
+import os
+
+import pytest
+
+
+pathToAutopen = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "autopen.py")
+
+
+"""Return autopen.py loaded as a module (the main part is not executed)."""
+@pytest.fixture(scope="session")
+def autopen():
+    spec = importlib.util.spec_from_file_location("autopen", pathToAutopen)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+"""Return the arguments of a run with an output directory inside tmp_path,
+set as the args of autopen for the duration of the test.
+"""
+@pytest.fixture
+def runArgs(autopen, tmp_path, monkeypatch):
+    outputDir = tmp_path / "output"
+    outputDir.mkdir()
+    runArgs = argparse.Namespace(output=str(outputDir), execute=True,
+                                 outputCompression="none", maxOutputSize="0",
+                                 timeout="1200", coordinator=None)
+    monkeypatch.setattr(autopen, "args", runArgs)
+    return runArgs
@@ -0,0 +1,90 @@
+import pytest
+
+
+def test_singleAddressDoesNotMatchLongerAddress(autopen):
+    ipFilter = autopen.addressFilter(["10.0.0.1"])
+
+    assert "10.0.0.1" in ipFilter
+    assert not "10.0.0.10" in ipFilter
+    assert not "10.0.0.11" in ipFilter
+    assert not "10.0.0.0" in ipFilter
+
+
+def test_longerAddressDoesNotMatchShorterAddress(autopen):
+    ipFilter = autopen.addressFilter(["10.0.0.10"])
+
+    assert "10.0.0.10" in ipFilter
+    assert not "10.0.0.1" in ipFilter
+    assert not "10.0.0.100" in ipFilter
+
+
+def test_cidrWithRemovedSubnet(autopen):
+    ipFilter = autopen.addressFilter(["10.0.0.0/24", "!10.0.0.128/25"])
+
+    assert "10.0.0.0" in ipFilter
+    assert "10.0.0.127" in ipFilter
+    assert not "10.0.0.128" in ipFilter
+    assert not "10.0.0.255" in ipFilter
+    assert not "10.0.1.0" in ipFilter
+    assert not "9.255.255.255" in ipFilter
+
+
+@pytest.mark.parametrize("entry", ["10.0.0.1-9", "10.0.0.1-10.0.0.9"])
+def test_rangeBoundaries(autopen, entry):
+    ipFilter = autopen.addressFilter([entry])
+
+    assert "10.0.0.1" in ipFilter
+    assert "10.0.0.9" in ipFilter
+    assert not "10.0.0.0" in ipFilter
+    assert not "10.0.0.10" in ipFilter
+
+
+def test_nmapOctetNotation(autopen):
+    ipFilter = autopen.addressFilter(["10.0.1-2.5"])
+
+    assert "10.0.1.5" in ipFilter
+    assert "10.0.2.5" in ipFilter
+    assert not "10.0.3.5" in ipFilter
+    assert not "10.0.1.50" in ipFilter
+
+
+def test_adjacentIntervalsAreMerged(autopen):
+    ipFilter = autopen.addressFilter(["10.0.0.0/25", "10.0.0.128/25",
+                                      "10.0.0.5"])
+
+    assert ipFilter.intervals == [[autopen.getAddressInterval("10.0.0.0")[0],
+                                   autopen.getAddressInterval("10.0.0.255")[0]]]
+
+
+def test_ipv6DoesNotOverlapIpv4(autopen):
+    ipv4Filter = autopen.addressFilter(["0.0.0.0/0"])
+    ipv6Filter = autopen.addressFilter(["2001:db8::/64"])
+
+    assert "255.255.255.255" in ipv4Filter
+    assert not "::1" in ipv4Filter
+    assert not "::" in ipv4Filter
+    assert "2001:db8::1" in ipv6Filter
+    assert not "2001:db8:0:1::1" in ipv6Filter
+    assert not "0.0.0.1" in ipv6Filter
+
+
+def test_hostnames(autopen):
+    ipFilter = autopen.addressFilter(["scanme.example", "10.0.0.1"])
+
+    assert "scanme.example" in ipFilter
+    assert not "other.example" in ipFilter
+
+
+def test_entriesOfFile(autopen, tmp_path):
+    pathToEntries = tmp_path / "hosts.txt"
+    pathToEntries.write_text("# lab network\n10.0.0.0/30\n\n!10.0.0.2\n")
+    ipFilter = autopen.addressFilter(["@" + str(pathToEntries)])
+
+    assert "10.0.0.1" in ipFilter
+    assert not "10.0.0.2" in ipFilter
+    assert "10.0.0.3" in ipFilter
+    assert not "10.0.0.4" in ipFilter
+
+
+def test_portFilter(autopen):
+    assert autopen.compilePortFilter(["1-5", "!3", "80"]) == {1, 2, 4, 5, 80}
@@ -0,0 +1,128 @@
+import json
+import random
+
+import pytest
+
+
+"""Write a plan file with a job per cost and return its path."""
+def writePlan(autopen, tmp_path, allCosts):
+    pathToPlan = tmp_path / "plan.jsonl"
+
+    with open(pathToPlan, "w") as planFile:
+        planFile.write(json.dumps({"planFormat": autopen.planFormat,
+                                   "output": "/plan/output",
+                                   "workingDir": "/plan"}) + "\n")
+
+        for number, cost in enumerate(allCosts):
+            planFile.write(json.dumps({"name": "job" + str(number),
+                                       "cost": cost}) + "\n")
+
+    return str(pathToPlan)
+
+
+def getShards(autopen, pathToPlan, amountOfShards):
+    return [autopen.readPlan(pathToPlan, [shardNumber, amountOfShards])[1]
+            for shardNumber in range(1, amountOfShards + 1)]
+
+
+@pytest.mark.parametrize("amountOfShards", [1, 2, 3, 7, 60])
+def test_shardsAreDisjointAndComplete(autopen, tmp_path, amountOfShards):
+    allCosts = [round(random.Random(number).uniform(0, 600), 3)
+                for number in range(50)]
+    pathToPlan = writePlan(autopen, tmp_path, allCosts)
+    allShards = getShards(autopen, pathToPlan, amountOfShards)
+
+    assert sum(len(shard) for shard in allShards) == len(allCosts)
+    assert set().union(*allShards) == set(range(len(allCosts)))
+
+
+@pytest.mark.parametrize("allCosts", [[30.0] * 20,
+                                      [600, 1, 1, 1, 600, 5, 5, 0, 0, 120]])
+def test_shardsAreDeterministic(autopen, tmp_path, allCosts):
+    pathToPlan = writePlan(autopen, tmp_path, allCosts)
+
+    assert getShards(autopen, pathToPlan, 3) == getShards(autopen,
+                                                          pathToPlan, 3)
+
+
+def test_equalCostsAreSpreadEvenly(autopen, tmp_path):
+    pathToPlan = writePlan(autopen, tmp_path, [30.0] * 20)
+    shardSizes = [len(shard) for shard in getShards(autopen, pathToPlan, 3)]
+
+    assert sorted(shardSizes) == [6, 7, 7]
+
+
+def test_longestJobsAreBalanced(autopen, tmp_path):
+    allCosts = [round(random.Random(number).uniform(0, 600), 3)
+                for number in range(50)]
+    pathToPlan = writePlan(autopen, tmp_path, allCosts)
+    shardCosts = [sum(allCosts[lineNumber] for lineNumber in shard)
+                  for shard in getShards(autopen, pathToPlan, 4)]
+
+    # the cheapest shard gets the next job, so the shards differ
+    # by at most the cost of a single job
+    assert max(shardCosts) - min(shardCosts) <= max(allCosts)
+
+
+def test_withoutShardAllJobs(autopen, tmp_path):
+    pathToPlan = writePlan(autopen, tmp_path, [1, 2, 3])
+    header, selectedLines = autopen.readPlan(pathToPlan, None)
+
+    assert selectedLines is None
+    assert header["output"] == "/plan/output"
+
+
+def test_planOfOtherFormatIsRejected(autopen, tmp_path):
+    pathToPlan = tmp_path / "plan.jsonl"
+    pathToPlan.write_text(json.dumps({"planFormat": 0}) + "\n")
+
+    with pytest.raises(SystemExit):
+        autopen.readPlan(str(pathToPlan), None)
+
+
+def test_relocateOnlyPathFields(autopen):
+    header = {"output": "/plan/out", "workingDir": "/plan"}
+    record = {"name": "gobuster-10.0.0.1-80",
+              "command": "gobuster -w out/wordlist -u 10.0.0.1"
+                         + " > out/gobuster/gobuster-10.0.0.1-80 2>&1",
+              "portableCommand": "gobuster -w out/wordlist -u 10.0.0.1"
+                                 + " > <outputFile> 2>&1",
+              "portablePaths": {"outputFile": "out/gobuster/"
+                                              + "gobuster-10.0.0.1-80"},
+              "outputFile": "out/gobuster/gobuster-10.0.0.1-80",
+              "wordlist": "out/wordlist"}
+
+    job = autopen.relocatePlanRecord(record, header, "/run/output")
+
+    # the argument that only looks like a path of the plan stays unchanged
+    assert job["command"] == ("gobuster -w out/wordlist -u 10.0.0.1"
+                              + " > /run/output/gobuster/"
+                              + "gobuster-10.0.0.1-80 2>&1")
+    assert job["outputFile"] == "/run/output/gobuster/gobuster-10.0.0.1-80"
+    assert job["wordlist"] == "out/wordlist"
+    assert record["outputFile"] == "out/gobuster/gobuster-10.0.0.1-80"
+
+
+def test_relocateBatchJobs(autopen):
+    header = {"output": "/plan/out", "workingDir": "/elsewhere"}
+    hostRecord = {"name": "whatweb-10.0.0.1-80",
+                  "command": "whatweb 10.0.0.1 > /plan/out/whatweb/w-1 2>&1",
+                  "outputFile": "/plan/out/whatweb/w-1"}
+    record = {"name": "whatweb-batch1-80",
+              "command": "whatweb -i /plan/out/whatweb/w.targets"
+                         + " > /plan/out/whatweb/w 2>&1",
+              "portableCommand": "whatweb -i <targetFile> > <outputFile> 2>&1",
+              "portablePaths": {"outputFile": "/plan/out/whatweb/w",
+                                "targetFile": "/plan/out/whatweb/w.targets"},
+              "outputFile": "/plan/out/whatweb/w",
+              "targetFile": "/plan/out/whatweb/w.targets",
+              "targets": ["10.0.0.1"],
+              "batchJobs": [hostRecord]}
+
+    job = autopen.relocatePlanRecord(record, header, "out2")
+
+    assert job["command"] == ("whatweb -i out2/whatweb/w.targets"
+                              + " > out2/whatweb/w 2>&1")
+    assert job["targetFile"] == "out2/whatweb/w.targets"
+    assert job["batchJobs"][0]["outputFile"] == "out2/whatweb/w-1"
+    assert job["targets"] == ["10.0.0.1"]
@@ -0,0 +1,206 @@
+import os
+import types
+
+import pytest
+
+
+nmapXml = """<?xml version="1.0"?>
+<nmaprun><host><address addr="10.0.0.1" addrtype="ipv4"/><ports>
+<port protocol="tcp" portid="548"><state state="open"/>
+<service name="afp" product="Netatalk" version="3.1"/>
+<script id="afp-serverinfo" output="&#xa;  Server Flags: 0x8f79&#xa;  Name: nas"/>
+<script id="snmp-info" output="not part of port 548"/>
+</port>
+<port protocol="udp" portid="161"><state state="open"/>
+<service name="snmp"/>
+<script id="snmp-info" output="enterprise: net-snmp"/>
+</port>
+</ports>
+<hostscript><script id="afp-host" output="single line"/></hostscript>
+</host></nmaprun>
+"""
+
+
+def getHostJob(outputDir, moduleName, host, port, module=None):
+    return {"name": moduleName + "-" + host + "-" + port,
+            "host": host,
+            "port": port,
+            "outputFile": (outputDir + "/" + moduleName + "/" + moduleName
+                           + "-" + host + "-" + port),
+            "module": module or {"name": moduleName, "port": port}}
+
+
+def getBatchJob(outputDir, batchSplit, allHosts, output):
+    os.makedirs(outputDir + "/tool", exist_ok=True)
+    batchJob = getHostJob(outputDir, "tool", "batch1", "80",
+                          {"name": "tool", "port": "80",
+                           "batchSplit": batchSplit})
+    batchJob["batchJobs"] = [getHostJob(outputDir, "tool", host, "80")
+                             for host in allHosts]
+
+    with open(batchJob["outputFile"], "wb") as outputFile:
+        outputFile.write(output)
+
+    return batchJob
+
+
+def readOutput(job):
+    with open(job["outputFile"], "rb") as outputFile:
+        return outputFile.read()
+
+
+def test_linesOfSimilarAddresses(autopen, runArgs):
+    batchJob = getBatchJob(runArgs.output, "lines", ["10.0.0.1", "10.0.0.10"],
+                           b"10.0.0.1 open\n"
+                           b"10.0.0.10 closed\n"
+                           b"10.0.0.100 unknown host\n"
+                           b"http://10.0.0.1:80/ title\n"
+                           b"line without host\n"
+                           b"10.0.0.10 and 10.0.0.1 share a line\n")
+
+    autopen.splitBatchOutput(batchJob)
+    firstHost, secondHost = batchJob["batchJobs"]
+
+    assert readOutput(firstHost) == (b"10.0.0.1 open\n"
+                                     b"http://10.0.0.1:80/ title\n"
+                                     b"10.0.0.10 and 10.0.0.1 share a line\n")
+    assert readOutput(secondHost) == (b"10.0.0.10 closed\n"
+                                      b"10.0.0.10 and 10.0.0.1 share a line\n")
+
+
+def test_blocks(autopen, runArgs):
+    batchJob = getBatchJob(runArgs.output, "blocks", ["10.0.0.1", "10.0.0.10"],
+                           b"Starting scan\n"
+                           b"Nmap scan report for 10.0.0.10\n"
+                           b"80/tcp open http\n"
+                           b"Nmap scan report for 10.0.0.1\n"
+                           b"80/tcp closed http\n")
+
+    autopen.splitBatchOutput(batchJob)
+    firstHost, secondHost = batchJob["batchJobs"]
+
+    assert readOutput(firstHost) == (b"Nmap scan report for 10.0.0.1\n"
+                                     b"80/tcp closed http\n")
+    assert readOutput(secondHost) == (b"Nmap scan report for 10.0.0.10\n"
+                                      b"80/tcp open http\n")
+
+
+def test_linkCopiesTheOutput(autopen, runArgs):
+    batchJob = getBatchJob(runArgs.output, "link", ["10.0.0.1", "10.0.0.2"],
+                           b"whole output\n")
+
+    autopen.splitBatchOutput(batchJob)
+
+    for hostJob in batchJob["batchJobs"]:
+        assert readOutput(hostJob) == b"whole output\n"
+
+        # a tool appending to the output of a host must not change the others
+        assert not os.path.samefile(hostJob["outputFile"],
+                                    batchJob["outputFile"])
+
+
+def getCoalescedJob(outputDir, xml):
+    pathToXml = outputDir + "/nmap-scripts/nmap-scripts-10.0.0.1.xml"
+    os.makedirs(os.path.dirname(pathToXml))
+
+    with open(pathToXml, "w") as xmlFile:
+        xmlFile.write(xml)
+
+    allHostJobs = []
+
+    for moduleName, scripts, port in [["nmap-afp", "*afp*", "548"],
+                                      ["nmap-snmp", "snmp-info", "161"]]:
+        module = {"name": moduleName, "port": port,
+                  "syntax": "nmap -sV --script \"" + scripts + "\" <targetIp>"
+                            + " -p <port> > <outputFile> 2>&1"}
+        hostJob = getHostJob(outputDir, moduleName, "10.0.0.1", port, module)
+        os.makedirs(os.path.dirname(hostJob["outputFile"]))
+        allHostJobs.append(hostJob)
+
+    return {"name": "nmap-scripts-10.0.0.1",
+            "xmlFile": pathToXml,
+            "coalescedJobs": allHostJobs}
+
+
+def test_nmapOutputPerModule(autopen, runArgs):
+    coalescedJob = getCoalescedJob(runArgs.output, nmapXml)
+
+    autopen.splitNmapOutput(coalescedJob)
+    afpJob, snmpJob = coalescedJob["coalescedJobs"]
+
+    assert readOutput(afpJob).decode() == (
+        "Nmap scan report for 10.0.0.1\n"
+        "PORT\tSTATE\tSERVICE\tVERSION\n"
+        "548/tcp\topen\tafp\tNetatalk 3.1\n"
+        "| afp-serverinfo: \n"
+        "|  Server Flags: 0x8f79\n"
+        "|_  Name: nas\n"
+        "\nHost script results:\n"
+        "|_afp-host: single line\n")
+    assert readOutput(snmpJob).decode() == (
+        "Nmap scan report for 10.0.0.1\n"
+        "PORT\tSTATE\tSERVICE\tVERSION\n"
+        "161/udp\topen\tsnmp\t\n"
+        "|_snmp-info: enterprise: net-snmp\n")
+
+
+def test_nmapHostDown(autopen, runArgs):
+    coalescedJob = getCoalescedJob(runArgs.output,
+                                   "<?xml version=\"1.0\"?><nmaprun/>")
+
+    autopen.splitNmapOutput(coalescedJob)
+
+    for hostJob in coalescedJob["coalescedJobs"]:
+        assert readOutput(hostJob) == (b"Nmap scan report for 10.0.0.1\n"
+                                       b"Host seems down.\n")
+
+
+@pytest.mark.parametrize("splitKey", ["batchJobs", "coalescedJobs"])
+def test_splitJobsAreJournaled(autopen, runArgs, monkeypatch, splitKey):
+    pathToJournal = runArgs.output + "/autopen-journal.jsonl"
+    journal = autopen.runJournal(pathToJournal)
+    scheduler = types.SimpleNamespace(journal=journal, metrics=None,
+                                      summary=None)
+    monkeypatch.setattr(autopen, "history",
+                        types.SimpleNamespace(add=lambda name, duration: None))
+
+    job = getHostJob(runArgs.output, "tool", "batch1", "80")
+    job[splitKey] = [getHostJob(runArgs.output, "tool", host, "80")
+                     for host in ["10.0.0.1", "10.0.0.2"]]
+    failedJob = dict(job, name="tool-batch2-80",
+                     **{splitKey: [getHostJob(runArgs.output, "tool",
+                                              "10.0.0.3", "80")]})
+
+    autopen.moduleScheduler.recordResult(
+        scheduler, job, {"state": "done", "exitCode": 0,
+                         "resourceUsage": None}, 0.0, 1.0, 1.0)
+    autopen.moduleScheduler.recordResult(
+        scheduler, failedJob, {"state": "failed", "exitCode": 1,
+                               "resourceUsage": None}, 0.0, 1.0, 1.0)
+    journal.close()
+
+    assert autopen.loadJournalStates(pathToJournal) == {
+        "tool-batch1-80": "done",
+        "tool-10.0.0.1-80": "done",
+        "tool-10.0.0.2-80": "done",
+        "tool-batch2-80": "failed"}
+
+
+def test_lastStateOfJournalWins(autopen, runArgs):
+    pathToJournal = runArgs.output + "/autopen-journal.jsonl"
+    journal = autopen.runJournal(pathToJournal)
+
+    for name, state in [["a", "planned"], ["a", "running"], ["a", "done"],
+                        ["b", "planned"], ["b", "running"],
+                        ["c", "running"], ["c", "failed"]]:
+        journal.write({"name": name}, state)
+
+    journal.close()
+
+    # a partially written line of a crashed run is skipped
+    with open(pathToJournal, "a") as journalFile:
+        journalFile.write("{\"name\": \"c\", \"sta")
+
+    assert autopen.loadJournalStates(pathToJournal) == {"a": "done",
+                                                        "b": "interrupted",
+                                                        "c": "failed"}
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+from conftest import pathToAutopen
+
+
+"""Return the command created the way autopen created it before
+the templates have been compiled: a str.replace per variable.
+"""
+def replaceVariables(syntax, values):
+    command = syntax
+
+    for variable, value in values.items():
+        command = command.replace("<" + variable + ">", value)
+
+    return command
+
+
+def getAllSyntaxes():
+    pathToModules = os.path.join(os.path.dirname(pathToAutopen),
+                                 "modules.json")
+
+    with open(pathToModules, "r") as file:
+        allModules = json.load(file)
+
+    allSyntaxes = []
+
+    for module in allModules:
+        allSyntaxes.append(module["syntax"])
+
+        if ("batchSyntax" in module):
+            allSyntaxes.append(module["batchSyntax"])
+
+    return allSyntaxes
+
+
+@pytest.mark.parametrize("syntax", getAllSyntaxes()
+                         + ["a < b > c <targetIp>",
+                            "<targetIp><port><targetIp>",
+                            "echo <unknown> <targetIp> > <outputFile> 2>&1",
+                            "no variables at all",
+                            "unterminated <targetIp"])
+def test_expandEqualsReplace(autopen, syntax):
+    template = autopen.commandTemplate(syntax)
+    values = {variable: "value-of-" + variable
+              for variable in template.variables if variable != "unknown"}
+    values.update({"targetIp": "10.0.0.1", "port": "445",
+                   "outputFile": "/tmp/output/module/module-10.0.0.1-445"})
+
+    assert template.expand(values) == replaceVariables(syntax, values)
+
+
+def test_bindThenExpandEqualsExpand(autopen):
+    syntax = ("hydra -l <user> -P <passwordList> <targetIp> -s <port>"
+              + " > <outputFile> 2>&1")
+    template = autopen.commandTemplate(syntax)
+    userValues = {"user": "admin", "passwordList": "/tmp/passwords"}
+    hostValues = {"targetIp": "10.0.0.1", "port": "22",
+                  "outputFile": "/tmp/output/hydra"}
+
+    boundTemplate = template.bind(userValues)
+
+    assert boundTemplate.expand(hostValues) == template.expand(
+        dict(userValues, **hostValues))
+    assert boundTemplate.variables == template.variables
+
+
+def test_missingVariablesStayUnchanged(autopen):
+    template = autopen.commandTemplate("nmap <targetIp> -p <port>"
+                                       + " -oX <outputFile>.xml")
+
+    assert (template.expand({"targetIp": "10.0.0.1"})
+            == "nmap 10.0.0.1 -p <port> -oX <outputFile>.xml")
+
+
+def test_valuesAreNotExpandedAgain(autopen):
+    template = autopen.commandTemplate("echo <user> <targetIp>")
+
+    # str.replace would replace the <targetIp> inside the value of <user>
+    assert (template.expand({"user": "<targetIp>", "targetIp": "10.0.0.1"})
+            == "echo <targetIp> 10.0.0.1")
+
+
+def test_variablesInOrderOfOccurrence(autopen):
+    template = autopen.commandTemplate("<port> <targetIp> <port> <outputFile>")
+
+    assert template.variables == ["port", "targetIp", "outputFile"]